@@ -0,0 +1,143 @@
+"""
+Benchmark for the full-text document index (src/DB/document_index.py).
+
+Indexes a synthetic corpus of invoice texts and times typical accounting queries: a
+term, an IBAN, an invoice number, a vendor, and a term within a date range.
+
+Usage (from the repository root):
+    python benchmarks/bench_document_index.py --documents 200000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from DB.document_index import DocumentIndex
+from emails.Email_with_Attachment import AttachmentRecord
+
+VENDORS = ["Stadtwerke", "Hausmeister Service", "Elektro Schmidt", "Müller Sanitär", "Dachdecker Weber",
+           "Gartenbau Fischer", "Aufzug Technik", "Reinigung Klar", "Heizung Becker", "Maler Wagner"]
+STREETS = ["Hauptstraße", "Bahnhofstraße", "Gartenweg", "Schillerstraße", "Lindenallee", "Kirchplatz"]
+WORDS = ["Wartung", "Reparatur", "Heizkosten", "Abrechnung", "Material", "Arbeitszeit", "Anfahrt", "Pauschale",
+         "Nebenkosten", "Treppenhaus", "Zählerstand", "Verbrauch", "Netto", "Brutto", "Umsatzsteuer"]
+
+
+def make_iban(rng):
+    digits = "".join(str(rng.randint(0, 9)) for _ in range(18))
+    return f"DE{rng.randint(10, 99)}{digits}"
+
+
+def generate_document(rng, index, start_date):
+    vendor = f"{rng.choice(VENDORS)} GmbH"
+    iban = make_iban(rng)
+    invoice_number = f"RE-{2020 + index % 6}-{index:06d}"
+    grouped_iban = " ".join(iban[i:i + 4] for i in range(0, len(iban), 4))
+    street = f"{rng.choice(STREETS)} {rng.randint(1, 120)}"
+    body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(80, 200)))
+    text = f"Rechnung {invoice_number} {vendor} Objekt {street} {body} IBAN {grouped_iban}"
+    email_date = start_date + timedelta(minutes=index * 7)
+    document = AttachmentRecord(file_name=f"scan_{index}.pdf", path=f"/processed/{index}.pdf", status="processed",
+                                invoice_number=invoice_number, vendor_name=vendor, doc_type="Rechnung")
+    email_obj = SimpleNamespace(uid=str(index), date=email_date.strftime("%a, %d %b %Y %H:%M:%S +0000"),
+                                sender="billing@example.com", subject=f"Rechnung {invoice_number}")
+    return document, email_obj, text, iban
+
+
+def time_query(index, repeat, **kwargs):
+    durations = []
+    results = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = index.search(**kwargs)
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return {"results": len(results), "median_ms": durations[len(durations) // 2] * 1000,
+            "max_ms": durations[-1] * 1000}
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_index_")
+    index = DocumentIndex(os.path.join(workdir, "document_index.sqlite3"))
+    start_date = datetime(2020, 1, 1)
+    sample = None
+
+    started = time.perf_counter()
+    try:
+        for number in range(args.documents):
+            document, email_obj, text, iban = generate_document(rng, number, start_date)
+            index.add(document, email_obj, text)
+            if number == args.documents // 2:
+                sample = (document, iban, text)
+        indexing_s = time.perf_counter() - started
+
+        document, iban, text = sample
+        street = text.split(" Objekt ")[1].split()[0]
+        queries = {
+            "term": {"terms": street},
+            "iban_grouped": {"terms": " ".join(iban[i:i + 4] for i in range(0, len(iban), 4))},
+            "iban_compact": {"terms": iban},
+            "invoice_number": {"terms": document.invoice_number},
+            "vendor": {"vendor": document.vendor_name.split()[0]},
+            "term_in_month": {"terms": "Heizkosten", "since": "2021-03-01", "until": "2021-03-31"},
+        }
+        timings = {name: time_query(index, args.repeat, **query) for name, query in queries.items()}
+        database_bytes = os.path.getsize(os.path.join(workdir, "document_index.sqlite3"))
+    finally:
+        index.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "benchmark": "document_index",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "results": {
+            "indexing_s": indexing_s,
+            "documents_per_second": args.documents / indexing_s if indexing_s else None,
+            "database_bytes": database_bytes,
+            "queries": timings,
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the full-text document index.")
+    parser.add_argument("--documents", type=int, default=200000, help="Number of synthetic documents.")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Path of the JSON result file. Defaults to bench_results/.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(args)
+
+    output = args.output or os.path.join(
+        "bench_results", f"document_index_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4)
+
+    results = result["results"]
+    print(f"Indexed {args.documents} documents in {results['indexing_s']:.1f}s "
+          f"({results['documents_per_second']:.0f}/s, {results['database_bytes'] / 1e6:.1f} MB)")
+    for name, timing in results["queries"].items():
+        print(f"{name:<16} results={timing['results']:<5} median={timing['median_ms']:.2f}ms max={timing['max_ms']:.2f}ms")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
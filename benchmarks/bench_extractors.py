@@ -0,0 +1,212 @@
+"""
+Micro-benchmark and regression check for the Textract extraction functions.
+
+Every AnalyzeExpense response in benchmarks/corpus/textract/ is run through the
+extractors, the outputs are compared against benchmarks/corpus/textract_golden.json,
+and each extractor is timed per document and per 1,000 documents.
+
+Usage (from the repository root):
+    python benchmarks/bench_extractors.py                 # check + time
+    python benchmarks/bench_extractors.py --update-golden # re-record expected results
+
+The exit code is 1 when any output differs from the golden results.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus", "textract")
+GOLDEN_FILE = os.path.join(BENCH_DIR, "corpus", "textract_golden.json")
+
+# Fuzzy scores are compared with this many decimals to tolerate float noise
+SCORE_DECIMALS = 2
+
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """
+    Loads all stored responses from the corpus folder.
+
+    Returns:
+        dict: Document name (file name without extension) to Textract response.
+    """
+    corpus = {}
+    for file_name in sorted(os.listdir(corpus_dir)):
+        if file_name.endswith(".json"):
+            with open(os.path.join(corpus_dir, file_name), "r", encoding="utf-8") as f:
+                corpus[os.path.splitext(file_name)[0]] = json.load(f)
+    return corpus
+
+
+def get_extractors():
+    """
+    Returns the extractors under test, keyed by the name used in the golden file.
+
+    The clean_and_normalize_text extractor receives the assembled text of the response,
+    exactly as DefaultFileProcessor calls it.
+    """
+    from AWS_TEXTRACT.analyze_expense import (
+        extract_document_type_from_response,
+        extract_invoice_number_from_response,
+        extract_text_from_response,
+        extract_vendor_name_from_response,
+    )
+    from utils.pdf_utils import clean_and_normalize_text
+
+    return {
+        "invoice_number": (extract_invoice_number_from_response, lambda response: response),
+        "document_type": (extract_document_type_from_response, lambda response: response),
+        "vendor_name": (extract_vendor_name_from_response, lambda response: response),
+        "text": (extract_text_from_response, lambda response: response),
+        "normalized_text": (clean_and_normalize_text, extract_text_from_response),
+    }
+
+
+def normalize_output(value):
+    """Converts extractor outputs to a JSON-comparable form with rounded scores."""
+    if isinstance(value, tuple):
+        return [normalize_output(item) for item in value]
+    if isinstance(value, float):
+        return round(value, SCORE_DECIMALS)
+    return value
+
+
+def run_outputs(corpus, extractors):
+    """Runs every extractor on every document and returns the normalized outputs."""
+    outputs = {}
+    for name, response in corpus.items():
+        outputs[name] = {
+            extractor: normalize_output(function(prepare(response)))
+            for extractor, (function, prepare) in extractors.items()
+        }
+    return outputs
+
+
+def compare_with_golden(outputs, golden):
+    """
+    Compares extractor outputs with the golden results.
+
+    Returns:
+        list: Human readable mismatch descriptions (empty when everything matches).
+    """
+    mismatches = []
+    for document, results in outputs.items():
+        expected = golden.get(document)
+        if expected is None:
+            mismatches.append(f"{document}: no golden result recorded")
+            continue
+        for extractor, actual in results.items():
+            if expected.get(extractor) != actual:
+                mismatches.append(f"{document}.{extractor}: expected {expected.get(extractor)!r}, got {actual!r}")
+    return mismatches
+
+
+def time_extractors(corpus, extractors, repeat=5, batch_size=1000):
+    """
+    Times each extractor per document and over a batch of documents.
+
+    Args:
+        corpus (dict): Document name to response.
+        extractors (dict): Extractors as returned by get_extractors().
+        repeat (int): Number of timing rounds; the fastest round is reported.
+        batch_size (int): Number of documents in the batch timing (corpus cycled).
+
+    Returns:
+        dict: Timings in seconds per extractor.
+    """
+    documents = list(corpus.items())
+    batch = [documents[index % len(documents)][1] for index in range(batch_size)]
+    timings = {}
+
+    for extractor, (function, prepare) in extractors.items():
+        per_document = {}
+        for name, response in documents:
+            prepared = prepare(response)
+            iterations = 200
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    function(prepared)
+                best = min(best, (time.perf_counter() - start) / iterations)
+            per_document[name] = best
+
+        prepared_batch = [prepare(response) for response in batch]
+        best_batch = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for prepared in prepared_batch:
+                function(prepared)
+            best_batch = min(best_batch, time.perf_counter() - start)
+
+        timings[extractor] = {
+            "per_document_s": per_document,
+            f"per_{batch_size}_documents_s": best_batch,
+        }
+    return timings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark and regression-check the Textract extractors.")
+    parser.add_argument("--update-golden", action="store_true", help="Record the current outputs as golden results.")
+    parser.add_argument("--check-only", action="store_true", help="Only compare against the golden results.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per measurement.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per batch timing.")
+    parser.add_argument("--output", help="Path of the JSON result file. Defaults to bench_results/.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = load_corpus()
+    extractors = get_extractors()
+    outputs = run_outputs(corpus, extractors)
+
+    if args.update_golden:
+        with open(GOLDEN_FILE, "w", encoding="utf-8") as f:
+            json.dump(outputs, f, ensure_ascii=False, indent=4)
+        print(f"Golden results for {len(outputs)} documents written to {GOLDEN_FILE}")
+        return 0
+
+    with open(GOLDEN_FILE, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    mismatches = compare_with_golden(outputs, golden)
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    print(f"{len(corpus)} documents checked, {len(mismatches)} mismatches")
+
+    if not args.check_only:
+        timings = time_extractors(corpus, extractors, repeat=args.repeat, batch_size=args.batch_size)
+        result = {
+            "benchmark": "extractors",
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "documents": len(corpus),
+            "mismatches": mismatches,
+            "timings": timings,
+        }
+        output = args.output or os.path.join(
+            "bench_results", f"extractors_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+
+        batch_key = f"per_{args.batch_size}_documents_s"
+        for extractor, stats in timings.items():
+            mean_doc = sum(stats["per_document_s"].values()) / len(stats["per_document_s"])
+            print(f"{extractor:<18} mean/doc={mean_doc * 1e6:9.1f}us  {args.batch_size} docs={stats[batch_key]:.4f}s")
+        print(f"Results written to {output}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Benchmark for the email and attachment records (src/emails/Email_with_Attachment.py).
+
+Measures the memory held by processed emails as slotted records compared with the plain
+dicts used before, and the size and speed of the JSON serialization.
+
+Usage (from the repository root):
+    python benchmarks/bench_records.py --emails 10000
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from emails.Email_with_Attachment import EmailWithAttachments, AttachmentRecord
+
+VENDORS = ["Stadtwerke GmbH", "Hausmeister Service", "Elektro Schmidt", "Müller Sanitär", "Dachdecker Weber"]
+OWNERS = ["Anna Müller", "Paul Schmidt", "Lukas Becker", "Maria Weber"]
+
+
+def generate_fields(rng, count, attachments_per_email):
+    """Returns the raw values of processed emails, shared by both representations."""
+    emails = []
+    for index in range(count):
+        attachments = []
+        for number in range(attachments_per_email):
+            vendor = rng.choice(VENDORS)
+            invoice_number = f"RE-2025-{index:06d}-{number}"
+            verw_nr = str(1000 + rng.randint(0, 50))
+            attachments.append({
+                "file_name": f"scan_{index}_{number}.pdf",
+                "path": f"/data/processed/{verw_nr}_RG_{vendor}_{invoice_number}.pdf",
+                "invoice_number": invoice_number,
+                "vendor_name": vendor,
+                "doc_type": "Rechnung",
+                "status": "processed",
+                "source": "textract",
+                "verw_nr": verw_nr,
+                "eigentümer": rng.choice(OWNERS),
+            })
+        emails.append({
+            "uid": str(index + 1),
+            "subject": f"Rechnung {index}",
+            "sender": f"billing{index % 97}@supplier.example",
+            "date": f"Mon, 14 Oct 2024 10:{index % 60:02d}:00 +0200",
+            "attachments": attachments,
+        })
+    return emails
+
+
+def measure(build):
+    """Returns (result, bytes allocated by build and still alive)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def timed(function, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return result, min(durations)
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    fields = json.loads(json.dumps(generate_fields(rng, args.emails, args.attachments_per_email)))
+
+    # Both representations are built from fresh copies of the same values, so the strings
+    # are counted for both; only the containers differ
+    dict_emails, dict_bytes = measure(lambda: json.loads(json.dumps(fields)))
+    source = json.dumps(fields)
+    record_emails, record_bytes = measure(lambda: [EmailWithAttachments.from_dict(data) for data in json.loads(source)])
+
+    json_text, json_dump_s = timed(lambda: json.dumps([e.to_dict() for e in record_emails], ensure_ascii=False, indent=4), args.repeat)
+    loaded, json_load_s = timed(lambda: [EmailWithAttachments.from_dict(data) for data in json.loads(json_text)], args.repeat)
+    if [e.to_dict() for e in loaded] != [e.to_dict() for e in record_emails]:
+        raise AssertionError("JSON round trip changed the records.")
+
+    per_10k = 10000 / args.emails
+    del dict_emails
+    return {
+        "benchmark": "records",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "results": {
+            "dict_bytes_per_10k": dict_bytes * per_10k,
+            "record_bytes_per_10k": record_bytes * per_10k,
+            "memory_reduction": 1 - record_bytes / dict_bytes,
+            "json_bytes": len(json_text.encode("utf-8")),
+            "json_dump_s": json_dump_s,
+            "json_load_s": json_load_s,
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the memory and serialization of email records.")
+    parser.add_argument("--emails", type=int, default=10000, help="Number of synthetic processed emails.")
+    parser.add_argument("--attachments-per-email", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per serialization; the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Path of the JSON result file. Defaults to bench_results/.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(args)
+
+    output = args.output or os.path.join("bench_results", f"records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4)
+
+    results = result["results"]
+    print(f"Memory per 10k emails: dicts {results['dict_bytes_per_10k'] / 1e6:.1f} MB, "
+          f"records {results['record_bytes_per_10k'] / 1e6:.1f} MB ({results['memory_reduction']:.0%} less)")
+    print(f"JSON {results['json_bytes'] / 1e6:.1f} MB  dump {results['json_dump_s'] * 1000:.0f}ms  "
+          f"load {results['json_load_s'] * 1000:.0f}ms")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark for the Textract response archive (src/DB/response_archive.py).
+
+Archives synthetic AnalyzeExpense responses with LINE and WORD blocks including their
+geometry, and compares the archive size with the indented JSON written before. Random
+responses are then fetched by job id and by content hash.
+
+Requires the zstandard package. Usage (from the repository root):
+    python benchmarks/bench_response_archive.py --responses 500 --lines 10
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+sys.path.insert(0, BENCH_DIR)
+
+from DB.response_archive import ResponseArchive
+from fakes import build_expense_response
+
+
+def geometry(rng, left, top, width, height):
+    return {
+        "BoundingBox": {"Width": width, "Height": height, "Left": left, "Top": top},
+        "Polygon": [
+            {"X": left + rng.uniform(-1e-4, 1e-4), "Y": top},
+            {"X": left + width, "Y": top + rng.uniform(-1e-4, 1e-4)},
+            {"X": left + width, "Y": top + height},
+            {"X": left, "Y": top + height + rng.uniform(-1e-4, 1e-4)},
+        ],
+    }
+
+
+def add_geometry_blocks(response, rng, pages):
+    """Replaces the blocks with LINE and WORD blocks shaped like real Textract output."""
+    lines = [block["Text"] for block in response["Blocks"]]
+    blocks = []
+    for page in range(1, pages + 1):
+        for number, text in enumerate(lines):
+            top = 0.05 + number * 0.85 / len(lines)
+            line_id = f"{rng.getrandbits(128):032x}"
+            words = []
+            left = 0.08
+            for word in text.split():
+                width = 0.012 * len(word)
+                words.append({
+                    "BlockType": "WORD", "Confidence": rng.uniform(90, 99.9), "Text": word, "TextType": "PRINTED",
+                    "Geometry": geometry(rng, left, top, width, 0.011), "Id": f"{rng.getrandbits(128):032x}",
+                    "Page": page,
+                })
+                left += width + 0.006
+            blocks.append({
+                "BlockType": "LINE", "Confidence": rng.uniform(90, 99.9), "Text": text,
+                "Geometry": geometry(rng, 0.08, top, left - 0.08, 0.011), "Id": line_id,
+                "Relationships": [{"Type": "CHILD", "Ids": [word["Id"] for word in words]}], "Page": page,
+            })
+            blocks.extend(words)
+    response["Blocks"] = blocks
+    response["DocumentMetadata"] = {"Pages": pages}
+    return response
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    parameters = [{"verw_nr": 1000 + i, "eigentümer": f"Eigentümer {i}"} for i in range(20)]
+    workdir = tempfile.mkdtemp(prefix="bench_archive_")
+    archive = ResponseArchive(workdir, level=args.level, train_samples=args.train_samples)
+
+    indented_bytes = 0
+    keys = []
+    started = time.perf_counter()
+    try:
+        for sequence in range(args.responses):
+            response = build_expense_response(f"staging/{sequence}.pdf", sequence, parameters, args.lines)
+            response = add_geometry_blocks(response, rng, args.pages)
+            indented_bytes += len(json.dumps(response, indent=4, ensure_ascii=False).encode("utf-8"))
+            job_id = f"job-{sequence:08d}"
+            content_hash = hashlib.sha256(job_id.encode()).hexdigest()
+            archive.add(response, job_id=job_id, content_hash=content_hash, file_name=f"{sequence}.pdf")
+            keys.append((job_id, content_hash))
+        archive_s = time.perf_counter() - started
+
+        entries = list(archive.entries())
+        raw_bytes = sum(entry.raw_length for entry in entries)
+        stored_bytes = sum(entry.length for entry in entries)
+        trained = [entry for entry in entries if entry.dictionary_id]
+        untrained = [entry for entry in entries if not entry.dictionary_id]
+
+        read_durations = []
+        for _ in range(args.reads):
+            job_id, content_hash = rng.choice(keys)
+            read_started = time.perf_counter()
+            entry = archive.find(job_id=job_id) if rng.random() < 0.5 else archive.find(content_hash=content_hash)
+            entry.load()
+            read_durations.append(time.perf_counter() - read_started)
+        read_durations.sort()
+    finally:
+        archive.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def ratio(items):
+        stored = sum(entry.length for entry in items)
+        return sum(entry.raw_length for entry in items) / stored if stored else None
+
+    return {
+        "benchmark": "response_archive",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "results": {
+            "indented_json_bytes": indented_bytes,
+            "compact_json_bytes": raw_bytes,
+            "archive_bytes": stored_bytes,
+            "reduction_vs_indented": 1 - stored_bytes / indented_bytes,
+            "ratio_without_dictionary": ratio(untrained),
+            "ratio_with_dictionary": ratio(trained),
+            "responses_per_second": args.responses / archive_s if archive_s else None,
+            "read_median_ms": read_durations[len(read_durations) // 2] * 1000,
+            "read_p99_ms": read_durations[int(len(read_durations) * 0.99)] * 1000,
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the compressed Textract response archive.")
+    parser.add_argument("--responses", type=int, default=500, help="Number of synthetic responses.")
+    parser.add_argument("--pages", type=int, default=1, help="Pages per response.")
+    parser.add_argument("--lines", type=int, default=40, help="Text lines per page.")
+    parser.add_argument("--level", type=int, default=10, help="zstd compression level.")
+    parser.add_argument("--train-samples", type=int, default=100, help="Responses archived before the dictionary is trained.")
+    parser.add_argument("--reads", type=int, default=200, help="Random reads after archiving.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Path of the JSON result file. Defaults to bench_results/.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(args)
+
+    output = args.output or os.path.join(
+        "bench_results", f"response_archive_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4)
+
+    results = result["results"]
+    print(f"Indented JSON {results['indented_json_bytes'] / 1e6:.1f} MB, compact JSON "
+          f"{results['compact_json_bytes'] / 1e6:.1f} MB, archive {results['archive_bytes'] / 1e6:.2f} MB "
+          f"({results['reduction_vs_indented']:.1%} smaller than indented JSON)")
+    print(f"Compression ratio without dictionary {results['ratio_without_dictionary'] or 0:.1f}x, "
+          f"with dictionary {results['ratio_with_dictionary'] or 0:.1f}x")
+    print(f"Archived {results['responses_per_second']:.0f} responses/s; random read median "
+          f"{results['read_median_ms']:.2f}ms, p99 {results['read_p99_ms']:.2f}ms")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+End-to-end throughput benchmark for the email ingestion pipeline.
+
+Generates a synthetic mailbox, serves it from an in-process IMAP stand-in and answers
+Textract/S3 calls from local fakes with a configurable latency. The real pipeline
+(`run_cycle` from main.py) is driven over a number of polling cycles, and the result is
+written as JSON so runs can be compared.
+
+Usage (from the repository root):
+    python benchmarks/e2e_throughput.py --messages 200 --cycles 4 --textract-latency 0.5
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from fakes import FakeIMAP, FakeS3Client, FakeTextractClient
+from synthetic_mailbox import generate_mailbox, generate_parameters, mailbox_size_bytes, parse_mix
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(values, pct):
+    """
+    Returns the nearest-rank percentile of a list of values.
+
+    Args:
+        values (list): The samples.
+        pct (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile value, or None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def peak_rss_bytes():
+    """Returns the peak resident set size of this process in bytes, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageTimer:
+    """
+    Wraps module-level functions to record the latency of every call per stage.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self._patched = []
+        self._lock = threading.Lock()
+
+    def wrap(self, module, attribute, stage):
+        original = getattr(module, attribute)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.samples.setdefault(stage, []).append(elapsed)
+
+        setattr(module, attribute, timed)
+        self._patched.append((module, attribute, original))
+
+    def patch(self, module, attribute, replacement):
+        self._patched.append((module, attribute, getattr(module, attribute)))
+        setattr(module, attribute, replacement)
+
+    def restore(self):
+        for module, attribute, original in reversed(self._patched):
+            setattr(module, attribute, original)
+        self._patched.clear()
+
+    def summary(self):
+        return {
+            stage: {
+                "count": len(values),
+                "total_s": sum(values),
+                "mean_s": sum(values) / len(values),
+                "p50_s": percentile(values, 50),
+                "p95_s": percentile(values, 95),
+                "p99_s": percentile(values, 99),
+                "max_s": max(values),
+            }
+            for stage, values in self.samples.items()
+            if values
+        }
+
+
+def run_benchmark(args):
+    import main as app
+    import emails.handler as email_handler
+    import processing.attachments.strategy as strategy
+    import AWS_TEXTRACT.analyze_expense as analyze_expense
+    import AWS_TEXTRACT.s3_staging as s3_staging
+    from imap.mailbox_state import MailboxStateStore
+
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    attachment_folder = os.path.join(workdir, "attachments")
+    destination_folder = os.path.join(workdir, "processed")
+    output_folder = os.path.join(workdir, "processed_emails_split")
+    for folder in (attachment_folder, destination_folder, output_folder):
+        os.makedirs(folder, exist_ok=True)
+
+    mailbox = generate_mailbox(
+        args.messages,
+        attachments_per_message=args.attachments_per_message,
+        attachment_size_kb=args.attachment_size_kb,
+        mix=parse_mix(args.mix),
+        seed=args.seed,
+    )
+    parameters = generate_parameters(args.owners, seed=args.seed)
+    imap = FakeIMAP(mailbox, latency=args.imap_latency)
+    s3 = FakeS3Client(latency=args.s3_latency, bandwidth_mbps=args.s3_bandwidth_mbps)
+    textract = FakeTextractClient(
+        parameters,
+        job_latency=args.textract_latency,
+        call_latency=args.textract_call_latency,
+        lines_per_page=args.lines_per_page,
+    )
+
+    # Isolated configuration so the benchmark never touches config.json
+    bench_config = {"attachment_folder": attachment_folder, "destination_folder": destination_folder, "max_uid": 0}
+    state = {"last_uid": 0}
+
+    def save_last_uid(uid):
+        state["last_uid"] = uid
+
+    timer = StageTimer()
+    timer.patch(email_handler, "load_config", lambda *a, **k: dict(bench_config))
+    timer.patch(email_handler, "save_config", lambda config, *a, **k: bench_config.update(config))
+    timer.patch(app, "save_last_uid", save_last_uid)
+    timer.patch(strategy, "resource_path", lambda relative: os.path.join(workdir, relative))
+    timer.patch(analyze_expense, "get_textract_client", lambda: textract)
+    staging = s3_staging.S3StagingManager("bench-bucket", os.path.join(workdir, "s3_staging_ledger.json"), lambda: s3)
+    timer.patch(s3_staging, "_manager", staging)
+
+    timer.wrap(email_handler, "fetch_emails", "fetch_window")
+    timer.wrap(email_handler, "fetch_email_by_uid", "fetch_email_by_uid")
+    timer.wrap(analyze_expense, "analyze_document_pages", "analyze_document_pages")
+    timer.wrap(analyze_expense, "detect_document_text", "detect_document_text")
+    timer.wrap(strategy, "move_attachment", "move_attachment")
+
+    file_processor = strategy.create_file_processor({"analysis_mode": args.analysis_mode})
+    mailbox_state = MailboxStateStore(os.path.join(workdir, "mailbox_state.json")) if args.mailbox_state else None
+
+    uids = sorted(mailbox)
+    per_cycle = max(len(uids) // args.cycles, 1)
+    cycle_durations = []
+    processed = 0
+
+    start = time.perf_counter()
+    try:
+        for cycle in range(args.cycles + args.idle_cycles):
+            # Deliver the next slice of the mailbox before each polling cycle; idle cycles deliver nothing
+            last_index = len(uids) if cycle >= args.cycles - 1 else min((cycle + 1) * per_cycle, len(uids))
+            imap.visible_max_uid = uids[last_index - 1] if uids else 0
+            imap.state = "AUTH"  # main.py logs in again for every cycle
+
+            cycle_start = time.perf_counter()
+            processed += app.run_cycle(imap, state["last_uid"], parameters, destination_folder, output_folder,
+                                       file_processor=file_processor, window_size=args.window_size,
+                                       mailbox_state=mailbox_state)
+            cycle_durations.append(time.perf_counter() - cycle_start)
+        staging.flush()
+    finally:
+        elapsed = time.perf_counter() - start
+        timer.restore()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    attachments = len(timer.samples.get("analyze_document_pages", []))
+    return {
+        "benchmark": "e2e_throughput",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": vars(args),
+        "mailbox": {"messages": len(mailbox), "bytes": mailbox_size_bytes(mailbox)},
+        "results": {
+            "elapsed_s": elapsed,
+            "emails_processed": processed,
+            "attachments_analyzed": attachments,
+            "emails_per_minute": processed / elapsed * 60 if elapsed else None,
+            "attachments_per_minute": attachments / elapsed * 60 if elapsed else None,
+            "cycle_durations_s": cycle_durations,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "imap_commands": imap.commands,
+            "imap_bytes": imap.bytes_sent,
+            "s3_bytes_uploaded": s3.bytes_uploaded,
+            "s3_requests": dict(s3.calls),
+            "s3_objects_left": len(s3.objects),
+            "textract_calls": dict(textract.calls),
+        },
+        "stages": timer.summary(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark with a synthetic mailbox.")
+    parser.add_argument("--messages", type=int, default=100, help="Number of synthetic messages.")
+    parser.add_argument("--attachments-per-message", type=int, default=1)
+    parser.add_argument("--attachment-size-kb", type=int, default=200, help="Average attachment size.")
+    parser.add_argument("--mix", default="", help='Attachment mix, e.g. "pdf=0.7,png=0.2,txt=0.1".')
+    parser.add_argument("--owners", type=int, default=200, help="Number of synthetic owner entries.")
+    parser.add_argument("--cycles", type=int, default=1, help="Number of polling cycles to spread delivery over.")
+    parser.add_argument("--imap-latency", type=float, default=0.0, help="Seconds per IMAP command.")
+    parser.add_argument("--s3-latency", type=float, default=0.05, help="Seconds per S3 call.")
+    parser.add_argument("--s3-bandwidth-mbps", type=float, default=0.0, help="Upload bandwidth, 0 = unlimited.")
+    parser.add_argument("--textract-latency", type=float, default=0.5, help="Seconds until a job completes.")
+    parser.add_argument("--textract-call-latency", type=float, default=0.02, help="Seconds per Textract API call.")
+    parser.add_argument("--lines-per-page", type=int, default=60, help="LINE blocks in each fake response.")
+    parser.add_argument("--analysis-mode", choices=("expense", "tiered"), default="expense",
+                        help="Analysis mode of the file processor (see analysis_mode in config.json).")
+    parser.add_argument("--window-size", type=int, default=100, help="UIDs per catch-up window.")
+    parser.add_argument("--idle-cycles", type=int, default=0, help="Extra polling cycles without new mail at the end.")
+    parser.add_argument("--mailbox-state", action="store_true",
+                        help="Track UIDVALIDITY/UIDNEXT/HIGHESTMODSEQ and skip the search when nothing changed.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Path of the JSON result file. Defaults to bench_results/.")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the temporary working directory.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(args)
+
+    output = args.output or os.path.join(
+        "bench_results", f"e2e_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4)
+
+    results = result["results"]
+    print(f"Emails/min: {results['emails_per_minute']:.1f}  Attachments/min: {results['attachments_per_minute']:.1f}")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<28} n={stats['count']:<6} p50={stats['p50_s']:.4f}s p95={stats['p95_s']:.4f}s p99={stats['p99_s']:.4f}s")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+class FakeIMAP:
+    """
+    In-process stand-in for imaplib.IMAP4_SSL serving a synthetic mailbox.
+
+    Only the commands used by the application are implemented. Every command
+    sleeps for `latency` seconds to emulate the network round trip. SELECT reports
+    UIDVALIDITY, UIDNEXT and, with the CONDSTORE parameter, HIGHESTMODSEQ.
+    """
+
+    capabilities = ("IMAP4REV1", "CONDSTORE")
+
+    def __init__(self, mailbox, latency=0.0, uidvalidity=1):
+        self.mailbox = mailbox
+        self.latency = latency
+        self.visible_max_uid = max(mailbox) if mailbox else 0
+        self.uidvalidity = uidvalidity
+        self.commands = 0
+        self.bytes_sent = 0
+        self.state = "AUTH"
+        self._responses = {}
+
+    def _round_trip(self):
+        self.commands += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def login(self, username, password):
+        self._round_trip()
+        return "OK", [b"LOGIN completed"]
+
+    def select(self, mailbox="INBOX", readonly=False):
+        self._round_trip()
+        self.state = "SELECTED"
+        self._responses = {
+            "UIDVALIDITY": [str(self.uidvalidity).encode()],
+            "UIDNEXT": [str(self.visible_max_uid + 1).encode()],
+        }
+        if mailbox.upper().endswith("(CONDSTORE)"):
+            # Every delivered email bumps the modification sequence
+            self._responses["HIGHESTMODSEQ"] = [str(1000 + self.visible_max_uid).encode()]
+        return "OK", [str(len(self._visible_uids())).encode()]
+
+    def response(self, code):
+        return code, self._responses.pop(code.upper(), [None])
+
+    def _visible_uids(self):
+        return [uid for uid in self.mailbox if uid <= self.visible_max_uid]
+
+    def search(self, charset, *criteria):
+        self._round_trip()
+        uids = self._visible_uids()
+        return "OK", [" ".join(str(uid) for uid in uids).encode()]
+
+    def uid(self, command, *args):
+        self._round_trip()
+        command = command.upper()
+
+        if command == "SEARCH":
+            criteria = args[-1]
+            match = re.match(r"UID (\d+):(\*|\d+)", criteria)
+            uids = self._visible_uids()
+            if match:
+                start = int(match.group(1))
+                end = self.visible_max_uid if match.group(2) == "*" else int(match.group(2))
+                selected = [uid for uid in uids if start <= uid <= end]
+                # "n:*" always includes the highest UID, as on a real server
+                if match.group(2) == "*" and not selected and uids:
+                    selected = [max(uids)]
+                uids = selected
+            return "OK", [" ".join(str(uid) for uid in uids).encode()]
+
+        if command == "FETCH":
+            uid = int(args[0])
+            raw = self.mailbox.get(uid)
+            if raw is None or uid > self.visible_max_uid:
+                return "OK", [None]
+            self.bytes_sent += len(raw)
+            header = f"{uid} (UID {uid} RFC822 {{{len(raw)}}}".encode()
+            return "OK", [(header, raw), b")"]
+
+        return "BAD", [f"Unsupported command {command}".encode()]
+
+    def logout(self):
+        self._round_trip()
+        return "BYE", [b"LOGOUT"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.logout()
+
+
+class FakeS3Client:
+    """
+    Local stand-in for the boto3 S3 client with a configurable latency and bandwidth.
+    """
+
+    def __init__(self, latency=0.0, bandwidth_mbps=0.0):
+        self.latency = latency
+        self.bandwidth_mbps = bandwidth_mbps
+        self.objects = {}
+        self.bytes_uploaded = 0
+        self.calls = {"upload_file": 0, "delete_object": 0, "delete_objects": 0, "list_objects_v2": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def _transfer_delay(self, size_bytes):
+        delay = self.latency
+        if self.bandwidth_mbps:
+            delay += (size_bytes * 8) / (self.bandwidth_mbps * 1_000_000)
+        if delay:
+            time.sleep(delay)
+
+    def upload_file(self, file_name, bucket, key, **kwargs):
+        self._count("upload_file")
+        size_bytes = os.path.getsize(file_name)
+        self._transfer_delay(size_bytes)
+        with self._lock:
+            self.objects[(bucket, key)] = (size_bytes, datetime.now(timezone.utc))
+            self.bytes_uploaded += size_bytes
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._count("delete_object")
+        self._transfer_delay(0)
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._count("delete_objects")
+        self._transfer_delay(0)
+        deleted = []
+        with self._lock:
+            for item in Delete.get("Objects", []):
+                self.objects.pop((Bucket, item["Key"]), None)
+                deleted.append({"Key": item["Key"]})
+        return {"Deleted": deleted}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        self._count("list_objects_v2")
+        self._transfer_delay(0)
+        with self._lock:
+            contents = [
+                {"Key": key, "Size": size_bytes, "LastModified": modified}
+                for (bucket, key), (size_bytes, modified) in sorted(self.objects.items())
+                if bucket == Bucket and key.startswith(Prefix)
+            ]
+        return {"Contents": contents, "IsTruncated": False, "KeyCount": len(contents)}
+
+
+class FakeTextractClient:
+    """
+    Local stand-in for the boto3 Textract client.
+
+    Jobs complete `job_latency` seconds after they are started. GetExpenseAnalysis
+    blocks until the job is done, so the application's 5 second poll sleep is never hit
+    and the measured time reflects the configured latency only.
+    """
+
+    def __init__(self, parameters, job_latency=1.0, call_latency=0.0, lines_per_page=60, match_rate=0.8):
+        self.parameters = parameters
+        self.job_latency = job_latency
+        self.call_latency = call_latency
+        self.lines_per_page = lines_per_page
+        self.match_rate = match_rate
+        self.jobs = {}
+        self.calls = {
+            "start_expense_analysis": 0,
+            "get_expense_analysis": 0,
+            "detect_document_text": 0,
+            "start_document_text_detection": 0,
+            "get_document_text_detection": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _round_trip(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.call_latency:
+            time.sleep(self.call_latency)
+
+    def start_expense_analysis(self, DocumentLocation, **kwargs):
+        self._round_trip("start_expense_analysis")
+        job_id = uuid.uuid4().hex
+        key = DocumentLocation["S3Object"]["Name"]
+        with self._lock:
+            self.jobs[job_id] = (time.monotonic() + self.job_latency, key, len(self.jobs))
+        return {"JobId": job_id}
+
+    def get_expense_analysis(self, JobId, **kwargs):
+        self._round_trip("get_expense_analysis")
+        return self._finished_response(JobId)
+
+    def _finished_response(self, job_id):
+        ready_at, key, sequence = self.jobs[job_id]
+        remaining = ready_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return build_expense_response(key, sequence, self.parameters, self.lines_per_page, self.match_rate)
+
+    def start_document_text_detection(self, DocumentLocation, **kwargs):
+        self._round_trip("start_document_text_detection")
+        job_id = uuid.uuid4().hex
+        key = DocumentLocation["S3Object"]["Name"]
+        with self._lock:
+            self.jobs[job_id] = (time.monotonic() + self.job_latency, key, len(self.jobs))
+        return {"JobId": job_id}
+
+    def get_document_text_detection(self, JobId, **kwargs):
+        self._round_trip("get_document_text_detection")
+        response = self._finished_response(JobId)
+        return {key: response[key] for key in ("JobStatus", "DocumentMetadata", "Blocks")}
+
+    def detect_document_text(self, Document, **kwargs):
+        self._round_trip("detect_document_text")
+        with self._lock:
+            sequence = len(self.jobs)
+            self.jobs[uuid.uuid4().hex] = (0, "image", sequence)
+        response = build_expense_response("image", sequence, self.parameters, self.lines_per_page, self.match_rate)
+        return {key: response[key] for key in ("DocumentMetadata", "Blocks")}
+
+
+def build_expense_response(key, sequence, parameters, lines_per_page=60, match_rate=0.8):
+    """
+    Builds a synthetic AnalyzeExpense response for a staged document.
+
+    Args:
+        key (str): The S3 key of the analyzed document.
+        sequence (int): Running job number, used to vary the content.
+        parameters (list): Owner parameters; a fraction of documents mention one of them.
+        lines_per_page (int): Number of LINE blocks to emit.
+        match_rate (float): Fraction of documents that mention a known owner.
+
+    Returns:
+        dict: A response shaped like GetExpenseAnalysis output.
+    """
+    invoice_number = f"RE-2025-{sequence:06d}"
+    vendor_name = f"Supplier {sequence % 50} GmbH"
+    owner = None
+    if parameters and (sequence % 100) < match_rate * 100:
+        owner = parameters[sequence % len(parameters)]["eigentümer"]
+
+    def summary_field(field_type, label, value, confidence=98.5):
+        return {
+            "Type": {"Text": field_type, "Confidence": 99.0},
+            "LabelDetection": {"Text": label, "Confidence": 97.0},
+            "ValueDetection": {"Text": value, "Confidence": confidence},
+            "PageNumber": 1,
+        }
+
+    lines = [f"{vendor_name}", "Musterstraße 1, 12345 Musterstadt", f"Rechnung Nr. {invoice_number}"]
+    if owner:
+        lines.append(owner)
+    lines.extend(f"Position {index} Leistung laut Vertrag {key} 19,99 EUR" for index in range(lines_per_page))
+
+    return {
+        "JobStatus": "SUCCEEDED",
+        "DocumentMetadata": {"Pages": 1},
+        "ExpenseDocuments": [
+            {
+                "ExpenseIndex": 1,
+                "SummaryFields": [
+                    summary_field("INVOICE_RECEIPT_ID", "Rechnungsnummer", invoice_number),
+                    summary_field("VENDOR_NAME", "", vendor_name),
+                    summary_field("INVOICE_RECEIPT_DATE", "Datum", "01.02.2025"),
+                    summary_field("TOTAL", "Gesamtbetrag", "119,00"),
+                ],
+                "LineItemGroups": [
+                    {
+                        "LineItemGroupIndex": 1,
+                        "LineItems": [
+                            {
+                                "LineItemExpenseFields": [
+                                    summary_field("ITEM", "Beschreibung", "Wartung Heizungsanlage"),
+                                    summary_field("PRICE", "Betrag", "100,00"),
+                                ]
+                            }
+                        ],
+                    }
+                ],
+            }
+        ],
+        "Blocks": [
+            {"BlockType": "LINE", "Text": text, "Confidence": 99.0, "Page": 1, "Id": f"line-{index}"}
+            for index, text in enumerate(lines)
+        ],
+    }
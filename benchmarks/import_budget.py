@@ -0,0 +1,86 @@
+"""
+Import-time budget check for the application entry point.
+
+Imports main.py in a fresh interpreter with `-X importtime`, and fails when the
+cumulative import time exceeds the budget or when a heavy dependency that must be
+loaded lazily (boto3, botocore, rapidfuzz, dotenv) is imported at startup.
+
+Usage (from the repository root):
+    python benchmarks/import_budget.py --budget-ms 250
+
+The exit code is 1 when the budget is exceeded or a lazy dependency is imported eagerly.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "src"))
+
+# Packages that must not be imported until the first document is analyzed
+LAZY_MODULES = ("boto3", "botocore", "s3transfer", "rapidfuzz", "dotenv")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def measure_import(module="main"):
+    """
+    Imports a module in a fresh interpreter and parses the -X importtime output.
+
+    Args:
+        module (str): Module to import.
+
+    Returns:
+        tuple: (cumulative microseconds of the module, set of all imported module names)
+    """
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        # Run in a scratch directory so the logs/ folder created at import lands there
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True,
+        )
+
+    cumulative = None
+    imported = set()
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        imported.add(name)
+        if name == module and not match.group(3):
+            cumulative = int(match.group(2))
+    return cumulative, imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail when the startup import time regresses.")
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="Maximum cumulative import time of main.py.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters; the fastest run counts.")
+    args = parser.parse_args(argv)
+
+    # The first run also warms the bytecode cache
+    results = [measure_import() for _ in range(max(args.runs, 1))]
+    best_us = min(cumulative for cumulative, _ in results)
+    imported = results[-1][1]
+
+    eager = sorted(name for name in imported if name.split(".")[0] in LAZY_MODULES)
+    failed = False
+    print(f"Import of main.py: {best_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if best_us / 1000 > args.budget_ms:
+        print("FAIL: startup import time is over budget")
+        failed = True
+    if eager:
+        print(f"FAIL: modules that should be lazy were imported at startup: {', '.join(eager)}")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
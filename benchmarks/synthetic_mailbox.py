@@ -0,0 +1,140 @@
+import random
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+# Content types used for the synthetic attachments, keyed by extension
+CONTENT_TYPES = {
+    "pdf": ("application", "pdf"),
+    "png": ("image", "png"),
+    "jpg": ("image", "jpeg"),
+    "jpeg": ("image", "jpeg"),
+    "txt": ("text", "plain"),
+    "docx": ("application", "vnd.openxmlformats-officedocument.wordprocessingml.document"),
+}
+
+DEFAULT_MIX = {"pdf": 0.7, "png": 0.1, "jpg": 0.1, "txt": 0.1}
+
+
+def parse_mix(mix):
+    """
+    Parses an attachment mix such as "pdf=0.7,png=0.2,txt=0.1".
+
+    Args:
+        mix (str): Comma-separated extension=weight pairs.
+
+    Returns:
+        dict: Extension to weight mapping.
+    """
+    if not mix:
+        return dict(DEFAULT_MIX)
+
+    weights = {}
+    for item in mix.split(","):
+        extension, _, weight = item.partition("=")
+        extension = extension.strip().lower()
+        if extension not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported attachment type in mix: {extension}")
+        weights[extension] = float(weight or 1)
+    return weights
+
+
+def make_attachment_payload(extension, size_bytes, rng):
+    """
+    Builds attachment bytes of roughly the requested size with a plausible file header.
+
+    Args:
+        extension (str): File extension of the attachment.
+        size_bytes (int): Target payload size in bytes.
+        rng (random.Random): Random generator used for the padding.
+
+    Returns:
+        bytes: The attachment content.
+    """
+    headers = {
+        "pdf": b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n",
+        "png": b"\x89PNG\r\n\x1a\n",
+        "jpg": b"\xff\xd8\xff\xe0",
+        "jpeg": b"\xff\xd8\xff\xe0",
+    }
+    header = headers.get(extension, b"")
+    padding = max(size_bytes - len(header), 0)
+    return header + rng.randbytes(padding)
+
+
+def generate_mailbox(message_count, attachments_per_message=1, attachment_size_kb=200, mix=None, seed=42):
+    """
+    Generates a synthetic mailbox as a mapping of UID to raw RFC822 bytes.
+
+    Args:
+        message_count (int): Number of messages to generate.
+        attachments_per_message (int): Number of attachments on each message.
+        attachment_size_kb (int): Average attachment size in KB (varies by +/- 50%).
+        mix (dict): Extension to weight mapping for the attachment types.
+        seed (int): Seed for reproducible mailboxes.
+
+    Returns:
+        dict: UID (int) to raw message bytes, in ascending UID order.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    extensions = list(mix.keys())
+    weights = list(mix.values())
+    start_date = datetime(2025, 1, 1, 8, 0, tzinfo=timezone.utc)
+
+    mailbox = {}
+    for index in range(message_count):
+        uid = index + 1
+        msg = EmailMessage()
+        msg["Subject"] = f"Rechnung {10000 + uid}"
+        msg["From"] = f"Supplier {uid % 50} <billing{uid % 50}@supplier.example>"
+        msg["To"] = "invoices@example.com"
+        msg["Date"] = format_datetime(start_date + timedelta(minutes=7 * index))
+        msg.set_content("Anbei erhalten Sie Ihre Rechnung.")
+
+        for position in range(attachments_per_message):
+            extension = rng.choices(extensions, weights=weights)[0]
+            size_bytes = int(attachment_size_kb * 1024 * rng.uniform(0.5, 1.5))
+            maintype, subtype = CONTENT_TYPES[extension]
+            msg.add_attachment(
+                make_attachment_payload(extension, size_bytes, rng),
+                maintype=maintype,
+                subtype=subtype,
+                filename=f"invoice_{uid}_{position}.{extension}",
+            )
+
+        mailbox[uid] = msg.as_bytes()
+
+    return mailbox
+
+
+def generate_parameters(count=200, seed=42):
+    """
+    Generates synthetic owner parameters in the same shape as DB/db_objects.json.
+
+    Args:
+        count (int): Number of owner entries.
+        seed (int): Seed for reproducible parameters.
+
+    Returns:
+        list: A list of dictionaries containing 'verw_nr', 'objekt', and 'eigentümer'.
+    """
+    rng = random.Random(seed)
+    first_names = ["Anna", "Jonas", "Lea", "Paul", "Marie", "Felix", "Sophie", "Lukas", "Emma", "Max"]
+    last_names = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Hoffmann", "Koch"]
+    streets = ["Hauptstraße", "Bahnhofstraße", "Gartenweg", "Lindenallee", "Schulstraße"]
+
+    return [
+        {
+            "verw_nr": f"{1000 + index}",
+            "objekt": f"{rng.choice(streets)} {rng.randint(1, 120)}",
+            "eigentümer": f"{rng.choice(first_names)} {rng.choice(last_names)} {index}",
+        }
+        for index in range(count)
+    ]
+
+
+def mailbox_size_bytes(mailbox):
+    """Returns the total size in bytes of all raw messages in the mailbox."""
+    return sum(len(raw) for raw in mailbox.values())
+
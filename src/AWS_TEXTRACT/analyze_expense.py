@@ -1,6 +1,5 @@
 
 import os
-import boto3
 import json
 import time
 from config.aws_config import get_textract_client
@@ -8,59 +7,137 @@ from config.loggin_config import logger
 from rapidfuzz import fuzz
 import re
 from rapidfuzz.process import extractOne
-from utils.resource_path import resource_path
-from dotenv import load_dotenv
-
-dotenv_path = resource_path('.env')
-load_dotenv(dotenv_path) 
+from AWS_TEXTRACT.rate_limiter import rate_limited, is_throttling_error, is_transient_error
+from AWS_TEXTRACT.s3_staging import get_staging_manager
+from processing.file_handler import file_sha256
+from monitoring.metrics import counter, histogram
+
+
+TEXTRACT_JOB_SECONDS = histogram(
+    "textract_job_seconds", "Time from starting a Textract job until it finished.", ("api",)
+)
+TEXTRACT_JOB_POLLS = histogram(
+    "textract_job_polls",
+    "Status polls needed per Textract job.",
+    ("api",),
+    buckets=(1, 2, 3, 5, 8, 11),
+)
+TEXTRACT_JOBS = counter("textract_jobs_total", "Textract jobs by API and final status.", ("api", "status"))
+
+SUPPORTED_EXTENSIONS = (".pdf", ".jpeg", ".jpg", ".png")
+
+# Synchronous DetectDocumentText accepts images up to 10 MB
+SYNC_IMAGE_LIMIT_BYTES = 10 * 1024 * 1024
+
+def get_job_results(textract_client, job_id, operation="get_expense_analysis"):
+    """Get results from completed Textract job, following NextToken for multi-page documents"""
+    get_page = getattr(textract_client, operation)
+    response = rate_limited(operation, get_page, JobId=job_id)
+    next_token = response.get("NextToken")
+    while next_token:
+        page = rate_limited(operation, get_page, JobId=job_id, NextToken=next_token)
+        if "ExpenseDocuments" in page:
+            response.setdefault("ExpenseDocuments", []).extend(page["ExpenseDocuments"])
+        response.setdefault("Blocks", []).extend(page.get("Blocks", []))
+        next_token = page.get("NextToken")
+    response.pop("NextToken", None)
+    return response
 
+def wait_for_job(textract_client, job_id, api, operation, max_retries=10):
+    """
+    Polls an asynchronous Textract job until it finished.
 
-S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+    Args:
+        textract_client: The Textract client.
+        job_id (str): The job ID returned by the Start* call.
+        api (str): API name for the metrics, e.g. "analyze_expense".
+        operation (str): Name of the client method returning the job status.
+        max_retries (int): Maximum number of polls before giving up.
 
-def get_s3_client():
-    """Get S3 client using the same configuration as textract"""
-    session = boto3.Session()
-    credentials = session.get_credentials()
-    frozen_credentials = credentials.get_frozen_credentials()
-    
-    return boto3.client(
-        's3',
-        aws_access_key_id=frozen_credentials.access_key,
-        aws_secret_access_key=frozen_credentials.secret_key,
-        aws_session_token=frozen_credentials.token
-    )
-def upload_to_s3(local_file_path, s3_file_name):
-    """Upload file to S3 bucket"""
+    Returns:
+        str: "SUCCEEDED" or "FAILED", or None if the job is still running after max_retries.
+    """
+    job_started = time.perf_counter()
+    retries = 0
+
+    while True:
+        response = rate_limited(operation, getattr(textract_client, operation), JobId=job_id)
+        status = response['JobStatus']
+        logger.info(f"Status: {status}")
+
+        if status in ['SUCCEEDED', 'FAILED']:
+            break
+
+        if retries >= max_retries:
+            logger.warning("Timeout reached: Job is still in progress.")
+            TEXTRACT_JOB_POLLS.labels(api=api).observe(retries + 1)
+            TEXTRACT_JOBS.labels(api=api, status="TIMEOUT").inc()
+            return None
+        retries += 1
+        time.sleep(5)
+
+    TEXTRACT_JOB_SECONDS.labels(api=api).observe(time.perf_counter() - job_started)
+    TEXTRACT_JOB_POLLS.labels(api=api).observe(retries + 1)
+    TEXTRACT_JOBS.labels(api=api, status=status).inc()
+    return status
+
+def archive_response(archive, response, job_id, content_hash, operation, file_path):
+    """
+    Adds a raw Textract response to the response archive. Failures are logged and ignored,
+    the analysis result does not depend on the archive.
+
+    Args:
+        archive (ResponseArchive): The archive, or None to skip archiving.
+        response (dict): The Textract response.
+        job_id (str): The Textract job id (None for synchronous calls).
+        content_hash (str): SHA-256 of the original attachment; the analyzed file is hashed if None.
+        operation (str): The Textract API.
+        file_path (str): Path of the analyzed file.
+    """
+    if archive is None or not response:
+        return
     try:
-        s3_client = get_s3_client()
-        s3_client.upload_file(local_file_path, S3_BUCKET_NAME, s3_file_name)
-        return True
+        archive.add(response, job_id=job_id, content_hash=content_hash or file_sha256(file_path), operation=operation,
+                    file_name=os.path.basename(file_path))
     except Exception as e:
-        logger.warning(f"Error uploading to S3: {e}")
-        return False
+        logger.warning(f"Could not archive the {operation} response for {file_path}: {e}")
 
-def get_job_results(textract_client, job_id):
-    """Get results from completed Textract job"""
-    response = textract_client.get_expense_analysis(JobId=job_id)
-    return response
+def analyze_document_pages(file_path, output_json_path=None, archive=None, content_hash=None):
+    """
+    Analyzes a document with an asynchronous Textract expense analysis job.
 
-def analyze_document_pages(file_path, output_json_path):
+    Args:
+        file_path (str): Path of the PDF or image to analyze.
+        output_json_path (str): Optional path where the full response is saved as JSON.
+        archive (ResponseArchive): Optional archive the raw response is added to.
+        content_hash (str): SHA-256 of the original attachment, the archive key.
+
+    Returns:
+        dict: The GetExpenseAnalysis response, or None if the analysis failed.
+
+    Raises:
+        Exception: The throttling error if the calls were still throttled after the rate
+            limiter's retries, or a network error (see rate_limiter.is_transient_error).
+    """
     textract_client = get_textract_client()
-    s3_client = get_s3_client()
-    
+    staging = get_staging_manager()
+    s3_key = None
+
     try:
-        if file_path.lower().endswith((".pdf", ".jpeg", ".png")):
-            # Upload to S3
-            s3_file_name = os.path.basename(file_path)
-            if not upload_to_s3(file_path, s3_file_name):
-                return
+        if file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+            # Upload to S3 under a unique key
+            s3_key = staging.stage(file_path)
+            if not s3_key:
+                return None
 
             # Start async analysis
-            response = textract_client.start_expense_analysis(
+            response = rate_limited(
+                "start_expense_analysis",
+                textract_client.start_expense_analysis,
                 DocumentLocation={
                     'S3Object': {
-                        'Bucket': S3_BUCKET_NAME,
-                        'Name': s3_file_name
+                        'Bucket': staging.bucket,
+                        'Name': s3_key
                     }
                 }
             )
@@ -68,46 +145,110 @@ def analyze_document_pages(file_path, output_json_path):
             job_id = response['JobId']
             logger.info(f" Started analysis job: {job_id}")
 
-            # Wait for job completion with a timeout
-            max_retries = 10  # Maximum number of retries
-            retries = 0
-
             # Wait for job completion
-            while True:
-                response = textract_client.get_expense_analysis(JobId=job_id)
-                status = response['JobStatus']
-                logger.info(f"Status: {status}")
-                
-                if status in ['SUCCEEDED', 'FAILED']:
-                    break
-
-                if retries >= max_retries:
-                    logger.warning("Timeout reached: Job is still in progress.")
-                    return               
-                retries += 1
-                time.sleep(5)
+            status = wait_for_job(textract_client, job_id, "analyze_expense", "get_expense_analysis")
+            if status is None:
+                return None
 
             if status == 'FAILED':
                 logger.error("Analysis job failed")
-                return
+                return None
 
             # Get results
             response = get_job_results(textract_client, job_id)
+            archive_response(archive, response, job_id, content_hash, "analyze_expense", file_path)
 
             # Save response to JSON
-            with open(output_json_path, "w", encoding="utf-8") as json_file:
-                json.dump(response, json_file, indent=4, ensure_ascii=False)
+            if output_json_path:
+                with open(output_json_path, "w", encoding="utf-8") as json_file:
+                    json.dump(response, json_file, indent=4, ensure_ascii=False)
 
-            logger.info(f"\nFull response saved to {output_json_path}\n")
+                logger.info(f"\nFull response saved to {output_json_path}\n")
 
-            # Delete the file from S3 after processing
-            delete_from_s3(s3_file_name)
+            return response
 
         else:
             logger.warning("The file is not in a supported format. Supported formats: PDF, JPG, PNG")
 
     except Exception as e:
+        if is_transient_error(e):
+            # Still throttled after the rate limiter's retries, or AWS unreachable; the caller
+            # keeps the file for a later run
+            logger.error(f" Expense analysis {'throttled' if is_throttling_error(e) else 'interrupted'}: {e}")
+            raise
         logger.error(f" Error processing the file: {e}")
+    finally:
+        # Queue the staging object for the batched delete, also after failures and timeouts
+        if s3_key:
+            staging.release(s3_key)
+    return None
+
+def detect_document_text(file_path, archive=None, content_hash=None):
+    """
+    Runs Textract text detection (OCR only, no expense analysis) on a document.
+
+    Images up to 10 MB are sent directly with the synchronous DetectDocumentText call;
+    PDFs and larger images are staged in S3 and analyzed with an asynchronous job.
+
+    Args:
+        file_path (str): Path of the PDF or image.
+        archive (ResponseArchive): Optional archive the raw response is added to.
+        content_hash (str): SHA-256 of the original attachment, the archive key.
+
+    Returns:
+        dict: The response with LINE and WORD blocks, or None if the detection failed.
+
+    Raises:
+        Exception: The throttling error if the calls were still throttled after the rate
+            limiter's retries, or a network error (see rate_limiter.is_transient_error).
+    """
+    textract_client = get_textract_client()
+
+    try:
+        if not file_path.lower().endswith(SUPPORTED_EXTENSIONS):
+            logger.warning("The file is not in a supported format. Supported formats: PDF, JPG, PNG")
+            return None
+
+        if not file_path.lower().endswith(".pdf") and os.path.getsize(file_path) <= SYNC_IMAGE_LIMIT_BYTES:
+            with open(file_path, "rb") as f:
+                started = time.perf_counter()
+                response = rate_limited(
+                    "detect_document_text", textract_client.detect_document_text, Document={"Bytes": f.read()}
+                )
+            TEXTRACT_JOB_SECONDS.labels(api="detect_document_text").observe(time.perf_counter() - started)
+            TEXTRACT_JOBS.labels(api="detect_document_text", status="SUCCEEDED").inc()
+            archive_response(archive, response, None, content_hash, "detect_document_text", file_path)
+            return response
+
+        staging = get_staging_manager()
+        s3_key = staging.stage(file_path)
+        if not s3_key:
+            return None
+        try:
+            response = rate_limited(
+                "start_document_text_detection",
+                textract_client.start_document_text_detection,
+                DocumentLocation={'S3Object': {'Bucket': staging.bucket, 'Name': s3_key}}
+            )
+            job_id = response['JobId']
+            logger.info(f" Started text detection job: {job_id}")
+
+            status = wait_for_job(textract_client, job_id, "detect_document_text", "get_document_text_detection")
+            if status != 'SUCCEEDED':
+                logger.error(f"Text detection job did not succeed: {status}")
+                return None
+            response = get_job_results(textract_client, job_id, "get_document_text_detection")
+            archive_response(archive, response, job_id, content_hash, "detect_document_text", file_path)
+            return response
+        finally:
+            staging.release(s3_key)
+
+    except Exception as e:
+        if is_transient_error(e):
+            logger.error(f" Text detection {'throttled' if is_throttling_error(e) else 'interrupted'}: {e}")
+            raise
+        logger.error(f" Error detecting text in the file: {e}")
+    return None
 
 def extract_field_with_max_confidence(response, search_keywords):
     """
@@ -313,13 +454,3 @@ def extract_document_type_from_response(response):
                 return "Lieferschein", match_lieferschein[1]
     
     return None, None
-
-def delete_from_s3(s3_file_name):
-    """Delete file from S3 bucket"""
-    try:
-        s3_client = get_s3_client()
-        s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=s3_file_name)
-        logger.info(f"Deleted {s3_file_name} from S3.")
-    except Exception as e:
-        logger.warning(f"Error deleting {s3_file_name} from S3: {e}")
-
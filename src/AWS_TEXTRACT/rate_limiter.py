@@ -0,0 +1,287 @@
+import random
+import threading
+import time
+from config.loggin_config import logger
+from monitoring.metrics import counter, gauge, histogram
+
+# Error codes AWS uses to signal that a request was throttled
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "Throttling",
+    "ProvisionedThroughputExceededException",
+    "LimitExceededException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "SlowDown",
+}
+
+# Network failures raised by botocore and urllib3, matched by class name like the throttling codes
+CONNECTION_ERROR_NAMES = {
+    "EndpointConnectionError",
+    "ConnectionClosedError",
+    "ConnectTimeoutError",
+    "ReadTimeoutError",
+    "ProxyConnectionError",
+    "NewConnectionError",
+    "ProtocolError",
+}
+
+# Requests per second, burst size and maximum concurrent calls per API. The Textract values
+# follow the default account quotas; override them with "aws_rate_limits" in config.json.
+DEFAULT_LIMITS = {
+    "start_expense_analysis": {"rate": 2.0, "burst": 2, "max_concurrency": 4},
+    "get_expense_analysis": {"rate": 5.0, "burst": 5, "max_concurrency": 8},
+    "start_document_text_detection": {"rate": 2.0, "burst": 2, "max_concurrency": 4},
+    "get_document_text_detection": {"rate": 5.0, "burst": 5, "max_concurrency": 8},
+    "detect_document_text": {"rate": 5.0, "burst": 5, "max_concurrency": 4},
+    "s3": {"rate": 50.0, "burst": 50, "max_concurrency": 16},
+}
+FALLBACK_LIMIT = {"rate": 5.0, "burst": 5, "max_concurrency": 4}
+
+AWS_THROTTLES = counter("aws_throttled_calls_total", "AWS calls rejected with a throttling error.", ("api",))
+AWS_RETRIES = counter("aws_call_retries_total", "AWS calls retried after throttling.", ("api",))
+AWS_WAIT_SECONDS = histogram(
+    "aws_rate_limit_wait_seconds",
+    "Time a call waited for a token and a concurrency slot.",
+    ("api",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+AWS_CONCURRENCY_LIMIT = gauge("aws_concurrency_limit", "Current AIMD concurrency limit per API.", ("api",))
+
+
+def is_throttling_error(error):
+    """
+    Returns True if an exception is an AWS throttling error.
+
+    Works with botocore ClientErrors (error.response["Error"]["Code"]) and with exception
+    classes named after the error code, without importing botocore.
+    """
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        if code in THROTTLING_ERROR_CODES:
+            return True
+    return type(error).__name__ in THROTTLING_ERROR_CODES
+
+
+def is_transient_error(error):
+    """
+    Returns True if an exception is worth retrying later: an AWS throttling error or a network
+    failure (connection refused or reset, timeout), also when it caused the exception.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if is_throttling_error(error) or isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        if any(cls.__name__ in CONNECTION_ERROR_NAMES for cls in type(error).__mro__):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0 or burst < 1:
+            raise ValueError("A token bucket needs rate > 0 and burst >= 1.")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class AdaptiveRateLimiter:
+    """
+    Rate limiter for one AWS API.
+
+    Every call takes a token from a token bucket (the per-second quota) and a slot of an
+    AIMD concurrency window. A throttled call halves the window (multiplicative decrease) and
+    is retried after a full-jitter exponential backoff; each successful call grows the window
+    by 1/window, i.e. by about one slot per round of calls (additive increase), up to
+    max_concurrency. Callers therefore converge on the account limit instead of failing.
+    """
+
+    def __init__(self, api, rate, burst, max_concurrency=4, max_retries=6, base_delay=0.5, max_delay=20.0,
+                 decrease_factor=0.5):
+        """
+        Args:
+            api (str): API name, used in logs and metric labels.
+            rate (float): Requests per second.
+            burst (int): Bucket size.
+            max_concurrency (int): Upper bound of the concurrency window.
+            max_retries (int): Retries of a throttled call before the error is raised.
+            base_delay (float): First backoff in seconds; doubles with every retry.
+            max_delay (float): Upper bound of the backoff.
+            decrease_factor (float): Factor applied to the window on throttling.
+        """
+        self.api = api
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.decrease_factor = decrease_factor
+        self.window = float(self.max_concurrency)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        AWS_CONCURRENCY_LIMIT.labels(api=api).set(self.window)
+
+    def _enter(self):
+        with self._condition:
+            while self.in_flight >= int(self.window):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def _exit(self, throttled):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.window = max(1.0, self.window * self.decrease_factor)
+            else:
+                self.window = min(float(self.max_concurrency), self.window + 1.0 / self.window)
+            AWS_CONCURRENCY_LIMIT.labels(api=self.api).set(self.window)
+            self._condition.notify_all()
+
+    def call(self, function, *args, **kwargs):
+        """
+        Calls function(*args, **kwargs) within the limits, retrying throttled calls.
+
+        Returns:
+            The return value of the function.
+
+        Raises:
+            Exception: Any error of the function; throttling errors only after max_retries.
+        """
+        attempt = 0
+        while True:
+            waited = time.perf_counter()
+            self._enter()
+            throttled = False
+            try:
+                self.bucket.acquire()
+                AWS_WAIT_SECONDS.labels(api=self.api).observe(time.perf_counter() - waited)
+                return function(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                throttled = True
+                AWS_THROTTLES.labels(api=self.api).inc()
+                if attempt >= self.max_retries:
+                    logger.error(f"{self.api} still throttled after {attempt} retries: {e}")
+                    raise
+            finally:
+                self._exit(throttled)
+
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            attempt += 1
+            AWS_RETRIES.labels(api=self.api).inc()
+            logger.warning(f"{self.api} throttled; retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+_limiters = {}
+_overrides = {}
+_scale = {"share": 1.0}
+_registry_lock = threading.Lock()
+
+
+def configure_rate_limits(config, share=1.0):
+    """
+    Applies the "aws_rate_limits" section of config.json, e.g.
+    {"start_expense_analysis": {"rate": 1, "burst": 1, "max_concurrency": 2}}.
+
+    Args:
+        config (dict): The configuration data.
+        share (float): Fraction of the limits this process may use, e.g. 0.5 for a backfill
+            that has to leave room for the live ingestion.
+    """
+    with _registry_lock:
+        _overrides.clear()
+        _overrides.update(config.get("aws_rate_limits", {}))
+        _scale["share"] = _clamp_share(share)
+        _limiters.clear()
+
+
+def set_rate_share(share):
+    """
+    Changes the fraction of the limits this process may use, keeping the overrides.
+
+    The limiters are only rebuilt if the share actually changed, so the adaptive
+    concurrency windows survive repeated calls with the same share.
+
+    Args:
+        share (float): Fraction of the limits, e.g. 0.5 while a backfill uses the other half.
+
+    Returns:
+        bool: True if the share changed.
+    """
+    share = _clamp_share(share)
+    with _registry_lock:
+        if share == _scale["share"]:
+            return False
+        _scale["share"] = share
+        _limiters.clear()
+        return True
+
+
+def rate_share():
+    """Returns the fraction of the limits this process currently uses."""
+    return _scale["share"]
+
+
+def _clamp_share(share):
+    return min(max(float(share), 0.01), 1.0)
+
+
+def get_limiter(api):
+    """
+    Returns the limiter shared by all threads for an API.
+
+    Args:
+        api (str): API name, e.g. "start_expense_analysis" or "s3".
+    """
+    with _registry_lock:
+        limiter = _limiters.get(api)
+        if limiter is None:
+            settings = dict(DEFAULT_LIMITS.get(api, FALLBACK_LIMIT))
+            settings.update(_overrides.get(api, {}))
+            share = _scale["share"]
+            settings["rate"] = settings["rate"] * share
+            settings["burst"] = max(int(settings["burst"] * share), 1)
+            settings["max_concurrency"] = max(int(settings.get("max_concurrency", 4) * share), 1)
+            limiter = _limiters[api] = AdaptiveRateLimiter(api, **settings)
+        return limiter
+
+
+def rate_limited(api, function, *args, **kwargs):
+    """
+    Calls an AWS client method through the shared limiter of an API.
+
+    Args:
+        api (str): API name, see get_limiter.
+        function (callable): The client method.
+    """
+    return get_limiter(api).call(function, *args, **kwargs)
@@ -0,0 +1,300 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from config.loggin_config import logger
+from config.env import get_env
+from config.aws_config import get_s3_client
+from AWS_TEXTRACT.rate_limiter import rate_limited, is_transient_error
+from utils.resource_path import resource_path
+from monitoring.metrics import counter, gauge, histogram
+
+S3_UPLOAD_BYTES = counter("s3_upload_bytes_total", "Bytes uploaded to the S3 staging bucket.")
+S3_UPLOAD_SECONDS = histogram("s3_upload_seconds", "Duration of one S3 upload.")
+S3_UPLOAD_BANDWIDTH = histogram(
+    "s3_upload_bandwidth_bytes_per_second",
+    "Effective bandwidth of each S3 upload.",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6),
+)
+S3_STAGED_OBJECTS = gauge("s3_staged_objects", "Staging objects that have not been deleted yet.")
+S3_DELETED_OBJECTS = counter("s3_deleted_objects_total", "Staging objects deleted, by reason.", ("reason",))
+
+# DeleteObjects accepts at most 1,000 keys per request
+MAX_DELETE_BATCH = 1000
+
+
+def make_staging_key(file_path, prefix="staging"):
+    """
+    Returns a unique S3 key for a local file.
+
+    The key is "<prefix>/<shard>/<uuid>/<file name>". The two-character shard spreads the
+    keys over many prefixes, so concurrent uploads do not contend for one S3 partition,
+    and the uuid keeps two files with the same name apart.
+
+    Args:
+        file_path (str): Path of the local file.
+        prefix (str): Key prefix reserved for staging objects.
+    """
+    unique = uuid.uuid4().hex
+    return f"{prefix}/{unique[:2]}/{unique}/{os.path.basename(file_path)}"
+
+
+class StagingLedger:
+    """
+    Local JSON record of the staging objects that still exist in S3.
+
+    Keys are recorded before the upload starts and removed once S3 confirmed the deletion,
+    so after a crash the ledger lists every object that may have been left behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        S3_STAGED_OBJECTS.set(len(self._entries))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the S3 staging ledger {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=4)
+        os.replace(temp_file, self.path)
+        S3_STAGED_OBJECTS.set(len(self._entries))
+
+    def add(self, key):
+        with self._lock:
+            self._entries[key] = time.time()
+            self._save()
+
+    def remove(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._save()
+
+    def older_than(self, max_age):
+        """Returns the keys recorded more than max_age seconds ago."""
+        cutoff = time.time() - max_age
+        with self._lock:
+            return [key for key, created in self._entries.items() if created < cutoff]
+
+
+class S3StagingManager:
+    """
+    Stages documents in S3 for Textract under unique keys and cleans them up in batches.
+
+    release() only queues a key; queued keys are deleted with DeleteObjects, up to 1,000 per
+    request, once a full batch is queued, when flush() is called (by the sweeper thread and
+    at exit), and objects left behind by crashes are removed by sweep().
+    """
+
+    def __init__(self, bucket, ledger_path, client_factory=get_s3_client, prefix="staging", batch_size=MAX_DELETE_BATCH):
+        """
+        Args:
+            bucket (str): The staging bucket.
+            ledger_path (str): Path of the local ledger file.
+            client_factory (callable): Returns an S3 client.
+            prefix (str): Key prefix reserved for staging objects.
+            batch_size (int): Keys per DeleteObjects request (at most 1,000).
+        """
+        self.bucket = bucket
+        self.ledger = StagingLedger(ledger_path)
+        self.client_factory = client_factory
+        self.prefix = prefix.strip("/")
+        self.batch_size = min(max(int(batch_size), 1), MAX_DELETE_BATCH)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def stage(self, file_path):
+        """
+        Uploads a file under a new unique key.
+
+        Args:
+            file_path (str): Path of the local file.
+
+        Returns:
+            str: The S3 key, or None if the upload failed.
+
+        Raises:
+            Exception: A throttling or network error (see rate_limiter.is_transient_error),
+                so the caller can keep the file for a later attempt.
+        """
+        key = make_staging_key(file_path, self.prefix)
+        self.ledger.add(key)
+        try:
+            s3_client = self.client_factory()
+            size_bytes = os.path.getsize(file_path)
+            start = time.perf_counter()
+            rate_limited("s3", s3_client.upload_file, file_path, self.bucket, key)
+            elapsed = time.perf_counter() - start
+            S3_UPLOAD_SECONDS.observe(elapsed)
+            S3_UPLOAD_BYTES.inc(size_bytes)
+            if elapsed > 0:
+                S3_UPLOAD_BANDWIDTH.observe(size_bytes / elapsed)
+            return key
+        except Exception as e:
+            logger.warning(f"Error uploading to S3: {e}")
+            # A partial multipart upload leaves no object behind, but the key may exist if
+            # only the response was lost; let the batch delete take care of it
+            self.release(key)
+            if is_transient_error(e):
+                raise
+            return None
+
+    def release(self, key):
+        """
+        Queues a staging object for deletion.
+
+        Args:
+            key (str): Key returned by stage().
+        """
+        with self._lock:
+            self._pending.append(key)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Deletes all queued objects."""
+        with self._lock:
+            keys, self._pending = self._pending, []
+        self._delete(keys, "released")
+
+    def _delete(self, keys, reason):
+        if not keys:
+            return
+        try:
+            s3_client = self.client_factory()
+        except Exception as e:
+            logger.warning(f"Could not create an S3 client to delete {len(keys)} staging objects: {e}")
+            return
+
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            try:
+                response = rate_limited(
+                    "s3",
+                    s3_client.delete_objects,
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+            except Exception as e:
+                # The keys stay in the ledger and are retried by the sweeper
+                logger.warning(f"Error deleting {len(batch)} staging objects from S3: {e}")
+                continue
+
+            failed = {error["Key"] for error in response.get("Errors", [])}
+            for error in response.get("Errors", []):
+                logger.warning(f"Could not delete {error.get('Key')} from S3: {error.get('Message')}")
+            deleted = [key for key in batch if key not in failed]
+            self.ledger.remove(deleted)
+            S3_DELETED_OBJECTS.labels(reason=reason).inc(len(deleted))
+            logger.info(f"Deleted {len(deleted)} staging objects from S3.")
+
+    def sweep(self, max_age=3600):
+        """
+        Deletes staging objects older than max_age seconds: those still in the local ledger
+        and, by listing the staging prefix, those whose ledger entry was lost.
+
+        Args:
+            max_age (float): Minimum age in seconds; younger objects may belong to running jobs.
+        """
+        orphans = set(self.ledger.older_than(max_age))
+        try:
+            s3_client = self.client_factory()
+            cutoff = time.time() - max_age
+            kwargs = {"Bucket": self.bucket, "Prefix": f"{self.prefix}/"}
+            while True:
+                response = rate_limited("s3", s3_client.list_objects_v2, **kwargs)
+                for item in response.get("Contents", []):
+                    if item["LastModified"].timestamp() < cutoff:
+                        orphans.add(item["Key"])
+                if not response.get("IsTruncated"):
+                    break
+                kwargs["ContinuationToken"] = response["NextContinuationToken"]
+        except Exception as e:
+            logger.warning(f"Could not list staging objects in S3: {e}")
+
+        if orphans:
+            logger.info(f"Sweeping {len(orphans)} orphaned staging objects from S3.")
+            self._delete(sorted(orphans), "orphaned")
+
+    def start_sweeper(self, flush_interval=30, sweep_interval=3600, max_age=3600):
+        """
+        Starts a daemon thread that flushes queued deletions every flush_interval seconds
+        and sweeps orphans every sweep_interval seconds (the first sweep runs right away).
+        """
+        def run():
+            next_sweep = time.monotonic()
+            while not self._stop.is_set():
+                self.flush()
+                if time.monotonic() >= next_sweep:
+                    self.sweep(max_age)
+                    next_sweep = time.monotonic() + sweep_interval
+                self._stop.wait(flush_interval)
+
+        self._thread = threading.Thread(target=run, name="s3-staging-sweeper", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stops the sweeper and deletes the queued objects."""
+        self._stop.set()
+        self.flush()
+
+
+_manager = None
+_settings = {}
+_manager_lock = threading.Lock()
+
+
+def configure_staging(config):
+    """
+    Applies the s3_staging_* keys of config.json. The manager and its sweeper thread are
+    created on first use, so runs without documents never import boto3.
+
+    Configuration keys:
+        s3_staging_prefix (str): Key prefix for staging objects (default "staging").
+        s3_staging_ledger (str): Path of the ledger file (default DB/s3_staging_ledger.json).
+        s3_delete_interval (int): Seconds between batched deletions (default 30).
+        s3_sweep_interval (int): Seconds between orphan sweeps (default 3600).
+        s3_orphan_max_age (int): Age in seconds after which an object counts as orphaned (default 3600).
+
+    Args:
+        config (dict): The configuration data.
+    """
+    _settings.clear()
+    _settings.update({key: value for key, value in config.items() if key.startswith("s3_")})
+
+
+def get_staging_manager():
+    """Returns the process-wide staging manager, creating it and its sweeper on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = S3StagingManager(
+                get_env("S3_BUCKET_NAME"),
+                _settings.get("s3_staging_ledger") or resource_path("DB/s3_staging_ledger.json"),
+                prefix=_settings.get("s3_staging_prefix", "staging"),
+            )
+            _manager.start_sweeper(
+                flush_interval=int(_settings.get("s3_delete_interval", 30)),
+                sweep_interval=int(_settings.get("s3_sweep_interval", 3600)),
+                max_age=int(_settings.get("s3_orphan_max_age", 3600)),
+            )
+            atexit.register(_manager.close)
+        return _manager
@@ -0,0 +1,260 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from config.loggin_config import logger
+from monitoring.metrics import counter, histogram
+
+DOCUMENTS_INDEXED = counter("documents_indexed_total", "Documents added to the full-text index.")
+INDEX_QUERY_SECONDS = histogram(
+    "document_index_query_seconds",
+    "Duration of a document index search.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+# IBANs are printed in groups of four; they are indexed without spaces so either form matches
+IBAN_REGEX = re.compile(r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    email_uid TEXT,
+    email_date TEXT,
+    sender TEXT,
+    subject TEXT,
+    file_name TEXT,
+    path TEXT,
+    invoice_number TEXT,
+    vendor_name TEXT,
+    doc_type TEXT,
+    verw_nr TEXT,
+    owner TEXT,
+    status TEXT,
+    source TEXT,
+    indexed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_email_date ON documents (email_date);
+CREATE INDEX IF NOT EXISTS documents_vendor ON documents (vendor_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS documents_email ON documents (email_uid, file_name);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    text, vendor_name, invoice_number, ibans,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+RESULT_COLUMNS = (
+    "id", "email_uid", "email_date", "sender", "subject", "file_name", "path", "invoice_number",
+    "vendor_name", "doc_type", "verw_nr", "owner", "status", "source",
+)
+
+
+def find_ibans(text):
+    """
+    Returns the IBANs in a text without spaces.
+
+    Args:
+        text (str): The document text.
+    """
+    return sorted({match.replace(" ", "") for match in IBAN_REGEX.findall(text.upper())})
+
+
+def iso_email_date(value):
+    """
+    Converts an email Date header to an ISO timestamp, or returns None if it cannot be parsed.
+
+    Args:
+        value (str): The Date header, e.g. "Mon, 14 Oct 2024 10:00:00 +0200".
+    """
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(str(value)).isoformat()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def fts_query(terms):
+    """
+    Turns user input into an FTS5 query that matches documents containing all terms.
+
+    Every term is quoted, so characters such as "-", "." or ":" in invoice numbers are not
+    parsed as FTS5 operators. IBAN-like terms are also matched without their spaces.
+
+    Args:
+        terms (str): Search terms separated by spaces.
+    """
+    ibans = find_ibans(terms)
+    for iban in ibans:
+        terms = re.sub(r"\s*".join(re.escape(char) for char in iban), " ", terms, flags=re.IGNORECASE)
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms.split()]
+    quoted += [f'ibans : "{iban}"' for iban in ibans]
+    return " AND ".join(quoted)
+
+
+class DocumentIndex:
+    """
+    SQLite FTS5 index over the text of every filed document.
+
+    The metadata (email UID and date, vendor, invoice number, owner, path) is stored in the
+    documents table and the text in the documents_fts table under the same rowid, so term,
+    vendor and date range filters are answered from indexes instead of the JSON output.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the SQLite database (":memory:" for a temporary index).
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # One connection shared by the worker threads; writes are serialized by the lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config, default_path):
+        """
+        Opens the index configured in config.json, or returns None if document_index is false.
+
+        Configuration keys:
+            document_index (bool): Index the text of filed documents (default True).
+            document_index_file (str): Path of the database (default DB/document_index.sqlite3).
+
+        Args:
+            config (dict): The configuration data.
+            default_path (str): Path used when document_index_file is not set.
+        """
+        if not config.get("document_index", True):
+            return None
+        return cls(config.get("document_index_file") or default_path)
+
+    def add(self, document, email_obj, text):
+        """
+        Indexes one filed document, replacing an earlier entry for the same email attachment.
+
+        Args:
+            document (AttachmentRecord): The attachment record returned by the file processor.
+            email_obj (EmailWithAttachments): The email the document was attached to.
+            text (str): The document text.
+
+        Returns:
+            int: The document id.
+        """
+        text = text or ""
+        email_uid = str(email_obj.uid) if email_obj is not None else None
+        row = (
+            email_uid,
+            iso_email_date(getattr(email_obj, "date", None)),
+            getattr(email_obj, "sender", None),
+            getattr(email_obj, "subject", None),
+            document.file_name,
+            document.path,
+            document.invoice_number,
+            document.vendor_name,
+            document.doc_type,
+            document.verw_nr,
+            document.owner,
+            document.status,
+            document.source,
+            datetime.now().isoformat(timespec="seconds"),
+        )
+        with self._lock, self._connection:
+            existing = self._connection.execute(
+                "SELECT id FROM documents WHERE email_uid IS ? AND file_name IS ? AND path IS ?",
+                (email_uid, document.file_name, document.path),
+            ).fetchall()
+            for (document_id,) in existing:
+                self._connection.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+                self._connection.execute("DELETE FROM documents_fts WHERE rowid = ?", (document_id,))
+
+            cursor = self._connection.execute(
+                f"INSERT INTO documents ({', '.join(RESULT_COLUMNS[1:])}, indexed_at) "
+                f"VALUES ({', '.join('?' * (len(RESULT_COLUMNS)))})",
+                row,
+            )
+            document_id = cursor.lastrowid
+            self._connection.execute(
+                "INSERT INTO documents_fts (rowid, text, vendor_name, invoice_number, ibans) VALUES (?, ?, ?, ?, ?)",
+                (document_id, text, document.vendor_name or "", document.invoice_number or "",
+                 " ".join(find_ibans(text))),
+            )
+        DOCUMENTS_INDEXED.inc()
+        return document_id
+
+    def search(self, terms=None, vendor=None, since=None, until=None, limit=100):
+        """
+        Finds documents by text, vendor and email date.
+
+        Args:
+            terms (str): Words, numbers or IBANs that must all appear in the document.
+            vendor (str): Case-insensitive part of the vendor name.
+            since (str): First email date (inclusive), YYYY-MM-DD.
+            until (str): Last email date (inclusive), YYYY-MM-DD.
+            limit (int): Maximum number of results.
+
+        Returns:
+            list: Matching documents as dicts, most recently indexed first.
+        """
+        conditions = []
+        arguments = []
+        if since:
+            conditions.append("documents.email_date >= ?")
+            arguments.append(since)
+        if until:
+            # ISO timestamps of that day sort below the next character after the date
+            conditions.append("documents.email_date < ?")
+            arguments.append(f"{until}T99")
+
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._search(conditions, arguments, terms, vendor, limit)
+        INDEX_QUERY_SECONDS.observe(time.perf_counter() - started)
+        return [dict(row) for row in rows]
+
+    def _search(self, conditions, arguments, terms, vendor, limit):
+        source = "documents"
+        order = "documents.id"
+        if terms and terms.strip() and conditions:
+            # Limit the full-text scan to the ids of the date range (looked up in the date
+            # index); FTS5 applies rowid ranges before reading any match
+            first_id, last_id = self._connection.execute(
+                f"SELECT MIN(id), MAX(id) FROM documents WHERE {' AND '.join(conditions)}", arguments
+            ).fetchone()
+            if first_id is None:
+                return []
+            conditions = conditions + ["documents_fts.rowid BETWEEN ? AND ?"]
+            arguments = arguments + [first_id, last_id]
+        if terms and terms.strip():
+            # CROSS JOIN makes SQLite walk the FTS matches in descending rowid order and stop at
+            # the limit, instead of collecting and sorting every match of a common term
+            source = "documents_fts CROSS JOIN documents ON documents.id = documents_fts.rowid"
+            order = "documents_fts.rowid"
+            conditions.append("documents_fts MATCH ?")
+            arguments.append(fts_query(terms))
+        if vendor:
+            conditions.append("documents.vendor_name LIKE ?")
+            arguments.append(f"%{vendor}%")
+
+        query = f"SELECT {', '.join(f'documents.{column}' for column in RESULT_COLUMNS)} FROM {source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order} DESC LIMIT ?"
+        return self._connection.execute(query, arguments + [int(limit)]).fetchall()
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+        logger.info(f"Closed the document index {self.path}.")
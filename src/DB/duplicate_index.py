@@ -0,0 +1,146 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from config.loggin_config import logger
+from monitoring.metrics import counter
+
+DUPLICATES_FOUND = counter("duplicate_documents_total", "Documents recognized as duplicates by reason.", ("reason",))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    key TEXT PRIMARY KEY,
+    path TEXT,
+    created TEXT
+) WITHOUT ROWID;
+"""
+
+
+def invoice_key(classification):
+    """
+    Returns the normalized "<doc type>|<vendor>|<invoice number>" key of a classified
+    document, or None if the vendor or the invoice number is unknown.
+
+    Case, spaces and punctuation are ignored, so "RE-2024/001" from the original and
+    "RE 2024 001" from a reminder produce the same key.
+
+    Args:
+        classification (dict): Result of classify_response.
+    """
+    vendor = re.sub(r"\W+", "", (classification.get("vendor_name") or "").casefold())
+    invoice_number = re.sub(r"\W+", "", (classification.get("invoice_number") or "").casefold())
+    if not vendor or not invoice_number:
+        return None
+    return f"{classification.get('doc_type') or ''}|{vendor}|{invoice_number}"
+
+
+class DuplicateIndex:
+    """
+    Persistent fingerprints of every filed document: the SHA-256 of its content and its
+    invoice_key(). Each lookup is a single primary key probe, so a copy of a known file is
+    recognized before it is sent to Textract and a reminder of a known invoice before it
+    is filed, regardless of how many documents were filed before.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the SQLite database (":memory:" for a temporary index).
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config, default_path):
+        """
+        Opens the index configured in config.json, or returns None if duplicate_detection is false.
+
+        Configuration keys:
+            duplicate_detection (bool): Detect duplicate documents (default True).
+            duplicate_index_file (str): Path of the database (default DB/duplicate_index.sqlite3).
+
+        Args:
+            config (dict): The configuration data.
+            default_path (str): Path used when duplicate_index_file is not set.
+        """
+        if not config.get("duplicate_detection", True):
+            return None
+        return cls(config.get("duplicate_index_file") or default_path)
+
+    @staticmethod
+    def _keys(content_hash, key):
+        keys = []
+        if content_hash:
+            keys.append(("content", f"sha256:{content_hash}"))
+        if key:
+            keys.append(("invoice_number", f"invoice:{key}"))
+        return keys
+
+    def find(self, content_hash=None, key=None):
+        """
+        Looks up a document by content hash and/or invoice key.
+
+        Returns:
+            tuple: (reason, path of the filed original), or None if the document is new.
+        """
+        with self._lock:
+            for reason, fingerprint in self._keys(content_hash, key):
+                row = self._connection.execute("SELECT path FROM fingerprints WHERE key = ?", (fingerprint,)).fetchone()
+                if row:
+                    return reason, row[0]
+        return None
+
+    def claim(self, content_hash, key, path):
+        """
+        Registers a document unless it is a duplicate; check and registration are atomic,
+        so two workers filing the same invoice at the same time cannot both succeed.
+
+        Args:
+            content_hash (str): SHA-256 of the file content.
+            key (str): invoice_key() of the document, or None.
+            path (str): Path the document is filed under (see update_path).
+
+        Returns:
+            tuple: (reason, path of the filed original) for a duplicate, None if the document was registered.
+        """
+        keys = self._keys(content_hash, key)
+        with self._lock, self._connection:
+            for reason, fingerprint in keys:
+                row = self._connection.execute("SELECT path FROM fingerprints WHERE key = ?", (fingerprint,)).fetchone()
+                if row:
+                    return reason, row[0]
+            created = datetime.now().isoformat(timespec="seconds")
+            self._connection.executemany(
+                "INSERT INTO fingerprints (key, path, created) VALUES (?, ?, ?)",
+                [(fingerprint, path, created) for _, fingerprint in keys],
+            )
+        return None
+
+    def update_path(self, content_hash, key, path):
+        """Records where a claimed document was finally filed."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE fingerprints SET path = ? WHERE key = ?",
+                [(path, fingerprint) for _, fingerprint in self._keys(content_hash, key)],
+            )
+
+    def release(self, content_hash, key):
+        """Removes the fingerprints of a claimed document that could not be filed."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM fingerprints WHERE key = ?",
+                [(fingerprint,) for _, fingerprint in self._keys(content_hash, key)],
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+        logger.info(f"Closed the duplicate index {self.path}.")
@@ -0,0 +1,361 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from config.loggin_config import logger
+from monitoring.metrics import counter, histogram
+
+ARCHIVE_BYTES = counter(
+    "textract_archive_bytes_total",
+    "Bytes of Textract responses added to the archive, as JSON (raw) and after compression (compressed).",
+    ("kind",),
+)
+ARCHIVE_READ_SECONDS = histogram(
+    "textract_archive_read_seconds",
+    "Time to read and decompress one archived Textract response.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT,
+    job_id TEXT,
+    operation TEXT,
+    file_name TEXT,
+    segment TEXT,
+    offset INTEGER,
+    length INTEGER,
+    raw_length INTEGER,
+    dictionary_id INTEGER,
+    created TEXT
+);
+CREATE INDEX IF NOT EXISTS responses_content_hash ON responses (content_hash, operation);
+CREATE INDEX IF NOT EXISTS responses_job_id ON responses (job_id);
+CREATE TABLE IF NOT EXISTS dictionaries (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT,
+    samples INTEGER,
+    created TEXT
+);
+"""
+
+ENTRY_COLUMNS = ("id", "content_hash", "job_id", "operation", "file_name", "segment", "offset", "length",
+                 "raw_length", "dictionary_id", "created")
+
+# Training samples are cut from the responses; the dictionary mostly helps the start of every
+# frame, where zstd has no history yet, and the recurring Block structure is in every chunk
+SAMPLE_CHUNK_BYTES = 16 * 1024
+MAX_SAMPLE_CHUNKS = 2000
+# Above this size zstd finds enough history in the response itself and compresses better
+# without the dictionary's fixed parameters (see benchmarks/bench_response_archive.py)
+DICTIONARY_MAX_BYTES = 192 * 1024
+
+
+@dataclass(slots=True)
+class ArchivedResponse:
+    """
+    Index entry of an archived response. The response itself is only read and decompressed
+    when load() is called.
+    """
+
+    id: int
+    content_hash: str | None
+    job_id: str | None
+    operation: str
+    file_name: str | None
+    segment: str
+    offset: int
+    length: int
+    raw_length: int
+    dictionary_id: int
+    created: str
+    archive: "ResponseArchive" = field(default=None, repr=False, compare=False)
+
+    def load(self):
+        """Returns the Textract response as a dict."""
+        return self.archive.read(self)
+
+
+class ResponseArchive:
+    """
+    Append-only archive of raw Textract responses.
+
+    Every response is stored as one zstd frame in a segment file; a new segment is started
+    when the current one exceeds segment_max_bytes. A SQLite index maps the content hash of
+    the analyzed file and the Textract job id to (segment, offset, length), so any response
+    is read with a single seek and decompressed only when needed.
+
+    Responses up to DICTIONARY_MAX_BYTES are compressed with a dictionary trained on the first
+    train_samples responses; if the training fails, it is tried again after another
+    train_samples responses. The dictionary id (0 for none) is stored with every entry, so
+    entries written before the training or with an older dictionary remain readable.
+
+    Writes are serialized; one process should write to an archive at a time, any number may read.
+    """
+
+    def __init__(self, folder, level=10, segment_max_bytes=256 * 1024 * 1024, dictionary_size=112 * 1024,
+                 train_samples=200):
+        """
+        Args:
+            folder (str): Folder of the segments, dictionaries and index.
+            level (int): zstd compression level.
+            segment_max_bytes (int): Size after which a new segment file is started.
+            dictionary_size (int): Size of the trained dictionary in bytes.
+            train_samples (int): Responses to archive before the dictionary is trained (0 disables training).
+        """
+        import zstandard
+
+        self._zstd = zstandard
+        self.folder = folder
+        self.level = level
+        self.segment_max_bytes = segment_max_bytes
+        self.dictionary_size = dictionary_size
+        self.train_samples = train_samples
+        os.makedirs(folder, exist_ok=True)
+
+        self._connection = sqlite3.connect(os.path.join(folder, "index.sqlite3"), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._dictionaries = {}
+        # Entry id at which add() last started a training (0: not yet), and whether one is running
+        self._train_attempted_at = 0
+        self._training = False
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+            row = self._connection.execute("SELECT MAX(id) FROM dictionaries").fetchone()
+            self._dictionary_id = row[0] or 0
+            self._compressor = zstandard.ZstdCompressor(level=level)
+            self._dictionary_compressor = self._make_compressor(self._dictionary_id)
+            self._segment = self._last_segment()
+
+    @classmethod
+    def from_config(cls, config, default_folder):
+        """
+        Opens the archive configured in config.json, or returns None if textract_archive is
+        false or the zstandard package is not installed.
+
+        Configuration keys:
+            textract_archive (bool): Archive every Textract response (default True).
+            textract_archive_folder (str): Folder of the archive (default DB/textract_archive).
+            textract_archive_level (int): zstd compression level (default 10).
+            textract_archive_segment_mb (int): Size of a segment file in MB (default 256).
+
+        Args:
+            config (dict): The configuration data.
+            default_folder (str): Folder used when textract_archive_folder is not set.
+        """
+        if not config.get("textract_archive", True):
+            return None
+        try:
+            return cls(
+                config.get("textract_archive_folder") or default_folder,
+                level=int(config.get("textract_archive_level", 10)),
+                segment_max_bytes=int(config.get("textract_archive_segment_mb", 256)) * 1024 * 1024,
+            )
+        except ImportError:
+            logger.warning("zstandard is not installed; Textract responses are not archived.")
+            return None
+
+    def _dictionary(self, dictionary_id):
+        if dictionary_id not in self._dictionaries:
+            row = self._connection.execute(
+                "SELECT file_name FROM dictionaries WHERE id = ?", (dictionary_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown archive dictionary {dictionary_id}")
+            with open(os.path.join(self.folder, row[0]), "rb") as f:
+                self._dictionaries[dictionary_id] = self._zstd.ZstdCompressionDict(f.read())
+        return self._dictionaries[dictionary_id]
+
+    def _make_compressor(self, dictionary_id):
+        if not dictionary_id:
+            return None
+        dictionary = self._dictionary(dictionary_id)
+        dictionary.precompute_compress(level=self.level)
+        return self._zstd.ZstdCompressor(level=self.level, dict_data=dictionary)
+
+    def _last_segment(self):
+        row = self._connection.execute("SELECT segment FROM responses ORDER BY id DESC LIMIT 1").fetchone()
+        return row[0] if row else "segment_000001.zst"
+
+    def _writable_segment(self):
+        path = os.path.join(self.folder, self._segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes:
+            number = int(self._segment.split("_")[1].split(".")[0]) + 1
+            self._segment = f"segment_{number:06d}.zst"
+            logger.info(f"Starting Textract archive segment {self._segment}.")
+        return self._segment
+
+    def add(self, response, job_id=None, content_hash=None, operation="analyze_expense", file_name=None):
+        """
+        Compresses a response and appends it to the current segment.
+
+        Args:
+            response (dict): The Textract response.
+            job_id (str): The Textract job id (None for synchronous calls).
+            content_hash (str): SHA-256 of the analyzed file.
+            operation (str): The Textract API, e.g. "analyze_expense" or "detect_document_text".
+            file_name (str): Name of the analyzed file, for audits.
+
+        Returns:
+            int: The id of the archive entry.
+        """
+        raw = json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            dictionary_id = self._dictionary_id if len(raw) <= DICTIONARY_MAX_BYTES else 0
+            compressor = self._dictionary_compressor if dictionary_id else self._compressor
+            compressed = compressor.compress(raw)
+            segment = self._writable_segment()
+            with open(os.path.join(self.folder, segment), "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(compressed)
+            with self._connection:
+                cursor = self._connection.execute(
+                    f"INSERT INTO responses ({', '.join(ENTRY_COLUMNS[1:])}) VALUES ({', '.join('?' * 10)})",
+                    (content_hash, job_id, operation, file_name, segment, offset, len(compressed), len(raw),
+                     dictionary_id, datetime.now().isoformat(timespec="seconds")),
+                )
+            entry_id = cursor.lastrowid
+            # Claimed under the lock, so concurrent adds start one training; a failed one is only
+            # retried once train_samples more responses have been archived
+            train = (self.train_samples and not self._dictionary_id and not self._training
+                     and entry_id >= self._train_attempted_at + self.train_samples)
+            if train:
+                self._train_attempted_at = entry_id
+                self._training = True
+        ARCHIVE_BYTES.labels(kind="raw").inc(len(raw))
+        ARCHIVE_BYTES.labels(kind="compressed").inc(len(compressed))
+        if train:
+            try:
+                self.train_dictionary()
+            finally:
+                with self._lock:
+                    self._training = False
+        return entry_id
+
+    def train_dictionary(self):
+        """
+        Trains a new dictionary from the archived responses; later responses are compressed with it.
+
+        Returns:
+            int: The id of the new dictionary, or None if there were too few samples.
+        """
+        samples = []
+        for entry in self.entries():
+            raw = self.read_raw(entry)
+            samples.extend(raw[start:start + SAMPLE_CHUNK_BYTES] for start in range(0, len(raw), SAMPLE_CHUNK_BYTES))
+            if len(samples) >= MAX_SAMPLE_CHUNKS:
+                break
+        try:
+            dictionary = self._zstd.train_dictionary(self.dictionary_size, samples[:MAX_SAMPLE_CHUNKS], level=self.level)
+        except self._zstd.ZstdError as e:
+            logger.warning(f"Could not train the Textract archive dictionary from {len(samples)} samples: {e}")
+            return None
+
+        with self._lock:
+            dictionary_id = self._dictionary_id + 1
+            file_name = f"dictionary_{dictionary_id:04d}.zdict"
+            with open(os.path.join(self.folder, file_name), "wb") as f:
+                f.write(dictionary.as_bytes())
+            with self._connection:
+                self._connection.execute(
+                    "INSERT INTO dictionaries (id, file_name, samples, created) VALUES (?, ?, ?, ?)",
+                    (dictionary_id, file_name, len(samples), datetime.now().isoformat(timespec="seconds")),
+                )
+            self._dictionaries[dictionary_id] = dictionary
+            self._dictionary_compressor = self._make_compressor(dictionary_id)
+            self._dictionary_id = dictionary_id
+        logger.info(f"Trained Textract archive dictionary {dictionary_id} from {len(samples)} samples.")
+        return dictionary_id
+
+    def _entry(self, row):
+        return ArchivedResponse(*row, archive=self) if row else None
+
+    def find(self, content_hash=None, job_id=None, operation=None):
+        """
+        Looks up the most recent response for a file or a job without reading it.
+
+        Args:
+            content_hash (str): SHA-256 of the analyzed file.
+            job_id (str): The Textract job id.
+            operation (str): Optional Textract API to restrict the lookup to.
+
+        Returns:
+            ArchivedResponse: The entry, or None if nothing was archived.
+        """
+        conditions = []
+        arguments = []
+        for column, value in (("content_hash", content_hash), ("job_id", job_id), ("operation", operation)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                arguments.append(value)
+        if not conditions:
+            raise ValueError("find() needs a content hash or a job id.")
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {', '.join(ENTRY_COLUMNS)} FROM responses WHERE {' AND '.join(conditions)} "
+                f"ORDER BY id DESC LIMIT 1",
+                arguments,
+            ).fetchone()
+        return self._entry(row)
+
+    def get(self, content_hash=None, job_id=None, operation=None):
+        """Returns the most recent archived response for a file or a job, or None; see find()."""
+        entry = self.find(content_hash, job_id, operation)
+        return entry.load() if entry else None
+
+    def entries(self, operation=None):
+        """
+        Yields the index entries in the order they were archived.
+
+        Args:
+            operation (str): Optional Textract API to restrict the entries to.
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                query = f"SELECT {', '.join(ENTRY_COLUMNS)} FROM responses WHERE id > ?"
+                arguments = [last_id]
+                if operation:
+                    query += " AND operation = ?"
+                    arguments.append(operation)
+                rows = self._connection.execute(query + " ORDER BY id LIMIT 500", arguments).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._entry(row)
+            last_id = rows[-1][0]
+
+    def read_raw(self, entry):
+        """Returns the response JSON of an entry as bytes, read with one seek."""
+        started = time.perf_counter()
+        with open(os.path.join(self.folder, entry.segment), "rb") as f:
+            f.seek(entry.offset)
+            compressed = f.read(entry.length)
+        if entry.dictionary_id:
+            with self._lock:
+                dictionary = self._dictionary(entry.dictionary_id)
+            decompressor = self._zstd.ZstdDecompressor(dict_data=dictionary)
+        else:
+            decompressor = self._zstd.ZstdDecompressor()
+        raw = decompressor.decompress(compressed, max_output_size=entry.raw_length)
+        ARCHIVE_READ_SECONDS.observe(time.perf_counter() - started)
+        return raw
+
+    def read(self, entry):
+        """Returns the response of an entry as a dict."""
+        return json.loads(self.read_raw(entry))
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+        logger.info(f"Closed the Textract archive {self.folder}.")
@@ -1,22 +1,30 @@
-import boto3
-import os
-from dotenv import load_dotenv
-from utils.resource_path import resource_path
-
-dotenv_path = resource_path('.env')
-load_dotenv(dotenv_path) 
-
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION")
-S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+from config.env import get_env
 
 
 def get_textract_client():
-    return boto3.client(
+    import boto3  # Deferred: boto3/botocore dominate the cold start of the frozen build
+
+    # A session per client: the default session is not safe to share between worker threads
+    return boto3.session.Session().client(
         'textract',
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        region_name=os.getenv("AWS_REGION")
+        aws_access_key_id=get_env("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=get_env("AWS_SECRET_ACCESS_KEY"),
+        region_name=get_env("AWS_REGION")
     )
 
+
+def get_s3_client():
+    """Get S3 client using the same configuration as textract"""
+    import boto3  # Deferred to keep the cold start short
+
+    # A session per client: the default session is not safe to share between worker threads
+    session = boto3.session.Session()
+    credentials = session.get_credentials()
+    frozen_credentials = credentials.get_frozen_credentials()
+    
+    return session.client(
+        's3',
+        aws_access_key_id=frozen_credentials.access_key,
+        aws_secret_access_key=frozen_credentials.secret_key,
+        aws_session_token=frozen_credentials.token
+    )
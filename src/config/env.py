@@ -0,0 +1,42 @@
+import os
+import threading
+from utils.resource_path import resource_path
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_environment():
+    """
+    Loads the .env file into the process environment, once per process.
+
+    The import of python-dotenv is deferred to the first call so that startup does not
+    pay for it when no AWS call is made (e.g. a --once run without new mail).
+
+    Returns:
+        bool: True if the environment has been loaded.
+    """
+    global _loaded
+    if _loaded:
+        return True
+
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            dotenv_path = resource_path('.env')
+            load_dotenv(dotenv_path)
+            _loaded = True
+    return True
+
+
+def get_env(name, default=None):
+    """
+    Returns an environment variable after making sure the .env file has been loaded.
+
+    Args:
+        name (str): Name of the variable.
+        default: Value returned when the variable is not set.
+    """
+    load_environment()
+    return os.getenv(name, default)
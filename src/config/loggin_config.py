@@ -1,5 +1,11 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
 
 # Define the log format
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
@@ -7,18 +13,167 @@ LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 # Define the log file path
 LOG_FILE = os.path.join("logs", "app.log")
 
-# Ensure the logs directory exists
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-
-# Configure the logger
-logging.basicConfig(
-    level=logging.INFO,  # Set the default log level
-    format=LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(LOG_FILE),  # Write logs to a file
-        logging.StreamHandler()         # Output logs to the console
-    ]
-)
+# Defaults, overridable through environment variables (LOG_*) or config.json (log_*)
+DEFAULT_SETTINGS = {
+    "level": "INFO",
+    "file": LOG_FILE,
+    "rotation": "size",           # "size", "time" or "none"
+    "max_bytes": 10 * 1024 * 1024,
+    "backup_count": 5,
+    "rotate_when": "midnight",    # Used with rotation "time"
+    "json": False,                # Structured JSON lines in the log file
+    "rate_limit": 20,             # INFO/DEBUG records per call site and window; 0 disables
+    "rate_window": 60,            # Seconds
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits repetitive INFO/DEBUG lines per call site.
+
+    Each call site (logger, file and line) may log `rate` records per `window` seconds.
+    Further records are dropped and counted; the first record of the next window reports
+    how many were suppressed. WARNING and above are never dropped.
+    """
+
+    def __init__(self, rate=20, window=60):
+        super().__init__()
+        self.rate = rate
+        self.window = window
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._sites.get(key, (now, 0, 0))
+            if now - window_start >= self.window:
+                window_start, count = now, 0
+            if count >= self.rate:
+                self._sites[key] = (window_start, count, suppressed + 1)
+                return False
+            self._sites[key] = (window_start, count + 1, 0)
+
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+
+_listener = None
+_queue_handler = None
+
+
+def _settings_from_env():
+    settings = dict(DEFAULT_SETTINGS)
+    for key, default in DEFAULT_SETTINGS.items():
+        value = os.getenv(f"LOG_{key.upper()}")
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            settings[key] = value.strip().lower() in ("1", "true", "yes", "on")
+        elif isinstance(default, int):
+            settings[key] = int(value)
+        else:
+            settings[key] = value
+    return settings
+
+
+def _build_file_handler(settings):
+    log_file = settings["file"]
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+    if settings["rotation"] == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=settings["rotate_when"], backupCount=settings["backup_count"], encoding="utf-8"
+        )
+    if settings["rotation"] == "size":
+        return logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=settings["max_bytes"], backupCount=settings["backup_count"], encoding="utf-8"
+        )
+    return logging.FileHandler(log_file, encoding="utf-8")
+
+
+def setup_logging(**overrides):
+    """
+    (Re)configures logging with a non-blocking queue pipeline.
+
+    Application threads only put records on an in-memory queue; a QueueListener thread
+    writes them to the rotating log file and the console. Repetitive INFO/DEBUG lines
+    are rate limited per call site before they are queued.
+
+    Args:
+        **overrides: Values for any key of DEFAULT_SETTINGS.
+    """
+    global _listener, _queue_handler
+
+    settings = _settings_from_env()
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+
+    file_handler = _build_file_handler(settings)
+    file_handler.setFormatter(JsonFormatter() if settings["json"] else logging.Formatter(LOG_FORMAT))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+        root.removeHandler(_queue_handler)
+        for handler in _listener.handlers:
+            handler.close()
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _queue_handler.addFilter(RateLimitFilter(settings["rate_limit"], settings["rate_window"]))
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root.addHandler(_queue_handler)
+    root.setLevel(settings["level"].upper() if isinstance(settings["level"], str) else settings["level"])
+
+
+def configure_logging(config):
+    """
+    Applies the log_* keys of config.json on top of the environment defaults.
+
+    Args:
+        config (dict): The configuration data.
+    """
+    overrides = {key: config.get(f"log_{key}") for key in DEFAULT_SETTINGS}
+    if any(value is not None for value in overrides.values()):
+        setup_logging(**overrides)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+setup_logging()
+atexit.register(shutdown_logging)
 
 # Create a logger instance for reuse
 logger = logging.getLogger("app_logger")
@@ -1,35 +1,156 @@
-import re
+import sys
+from dataclasses import dataclass, field
 
-class EmailWithAttachments:
-    def __init__(self, uid, subject, sender, date, attachments):
+
+def _text(value):
+    # Header objects and numbers from the database become plain str, the only type the records store
+    return str(value) if value is not None else None
+
+
+def _shared(value):
+    # Values with few distinct strings (status, vendor, owner, ...) are stored once for all records;
+    # other types (a numeric verw_nr from the database) are kept as they are
+    return sys.intern(str(value)) if isinstance(value, str) else value
+
+
+@dataclass(slots=True)
+class AttachmentRecord:
+    """
+    An email attachment and the result of its processing.
+
+    The file processors return one record per filed document; a split PDF returns a record
+    with status "split" whose documents are the records of its parts.
+    """
+
+    file_name: str
+    path: str
+    status: str = "pending"
+    invoice_number: str | None = None
+    vendor_name: str | None = None
+    doc_type: str = "UNKNOWN"
+    prefix: str | None = None
+    source: str | None = None
+    verw_nr: str | int | None = None
+    owner: str | None = None
+    message: str | None = None
+    duplicate_of: str | None = None
+    duplicate_reason: str | None = None
+    source_file: str | None = None
+    pages: tuple | None = None
+    # Not persisted: the text is handed to the document index
+    document_text: str | None = field(default=None, repr=False)
+    # Not persisted: the error was transient (throttling, network), a later attempt may succeed
+    retryable: bool = field(default=False, repr=False)
+    documents: list | None = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.invoice_number = _text(self.invoice_number)
+        self.status = _shared(self.status)
+        self.vendor_name = _shared(self.vendor_name)
+        self.doc_type = _shared(self.doc_type)
+        self.prefix = _shared(self.prefix)
+        self.source = _shared(self.source)
+        self.verw_nr = _shared(self.verw_nr)
+        self.owner = _shared(self.owner)
+        self.duplicate_reason = _shared(self.duplicate_reason)
+        if self.pages is not None:
+            self.pages = tuple(self.pages)
+
+    def to_dict(self):
         """
-        Initialize an email object with metadata and attachments.
-        
-        Args:
-            uid (str): The UID of the email.
-            subject (str): The subject of the email.
-            sender (str): The sender of the email.
-            date (str): The date the email was sent.
-            attachments (list): A list of dictionaries with attachment metadata.
+        Returns the record as stored in the processed email JSON files. Optional fields are
+        only included when set.
         """
-        self.uid = uid
-        self.subject = subject
-        self.sender = sender
-        self.date = date
+        data = {
+            "file_name": self.file_name,
+            "path": self.path,
+            "invoice_number": self.invoice_number,
+            "vendor_name": self.vendor_name,
+            "doc_type": self.doc_type,
+            "status": self.status,
+            "verw_nr": self.verw_nr,
+            "eigentümer": self.owner,
+        }
+        for name in ("prefix", "source", "message", "duplicate_of", "duplicate_reason", "source_file"):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        if self.pages is not None:
+            data["pages"] = list(self.pages)
+        if self.documents is not None:
+            data["documents"] = [document.to_dict() for document in self.documents]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Creates a record from to_dict() output or an older attachment dict (which may use
+        "filename" instead of "file_name"); unknown keys are ignored.
+        """
+        documents = data.get("documents")
+        return cls(
+            file_name=data.get("file_name") or data.get("filename"),
+            path=data.get("path"),
+            status=data.get("status") or "pending",
+            invoice_number=data.get("invoice_number"),
+            vendor_name=data.get("vendor_name"),
+            doc_type=data.get("doc_type") or "UNKNOWN",
+            prefix=data.get("prefix"),
+            source=data.get("source"),
+            verw_nr=data.get("verw_nr"),
+            owner=data.get("eigentümer"),
+            message=data.get("message"),
+            duplicate_of=data.get("duplicate_of"),
+            duplicate_reason=data.get("duplicate_reason"),
+            source_file=data.get("source_file"),
+            pages=data.get("pages"),
+            documents=[cls.from_dict(document) for document in documents] if documents is not None else None,
+        )
+
+
+@dataclass(slots=True)
+class EmailWithAttachments:
+    """
+    An email's metadata and its attachments.
+
+    Args:
+        uid (str): The UID of the email.
+        subject (str): The subject of the email.
+        sender (str): The sender of the email.
+        date (str): The date the email was sent.
+        attachments (list): AttachmentRecord objects, or dicts with file_name and path.
+    """
+
+    uid: str
+    subject: str | None
+    sender: str | None
+    date: str | None
+    attachments: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.uid = _text(self.uid)
+        self.subject = _text(self.subject)
+        self.sender = _shared(self.sender)
+        self.date = _text(self.date)
         self.attachments = [
-            {
-                "file_name": attachment.get("file_name"),
-                "path": attachment.get("path"),
-                "invoice_number": None,
-                "doc_type": "UNKNOWN",
-                "prefix": None,
-                "status": "pending",
-                "verw_nr": None,
-                "eigentümer": None,
-            }
-            for attachment in attachments
+            attachment if isinstance(attachment, AttachmentRecord) else AttachmentRecord.from_dict(attachment)
+            for attachment in self.attachments
         ]
 
+    def to_dict(self):
+        """Returns the email as stored in the processed email JSON files."""
+        return {
+            "uid": self.uid,
+            "subject": self.subject,
+            "sender": self.sender,
+            "date": self.date,
+            "attachments": [attachment.to_dict() for attachment in self.attachments],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("uid"), data.get("subject"), data.get("sender"), data.get("date"),
+                   [AttachmentRecord.from_dict(attachment) for attachment in data.get("attachments") or []])
 
     def __repr__(self):
-        return f"EmailWithAttachments(uid={self.uid}, subject={self.subject}, sender={self.sender}, date={self.date}, attachments={len(self.attachments)} files)"
\ No newline at end of file
+        return f"EmailWithAttachments(uid={self.uid}, subject={self.subject}, sender={self.sender}, date={self.date}, attachments={len(self.attachments)} files)"
@@ -2,27 +2,56 @@ import email
 from email.policy import default
 from config.config import load_config, save_config
 import os
-from .Email_with_Attachment import EmailWithAttachments
+from .Email_with_Attachment import EmailWithAttachments, AttachmentRecord
 import json
 from config.loggin_config import logger
+from monitoring.metrics import counter, gauge, histogram
 
 ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg"}
 
+IMAP_SEARCH_SECONDS = histogram("imap_search_seconds", "Duration of the UID SEARCH for new emails.")
+EMAIL_FETCH_SECONDS = histogram("email_fetch_seconds", "Duration of fetching one email by UID.")
+EMAIL_FETCH_BYTES = counter("email_fetch_bytes_total", "Raw bytes of fetched emails.")
+EMAILS_FETCHED = counter("emails_fetched_total", "Emails fetched from the IMAP server by result.", ("result",))
+EMAIL_QUEUE_DEPTH = gauge("email_queue_depth", "New emails found by the last search that are still waiting to be fetched.")
+ATTACHMENTS_SAVED = counter("attachments_saved_total", "Attachments saved to the attachment folder by extension.", ("extension",))
+ATTACHMENTS_SKIPPED = counter("attachments_skipped_total", "Attachments skipped because of an unsupported extension.")
+
+def ensure_selected(mail, mailbox="INBOX"):
+    """
+    Selects the mailbox read-only unless the connection already has a mailbox selected.
+
+    Every SELECT is a round trip and makes the server resend the mailbox state, so
+    connections keep the mailbox selected for the search and all fetches of a cycle.
+
+    Args:
+        mail (IMAP4_SSL): IMAP mail object.
+        mailbox (str): The mailbox to select.
+    """
+    if getattr(mail, "state", None) != "SELECTED":
+        mail.select(mailbox, readonly=True)
+
 def fetch_email_by_uid(mail, uid):
     try:
-        mail.select("INBOX", readonly=True)
-        status, msg_data = mail.uid("FETCH", uid, "(RFC822)")
+        with EMAIL_FETCH_SECONDS.time():
+            ensure_selected(mail)
+            status, msg_data = mail.uid("FETCH", uid, "(RFC822)")
         if status != "OK":
             logger.warning(f"Error fetching email with UID {uid}")
+            EMAILS_FETCHED.labels(result="error").inc()
             return None
 
         for response_part in msg_data:
             if isinstance(response_part, tuple):
+                EMAIL_FETCH_BYTES.inc(len(response_part[1]))
+                EMAILS_FETCHED.labels(result="success").inc()
                 msg = email.message_from_bytes(response_part[1], policy=default)
                 return msg
+        EMAILS_FETCHED.labels(result="empty").inc()
         return None
     except Exception as e:
         logger.error(f"Error retrieving email by UID {uid}: {e}")
+        EMAILS_FETCHED.labels(result="error").inc()
         return None
 
 def search_emails(mail, criteria):
@@ -37,9 +66,10 @@ def search_emails(mail, criteria):
         tuple: (List of UIDs, max UID found)
     """
     try:
-        status, count = mail.select("INBOX", readonly=True)
+        ensure_selected(mail)
         logger.info(f"Searching for emails in INBOX...")
-        status, data = mail.uid("SEARCH", None, criteria)
+        with IMAP_SEARCH_SECONDS.time():
+            status, data = mail.uid("SEARCH", None, criteria)
 
         if status != "OK":
             logger.warning(f"SEARCH failed with status: {status}")
@@ -51,20 +81,22 @@ def search_emails(mail, criteria):
 
         uids = [int(uid.decode('utf-8')) for uid in data[0].split()]
         max_uid = max(uids) if uids else 0
-        logger.info(f"UIDs found: {uids}, Max UID: {max_uid}")
+        logger.info(f"{len(uids)} UIDs found (min {min(uids)}), Max UID: {max_uid}")
+        logger.debug(f"UIDs found: {uids}")
         return uids, max_uid
 
     except Exception as e:
         logger.error(f"Error searching emails: {e}")
         return [], 0
     
-def process_email(msg, uid):
+def process_email(msg, uid, attachment_folder=None):
     """
     Processes an email and saves its attachments.
 
     Args:
         msg (EmailMessage): The email message to process.
         uid (str): The UID of the email.
+        attachment_folder (str): Optional folder for the attachments. Defaults to attachment_folder from config.
 
     Returns:
         EmailWithAttachments: Object containing the email's metadata and raw attachments.
@@ -81,10 +113,12 @@ def process_email(msg, uid):
                 extension = filename.rsplit(".", 1)[-1].lower()
                 if extension in ALLOWED_EXTENSIONS:
                     content = part.get_payload(decode=True)
-                    saved_path = save_attachment_into_folder(content, filename)
+                    saved_path = save_attachment_into_folder(content, filename, attachment_folder)
                     if saved_path:
-                        attachments.append({"filename": filename, "path": saved_path})
+                        ATTACHMENTS_SAVED.labels(extension=extension).inc()
+                        attachments.append(AttachmentRecord(file_name=filename, path=saved_path))
                 else:
+                    ATTACHMENTS_SKIPPED.inc()
                     logger.warning(f"Attachment skipped: {filename} (Invalid extension)")
 
         email_obj = EmailWithAttachments(uid, subject, sender, date, attachments)
@@ -124,29 +158,94 @@ def process_emails_since(mail, last_uid):
 
         # Filter UIDs to ensure they are greater than last_uid
         valid_uids = [uid for uid in uids if uid > last_uid]
-        logger.info(f"Valid UIDs to process: {valid_uids}")
+        logger.info(f"Valid UIDs to process: {len(valid_uids)}")
+        logger.debug(f"Valid UIDs: {valid_uids}")
 
         if not valid_uids:
             logger.info("No valid new emails to process after filtering.")
             return emails
 
-        for uid in valid_uids:
-            logger.info(f"Fetching email with UID (SINCE) {uid}...")
-            msg = fetch_email_by_uid(mail, str(uid))
-            if msg:
-                email_obj = process_email(msg, str(uid))
-                if email_obj:
-                    emails.append(email_obj)
-            else:
-                logger.warning(f"Email with UID {uid} could not be fetched.")
+        EMAIL_QUEUE_DEPTH.set(len(valid_uids))
+        emails = fetch_emails(mail, valid_uids)
 
         logger.info(f"Processed {len(emails)} new emails.")
         return emails
 
     except Exception as e:
         logger.error(f"Error downloading emails: {e}")
+        EMAIL_QUEUE_DEPTH.set(0)
         return emails
 
+def fetch_emails(mail, uids, attachment_folder=None):
+    """
+    Fetches the given emails and saves their attachments.
+
+    Args:
+        mail (IMAP4_SSL): The mail object to interact with the IMAP server.
+        uids (list): UIDs to fetch, in order.
+        attachment_folder (str): Optional folder for the attachments. Defaults to attachment_folder from config.
+
+    Returns:
+        list: EmailWithAttachments objects of the emails that could be fetched.
+    """
+    emails = []
+    for uid in uids:
+        logger.info(f"Fetching email with UID (SINCE) {uid}...")
+        msg = fetch_email_by_uid(mail, str(uid))
+        EMAIL_QUEUE_DEPTH.dec()
+        if msg:
+            email_obj = process_email(msg, str(uid), attachment_folder)
+            if email_obj:
+                emails.append(email_obj)
+        else:
+            logger.warning(f"Email with UID {uid} could not be fetched.")
+    return emails
+
+def stream_emails_since(mail, last_uid, window_size=100, upper_uid=None, extra_criteria="", attachment_folder=None):
+    """
+    Downloads the emails since the last UID in windows of window_size UIDs.
+
+    Only one window of emails is held at a time, so a large backlog (e.g. after an outage)
+    is worked off with constant memory. Unlike process_emails_since, the max UID in the
+    configuration is not advanced up front; the caller checkpoints each window after
+    persisting it.
+
+    Args:
+        mail (IMAP4_SSL): The mail object to interact with the IMAP server.
+        last_uid (int): The last processed UID.
+        window_size (int): Number of UIDs per window.
+        upper_uid (int): Optional highest UID to fetch (inclusive), e.g. the end of a backfill partition.
+        extra_criteria (str): Additional IMAP search criteria, e.g. "SINCE 01-Jan-2024".
+        attachment_folder (str): Optional folder for the attachments. Defaults to attachment_folder from config.
+
+    Yields:
+        tuple: (highest UID of the window, list of EmailWithAttachments of the window)
+    """
+    criteria = f"UID {last_uid + 1}:{upper_uid or '*'}"
+    if extra_criteria:
+        criteria = f"{criteria} {extra_criteria}"
+    logger.info(f"Searching for emails with criteria: {criteria}")
+    uids, _ = search_emails(mail, criteria)
+
+    # "UID n:*" also matches the newest email when n is above it, so filter again
+    valid_uids = sorted(uid for uid in uids if uid > last_uid and (upper_uid is None or uid <= upper_uid))
+    if not valid_uids:
+        logger.info("No new emails found.")
+        return
+
+    window_size = max(int(window_size), 1)
+    windows = (len(valid_uids) + window_size - 1) // window_size
+    if windows > 1:
+        logger.info(f"Catching up on {len(valid_uids)} emails in {windows} windows of {window_size}.")
+
+    EMAIL_QUEUE_DEPTH.set(len(valid_uids))
+    try:
+        for start in range(0, len(valid_uids), window_size):
+            window = valid_uids[start:start + window_size]
+            yield window[-1], fetch_emails(mail, window, attachment_folder)
+    finally:
+        EMAIL_QUEUE_DEPTH.set(0)
+
 def save_attachment_into_folder(content, filename, folder_path=None):
     """
     Saves an email attachment to the specified or default folder.
@@ -180,7 +279,6 @@ def save_attachment_into_folder(content, filename, folder_path=None):
 
 import os
 
-#TODO:TEST
 #TODO: replace with SQLite
 def save_emails_to_json_split(email_objs, output_folder, max_entries_per_file=1000):
     """
@@ -193,53 +291,39 @@ def save_emails_to_json_split(email_objs, output_folder, max_entries_per_file=10
     """
     os.makedirs(output_folder, exist_ok=True)  # Ensure the output folder exists
 
-    # Convert EmailWithAttachments objects to dictionaries
-    def email_to_dict(email):
-        return {
-            "uid": email.uid,
-            "subject": email.subject,
-            "sender": email.sender,
-            "date": email.date,
-            "attachments": email.attachments,
-        }
-
-    # Convert new emails to dictionaries
-    new_emails = [email_to_dict(email) for email in email_objs]
+    # Emails loaded back for a split are already dictionaries
+    new_emails = [email if isinstance(email, dict) else email.to_dict() for email in email_objs]
 
-    # Find the last part file or create a new one
+    # Find the last part file; new emails are appended to it until it is full
     existing_files = sorted(
         [f for f in os.listdir(output_folder) if f.startswith("processed_emails_part")],
         key=lambda x: int(x.split("part")[-1].split(".json")[0])
     )
-    
+
     if existing_files:
-        # Load the last file to append data
+        part = int(existing_files[-1].split("part")[-1].split(".json")[0])
         last_file = os.path.join(output_folder, existing_files[-1])
         with open(last_file, "r", encoding="utf-8") as json_file:
             existing_data = json.load(json_file)
-
-        # Append new data to the last file
-        updated_data = existing_data + new_emails
-
-        if len(updated_data) > max_entries_per_file:
-            # Split data if it exceeds the max entries
-            excess_data = updated_data[max_entries_per_file:]
-            updated_data = updated_data[:max_entries_per_file]
-            with open(last_file, "w", encoding="utf-8") as json_file:
-                json.dump(updated_data, json_file, ensure_ascii=False, indent=4)
-            print(f"Updated {len(updated_data)} emails in {last_file}")
-
-            # Save remaining data to a new file
-            save_emails_to_json_split(excess_data, output_folder, max_entries_per_file)
-        else:
-            # Save the updated data back to the same file
+        free = max(max_entries_per_file - len(existing_data), 0)
+        if free and new_emails:
             with open(last_file, "w", encoding="utf-8") as json_file:
-                json.dump(updated_data, json_file, ensure_ascii=False, indent=4)
-            print(f"Appended {len(new_emails)} emails to {last_file}")
+                json.dump(existing_data + new_emails[:free], json_file, ensure_ascii=False, indent=4)
+            print(f"Appended {len(new_emails[:free])} emails to {last_file}")
+        new_emails = new_emails[free:]
+        part += 1
     else:
-        # No existing files, create the first file
-        file_path = os.path.join(output_folder, "processed_emails_part1.json")
+        part = 1
+
+    # Whatever did not fit goes to new part files, max_entries_per_file at a time
+    # (the first file is created even when there is nothing to write yet)
+    chunks = [new_emails[i:i + max_entries_per_file] for i in range(0, len(new_emails), max_entries_per_file)]
+    if not chunks and not existing_files:
+        chunks = [[]]
+    for chunk in chunks:
+        file_path = os.path.join(output_folder, f"processed_emails_part{part}.json")
         with open(file_path, "w", encoding="utf-8") as json_file:
-            json.dump(new_emails, json_file, ensure_ascii=False, indent=4)
-        print(f"Created {file_path} with {len(new_emails)} emails")
+            json.dump(chunk, json_file, ensure_ascii=False, indent=4)
+        print(f"Created {file_path} with {len(chunk)} emails")
+        part += 1
 
@@ -0,0 +1,152 @@
+import imaplib
+import zlib
+from config.loggin_config import logger
+from monitoring.metrics import counter
+
+IMAP_WIRE_BYTES = counter(
+    "imap_wire_bytes_total",
+    "Bytes sent and received on the IMAP connection, after compression.",
+    ("direction",),
+)
+IMAP_PAYLOAD_BYTES = counter(
+    "imap_payload_bytes_total",
+    "IMAP protocol bytes sent and received, before compression / after decompression.",
+    ("direction",),
+)
+
+# COMPRESS is not in imaplib's command table; it is allowed once authenticated (RFC 4978)
+imaplib.Commands.setdefault("COMPRESS", ("AUTH", "SELECTED"))
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class DeflateStreamMixin:
+    """
+    RFC 4978 COMPRESS=DEFLATE for imaplib connections.
+
+    After enable_compression() succeeds, everything imaplib sends is deflated and everything
+    it reads is inflated in read()/readline(), the two methods imaplib reads responses
+    through, so the rest of the code keeps using the connection unchanged. Wire and payload
+    bytes are counted in both directions, with or without compression.
+    """
+
+    _compressor = None
+    _decompressor = None
+    _inflated = None
+    wire_bytes_received = 0
+    wire_bytes_sent = 0
+    payload_bytes_received = 0
+    payload_bytes_sent = 0
+
+    @property
+    def compressing(self):
+        return self._compressor is not None
+
+    def refresh_capabilities(self):
+        """
+        Reloads the capabilities; many servers announce extensions such as COMPRESS=DEFLATE
+        and CONDSTORE only after login.
+        """
+        status, data = self.capability()
+        if status == "OK" and data and data[-1]:
+            value = data[-1].decode("ascii", "ignore") if isinstance(data[-1], bytes) else data[-1]
+            self.capabilities = tuple(value.upper().split())
+        return self.capabilities
+
+    def enable_compression(self, level=zlib.Z_DEFAULT_COMPRESSION):
+        """
+        Negotiates COMPRESS=DEFLATE if the server advertises it.
+
+        Args:
+            level (int): zlib compression level for the data sent to the server.
+
+        Returns:
+            bool: True if the connection is compressed from now on.
+        """
+        if self.compressing:
+            return True
+        if "COMPRESS=DEFLATE" not in self.capabilities:
+            return False
+        try:
+            status, data = self._simple_command("COMPRESS", "DEFLATE")
+        except self.error as e:
+            logger.warning(f"IMAP server refused COMPRESS=DEFLATE: {e}")
+            return False
+        if status != "OK":
+            logger.warning(f"IMAP server refused COMPRESS=DEFLATE: {data}")
+            return False
+
+        # Raw deflate streams without zlib headers, as required by RFC 4978
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._inflated = bytearray()
+        logger.info("IMAP connection compressed with DEFLATE.")
+        return True
+
+    def _count_received(self, wire, payload):
+        self.wire_bytes_received += wire
+        self.payload_bytes_received += payload
+        IMAP_WIRE_BYTES.labels(direction="received").inc(wire)
+        IMAP_PAYLOAD_BYTES.labels(direction="received").inc(payload)
+
+    def _inflate_more(self):
+        # read1 returns what the buffered reader already holds before touching the socket, so
+        # compressed bytes read ahead together with the COMPRESS response are not lost
+        data = self.file.read1(READ_CHUNK_SIZE)
+        if not data:
+            raise self.abort("socket error: EOF")
+        inflated = self._decompressor.decompress(data)
+        self._count_received(len(data), len(inflated))
+        self._inflated += inflated
+
+    def read(self, size):
+        if not self.compressing:
+            data = super().read(size)
+            self._count_received(len(data), len(data))
+            return data
+        while len(self._inflated) < size:
+            self._inflate_more()
+        data = bytes(self._inflated[:size])
+        del self._inflated[:size]
+        return data
+
+    def readline(self):
+        if not self.compressing:
+            line = super().readline()
+            self._count_received(len(line), len(line))
+            return line
+        searched = 0
+        while True:
+            end = self._inflated.find(b"\n", searched)
+            if end >= 0:
+                line = bytes(self._inflated[:end + 1])
+                del self._inflated[:end + 1]
+                return line
+            if len(self._inflated) > imaplib._MAXLINE:
+                raise self.error(f"got more than {imaplib._MAXLINE} bytes")
+            searched = len(self._inflated)
+            self._inflate_more()
+
+    def send(self, data):
+        payload = len(data)
+        if self.compressing:
+            data = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.wire_bytes_sent += len(data)
+        self.payload_bytes_sent += payload
+        IMAP_WIRE_BYTES.labels(direction="sent").inc(len(data))
+        IMAP_PAYLOAD_BYTES.labels(direction="sent").inc(payload)
+        super().send(data)
+
+    def logout(self):
+        result = super().logout()
+        if self.payload_bytes_received:
+            ratio = self.wire_bytes_received / self.payload_bytes_received
+            logger.info(
+                f"IMAP received {self.wire_bytes_received} bytes on the wire for "
+                f"{self.payload_bytes_received} bytes of data ({ratio:.0%}, compressed: {self.compressing})."
+            )
+        return result
+
+
+class CompressedIMAP4_SSL(DeflateStreamMixin, imaplib.IMAP4_SSL):
+    """imaplib.IMAP4_SSL with COMPRESS=DEFLATE support, see DeflateStreamMixin."""
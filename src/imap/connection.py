@@ -1,76 +1,341 @@
 import imaplib
+import random
+import threading
 from config.loggin_config import logger
 import socket
 import time
 from config.config import load_config
 from config.credentials import get_imap_credentials
+from monitoring.metrics import counter, gauge, histogram
+from imap.compression import CompressedIMAP4_SSL
+
+IMAP_CONNECT_ATTEMPTS = counter("imap_connect_attempts_total", "IMAP connection attempts by result.", ("result",))
+IMAP_CONNECT_SECONDS = histogram("imap_connect_seconds", "Time to connect and log in to the IMAP server.")
+IMAP_CIRCUIT_STATE = gauge("imap_circuit_state", "IMAP circuit breaker state: 0 closed, 1 half-open, 2 open.")
+IMAP_AVAILABLE = gauge("imap_available", "1 while the IMAP server is considered reachable, otherwise 0.")
 
 # Set a global timeout for all socket connections
 socket.setdefaulttimeout(30)
 
-def get_imap_connection(max_retries=5, retry_delay=10):
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class IMAPUnavailableError(Exception):
+    """The IMAP server cannot be reached, or the circuit breaker does not allow an attempt yet."""
+
+
+class IMAPAuthenticationError(Exception):
+    """The server rejected the credentials; retrying with the same credentials will not help."""
+
+
+def classify_error(error):
+    """
+    Classifies a connection error.
+
+    Only IMAPAuthenticationError, which open_imap_connection raises for missing credentials
+    and rejected logins, counts as an authentication failure. Protocol errors (a bad greeting,
+    a failed SELECT) and other IMAP4 errors are retried like network errors.
+
+    Returns:
+        str: "auth" for rejected or missing credentials, "transient" for network errors,
+            timeouts, server disconnects and protocol errors, which are worth retrying.
+    """
+    if isinstance(error, IMAPAuthenticationError):
+        return "auth"
+    return "transient"
+
+
+class CircuitBreaker:
+    """
+    Stops connection attempts to a server that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and attempts are refused
+    for `reset_timeout` seconds. Then one trial attempt is allowed (half-open): success closes
+    the circuit, failure opens it again for twice as long, up to `max_reset_timeout`.
     """
-    Establishes a connection to the IMAP server with retries in case of failure.
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0, max_reset_timeout=900.0, clock=time.monotonic):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds the circuit stays open the first time.
+            max_reset_timeout (float): Upper bound of the open time after repeated failures.
+            clock (callable): Returns the current time in seconds (replaceable for testing).
+        """
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_timeout = float(reset_timeout)
+        self.max_reset_timeout = float(max_reset_timeout)
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.open_timeout = self.reset_timeout
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() >= self.opened_at + self.open_timeout else "open"
+
+    def retry_in(self):
+        """Seconds until the next attempt is allowed (0 if it is allowed now)."""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.open_timeout - self.clock(), 0.0)
+
+    def allow(self):
+        """Returns True if a connection attempt may be made now."""
+        return self.state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.open_timeout = self.reset_timeout
+        IMAP_CIRCUIT_STATE.set(CIRCUIT_STATES["closed"])
+
+    def record_failure(self, open_for=None):
+        """
+        Counts a failed attempt.
+
+        Args:
+            open_for (float): Open the circuit right away for this many seconds (used for
+                authentication failures) instead of counting towards the threshold.
+        """
+        with self._lock:
+            was_half_open = self.state == "half_open"
+            self.failures += 1
+            if open_for is not None:
+                self.opened_at, self.open_timeout = self.clock(), float(open_for)
+            elif was_half_open:
+                self.opened_at = self.clock()
+                self.open_timeout = min(self.open_timeout * 2, self.max_reset_timeout)
+            elif self.opened_at is None and self.failures >= self.failure_threshold:
+                self.opened_at, self.open_timeout = self.clock(), self.reset_timeout
+        IMAP_CIRCUIT_STATE.set(CIRCUIT_STATES[self.state])
+
+
+def open_imap_connection(config):
+    """
+    Connects and logs in to the IMAP server once, without retries.
 
     Args:
-        max_retries (int): Maximum number of retry attempts before giving up.
-        retry_delay (int): Time (in seconds) to wait between retries.
+        config (dict): The configuration data.
 
     Returns:
-        imaplib.IMAP4_SSL: The IMAP connection object if successful.
+        CompressedIMAP4_SSL: The authenticated connection.
 
     Raises:
-        Exception: If all retry attempts fail.
+        IMAPAuthenticationError: If the credentials are missing or the login is rejected.
     """
-    attempts = 0
-    # Load configuration
-    config = load_config()
+    # Retrieve credentials
+    try:
+        username, password = get_imap_credentials(config)
+    except ValueError as e:
+        raise IMAPAuthenticationError(str(e)) from e
+
+    # Ensure credentials are provided
+    if not username or not password:
+        raise IMAPAuthenticationError("IMAP username or password not provided in the configuration.")
+
+    # Connect to the IMAP server
+    server = config.get("imap_server", "imap.ionos.es")
+    port = config.get("imap_port", 993)
+    logger.info(f"Connecting to IMAP server {server} on port {port}...")
+
+    # Create the IMAP connection
+    with IMAP_CONNECT_SECONDS.time():
+        mail = CompressedIMAP4_SSL(server, port)
+        try:
+            mail.login(username, password)
+        except imaplib.IMAP4.abort:
+            raise
+        except imaplib.IMAP4.error as e:
+            try:
+                mail.shutdown()
+            except OSError:
+                pass
+            raise IMAPAuthenticationError(f"IMAP login failed for {username}: {e}") from e
 
-    while attempts < max_retries:
+    # Attachments are base64 and compress well; worth it on slow links
+    if config.get("imap_compress", True):
         try:
-            # Retrieve credentials
-            username, password = get_imap_credentials(config)
+            if "COMPRESS=DEFLATE" not in mail.capabilities:
+                mail.refresh_capabilities()
+            mail.enable_compression()
+        except imaplib.IMAP4.error as e:
+            logger.warning(f"Continuing without IMAP compression: {e}")
 
-            # Ensure credentials are provided
-            if not username or not password:
-                raise ValueError("IMAP username or password not provided in the configuration.")
+    logger.info(f"Successfully connected to the IMAP server as {username}.")
+    return mail
 
-            # Connect to the IMAP server
-            server = config.get("imap_server", "imap.ionos.es")
-            port = config.get("imap_port", 993)
-            logger.info(f"Attempt {attempts + 1}/{max_retries}: Connecting to IMAP server {server} on port {port}...")
 
-            # Create the IMAP connection
-            mail = imaplib.IMAP4_SSL(server, port)
-            mail.login(username, password)
+class ConnectionManager:
+    """
+    Opens IMAP connections with retries and keeps track of the server's health.
+
+    Transient errors (network, timeouts, disconnects) are retried with a full-jitter
+    exponential backoff and counted by a CircuitBreaker. An authentication failure is not
+    retried: the circuit opens for `auth_retry_seconds`, since the same credentials will be
+    rejected again. While the circuit is open, connect() fails immediately, so the caller
+    can carry on with other work and try again later.
+    """
 
-            logger.info(f"Successfully connected to the IMAP server as {username}.")
-            return mail  # Return the connection if successful
+    def __init__(self, max_retries=5, base_delay=2.0, max_delay=120.0, breaker=None, auth_retry_seconds=3600.0,
+                 open_connection=None, load=load_config, sleep=time.sleep):
+        """
+        Args:
+            max_retries (int): Attempts per connect() call.
+            base_delay (float): Upper bound of the first backoff in seconds; doubles with every retry.
+            max_delay (float): Upper bound of the backoff.
+            breaker (CircuitBreaker): The circuit breaker (default CircuitBreaker()).
+            auth_retry_seconds (float): Time the circuit stays open after an authentication failure.
+            open_connection (callable): Opens one connection from the configuration (default open_imap_connection).
+            load (callable): Returns the configuration; called on every connect() so that
+                corrected credentials are picked up.
+            sleep (callable): Sleep function (replaceable for testing).
+        """
+        self.max_retries = max(int(max_retries), 1)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.breaker = breaker or CircuitBreaker()
+        self.auth_retry_seconds = float(auth_retry_seconds)
+        self.open_connection = open_connection or open_imap_connection
+        self.load = load
+        self.sleep = sleep
+        self.last_error = None
+        self.last_error_kind = None
+        self.last_success = None
 
-        except imaplib.IMAP4.error as e:
-            # Log authentication errors and retry
-            logger.error(f"IMAP login failed: {e}. Retrying in {retry_delay} seconds...")
-            attempts += 1
-            if attempts >= max_retries:
-                raise
-            time.sleep(retry_delay)
-
-        except socket.timeout:
-            # Log timeout errors and retry
-            logger.error(f"Connection attempt timed out. Retrying in {retry_delay} seconds...")
-            attempts += 1
-            if attempts >= max_retries:
-                raise
-            time.sleep(retry_delay)
-
-        except Exception as e:
-            # Log unexpected errors and retry
-            logger.error(f"Unexpected error occurred: {e}. Retrying in {retry_delay} seconds...")
-            attempts += 1
-            if attempts >= max_retries:
-                raise
-            time.sleep(retry_delay)
-
-    # If all retries fail, raise a final exception
-    logger.error("All connection attempts failed.")
-    raise Exception("Unable to establish a connection to the IMAP server after multiple retries.")
+    @classmethod
+    def from_config(cls, config):
+        """
+        Creates a connection manager from the imap_retry_* and imap_circuit_* keys of config.json.
+
+        Args:
+            config (dict): The configuration data.
+        """
+        return cls(
+            max_retries=config.get("imap_retry_attempts", 5),
+            base_delay=config.get("imap_retry_base_delay", 2.0),
+            max_delay=config.get("imap_retry_max_delay", 120.0),
+            breaker=CircuitBreaker(
+                failure_threshold=config.get("imap_circuit_failures", 5),
+                reset_timeout=config.get("imap_circuit_reset_seconds", 60.0),
+                max_reset_timeout=config.get("imap_circuit_max_reset_seconds", 900.0),
+            ),
+            auth_retry_seconds=config.get("imap_auth_retry_seconds", 3600.0),
+        )
+
+    def connect(self):
+        """
+        Returns an authenticated IMAP connection.
+
+        Raises:
+            IMAPAuthenticationError: If the credentials are missing or rejected (also while
+                the circuit stays open after such a failure).
+            IMAPUnavailableError: If the circuit is open or all attempts failed.
+        """
+        for attempt in range(self.max_retries):
+            if not self.breaker.allow():
+                IMAP_CONNECT_ATTEMPTS.labels(result="circuit_open").inc()
+                message = f"IMAP connection attempts paused for {self.breaker.retry_in():.0f}s after: {self.last_error}"
+                if self.last_error_kind == "auth":
+                    raise IMAPAuthenticationError(message)
+                raise IMAPUnavailableError(message)
+            try:
+                mail = self.open_connection(self.load())
+            except Exception as e:
+                kind = self.record_failure(e)
+                if kind == "auth":
+                    raise IMAPAuthenticationError(str(e)) from e
+                if attempt + 1 >= self.max_retries or not self.breaker.allow():
+                    raise IMAPUnavailableError(
+                        f"Unable to connect to the IMAP server after {attempt + 1} attempts: {e}"
+                    ) from e
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logger.warning(f"Retrying the IMAP connection ({attempt + 2}/{self.max_retries}) in {delay:.1f}s...")
+                self.sleep(delay)
+                continue
+            self.record_success()
+            return mail
+
+    def record_success(self):
+        IMAP_CONNECT_ATTEMPTS.labels(result="success").inc()
+        IMAP_AVAILABLE.set(1)
+        self.breaker.record_success()
+        self.last_success = time.time()
+        self.last_error = self.last_error_kind = None
+
+    def record_failure(self, error):
+        """
+        Records a failed connection or a connection lost during a cycle.
+
+        Returns:
+            str: The error kind, see classify_error().
+        """
+        kind = classify_error(error)
+        if kind == "auth":
+            IMAP_CONNECT_ATTEMPTS.labels(result="login_failed").inc()
+            logger.error(f"IMAP authentication failed: {error}. Not retrying for {self.auth_retry_seconds:.0f}s; "
+                         f"check the credentials.")
+            self.breaker.record_failure(open_for=self.auth_retry_seconds)
+        else:
+            timeout = isinstance(error, TimeoutError)
+            IMAP_CONNECT_ATTEMPTS.labels(result="timeout" if timeout else "error").inc()
+            logger.error(f"IMAP connection failed: {type(error).__name__}: {error}")
+            self.breaker.record_failure()
+        IMAP_AVAILABLE.set(0)
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.last_error_kind = kind
+        return kind
+
+    def health(self):
+        """
+        Returns the connection health.
+
+        Returns:
+            dict: available (bool), state of the circuit, consecutive failures, last error and
+                its kind, time of the last successful login, seconds until the next attempt.
+        """
+        return {
+            "available": self.breaker.state == "closed" and self.last_error is None,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "last_error": self.last_error,
+            "last_error_kind": self.last_error_kind,
+            "last_success": self.last_success,
+            "retry_in": self.breaker.retry_in(),
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_connection_manager():
+    """Returns the process-wide ConnectionManager, created from config.json on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ConnectionManager.from_config(load_config())
+        return _manager
+
+
+def connection_health():
+    """Returns the health of the IMAP connection, see ConnectionManager.health()."""
+    return get_connection_manager().health()
+
+
+def get_imap_connection():
+    """
+    Establishes a connection to the IMAP server through the process-wide ConnectionManager.
+
+    Returns:
+        imaplib.IMAP4_SSL: The IMAP connection object if successful.
+
+    Raises:
+        IMAPAuthenticationError: If the credentials are rejected.
+        IMAPUnavailableError: If the server cannot be reached or the circuit breaker is open.
+    """
+    return get_connection_manager().connect()
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+from datetime import datetime
+from config.loggin_config import logger
+from monitoring.metrics import counter
+
+MAILBOX_CHECKS = counter(
+    "imap_mailbox_checks_total",
+    "Mailbox change checks by outcome (unchanged, changed, unknown, uidvalidity_changed).",
+    ("outcome",),
+)
+
+# IMAP dates use English month abbreviations regardless of the locale
+IMAP_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def imap_date(value):
+    """
+    Converts a date to the IMAP search format (DD-Mon-YYYY).
+
+    Args:
+        value (str | date): An ISO date (YYYY-MM-DD, a time part is ignored) or a date object.
+    """
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], "%Y-%m-%d")
+    return f"{value.day:02d}-{IMAP_MONTHS[value.month - 1]}-{value.year}"
+
+
+def _response_int(mail, code):
+    """Returns the numeric value of an untagged response code (e.g. UIDNEXT) of the last SELECT."""
+    try:
+        _, data = mail.response(code)
+    except Exception:
+        return None
+    values = [value for value in data or [] if value]
+    if not values:
+        return None
+    value = values[-1]
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "ignore")
+    try:
+        return int(str(value).split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def supports_condstore(mail):
+    """
+    Returns True if the server offers CONDSTORE (RFC 7162). Servers with QRESYNC always
+    support CONDSTORE as well.
+
+    Args:
+        mail (IMAP4_SSL): An authenticated IMAP connection.
+    """
+    capabilities = {str(capability).upper() for capability in getattr(mail, "capabilities", ())}
+    return bool(capabilities & {"CONDSTORE", "QRESYNC"})
+
+
+def select_mailbox(mail, mailbox="INBOX", readonly=True):
+    """
+    Selects a mailbox and returns the state reported in the SELECT response.
+
+    If the server supports CONDSTORE, the mailbox is selected with the CONDSTORE parameter,
+    which makes the response include HIGHESTMODSEQ without a separate ENABLE round trip.
+
+    Args:
+        mail (IMAP4_SSL): An authenticated IMAP connection.
+        mailbox (str): The mailbox to select.
+        readonly (bool): Select with EXAMINE so that no flags are changed.
+
+    Returns:
+        dict: exists, uidvalidity, uidnext and highestmodseq (None when the server did not send them).
+    """
+    argument = f"{mailbox} (CONDSTORE)" if supports_condstore(mail) else mailbox
+    status, data = mail.select(argument, readonly=readonly)
+    if status != "OK":
+        raise RuntimeError(f"SELECT {mailbox} failed with status: {status}")
+
+    exists = None
+    if data and data[0]:
+        try:
+            exists = int(data[0])
+        except ValueError:
+            pass
+    return {
+        "exists": exists,
+        "uidvalidity": _response_int(mail, "UIDVALIDITY"),
+        "uidnext": _response_int(mail, "UIDNEXT"),
+        "highestmodseq": _response_int(mail, "HIGHESTMODSEQ"),
+    }
+
+
+def detect_changes(snapshot, saved, last_uid):
+    """
+    Decides from the SELECT response alone whether the mailbox can contain new emails.
+
+    The mailbox is unchanged if its UIDVALIDITY is the same as after the last complete cycle
+    and either UIDNEXT shows that no UID above last_uid was assigned, or (with CONDSTORE)
+    HIGHESTMODSEQ did not move since that cycle.
+
+    Args:
+        snapshot (dict): Result of select_mailbox.
+        saved (dict): State saved by MailboxStateStore after the last complete cycle.
+        last_uid (int): The last processed UID.
+
+    Returns:
+        str: "unchanged", "changed", "uidvalidity_changed", or "unknown" if there is nothing
+            to compare with and the caller has to search.
+    """
+    if not saved or snapshot.get("uidvalidity") is None or saved.get("uidvalidity") is None:
+        return "unknown"
+    if snapshot["uidvalidity"] != saved["uidvalidity"]:
+        return "uidvalidity_changed"
+
+    uidnext = snapshot.get("uidnext")
+    if uidnext is not None:
+        return "unchanged" if uidnext - 1 <= last_uid else "changed"
+
+    modseq = snapshot.get("highestmodseq")
+    if modseq is not None and saved.get("highestmodseq") is not None:
+        if modseq == saved["highestmodseq"] and saved.get("synced_uid", -1) >= last_uid:
+            return "unchanged"
+        return "changed"
+    return "unknown"
+
+
+class MailboxStateStore:
+    """
+    UIDVALIDITY, UIDNEXT and HIGHESTMODSEQ per mailbox, saved as JSON after every complete cycle.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the mailbox state {self.path}: {e}")
+            return {}
+
+    def get(self, mailbox="INBOX"):
+        with self._lock:
+            return dict(self._data.get(mailbox, {}))
+
+    def save(self, snapshot, synced_uid, mailbox="INBOX"):
+        """
+        Records the state of a mailbox after all emails up to synced_uid were processed.
+
+        Args:
+            snapshot (dict): Result of select_mailbox at the start of the cycle.
+            synced_uid (int): The last processed UID.
+            mailbox (str): The mailbox name.
+        """
+        with self._lock:
+            self._data[mailbox] = {
+                "uidvalidity": snapshot.get("uidvalidity"),
+                "uidnext": snapshot.get("uidnext"),
+                "highestmodseq": snapshot.get("highestmodseq"),
+                "synced_uid": synced_uid,
+                "last_sync": datetime.now().isoformat(timespec="seconds"),
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=4)
+            os.replace(temp_file, self.path)
+
+
+def _newest_uid(mail, snapshot):
+    if snapshot.get("uidnext"):
+        return snapshot["uidnext"] - 1
+    status, data = mail.uid("SEARCH", None, "ALL")
+    if status == "OK" and data and data[0]:
+        return max(int(uid) for uid in data[0].split())
+    return 0
+
+
+def resync_checkpoint(mail, saved, snapshot):
+    """
+    Returns a new last UID after the server changed UIDVALIDITY, i.e. renumbered the mailbox.
+
+    The old UIDs are meaningless, so the emails received since the day of the last complete
+    cycle are processed again (IMAP searches by date only). Without a saved sync date the
+    checkpoint moves to the newest email and nothing is reprocessed.
+
+    Args:
+        mail (IMAP4_SSL): A connection with the mailbox selected.
+        saved (dict): The saved state with the old UIDVALIDITY.
+        snapshot (dict): Result of select_mailbox.
+
+    Returns:
+        int: The UID to continue after.
+    """
+    fallback = _newest_uid(mail, snapshot)
+    last_sync = saved.get("last_sync")
+    logger.error(
+        f"UIDVALIDITY changed from {saved.get('uidvalidity')} to {snapshot.get('uidvalidity')}; "
+        f"the saved max_uid no longer refers to the same emails."
+    )
+    if not last_sync:
+        logger.warning(f"No previous sync date recorded; continuing after UID {fallback}.")
+        return fallback
+
+    criteria = f"SINCE {imap_date(last_sync)}"
+    status, data = mail.uid("SEARCH", None, criteria)
+    if status != "OK" or not data or not data[0]:
+        logger.warning(f"No emails found {criteria}; continuing after UID {fallback}.")
+        return fallback
+    first_uid = min(int(uid) for uid in data[0].split())
+    logger.warning(f"Reprocessing the emails {criteria} (from UID {first_uid}).")
+    return first_uid - 1
@@ -3,18 +3,38 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import time
-from imap.connection import get_imap_connection
-from emails.handler import process_emails_since, save_emails_to_json_split
-from processing.attachments.handler import DefaultFileProcessor, AttachmentProcessor
+import imaplib
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from imap.connection import (
+    get_imap_connection, get_connection_manager, connection_health, IMAPAuthenticationError, IMAPUnavailableError
+)
+from imap.mailbox_state import MailboxStateStore, MAILBOX_CHECKS, select_mailbox, detect_changes, resync_checkpoint
+from emails.handler import stream_emails_since, save_emails_to_json_split
+from processing.attachments.handler import DefaultFileProcessor, AttachmentProcessor, create_file_processor
 from processing.attachments.data_loader import load_parameters_from_db
 from processing.tracker import get_last_saved_uid, save_last_uid
+from processing.scheduler import AdaptivePollScheduler
+from processing.backfill import run_backfill, apply_live_rate_share, watch_backfill_share
+from processing.replay import run_replay
+from processing.watch_folder import WatchFolder
+from DB.document_index import DocumentIndex
 from config.config import load_config
 from utils.resource_path import resource_path
-from config.loggin_config import logger
+from config.loggin_config import logger, configure_logging
+from AWS_TEXTRACT.rate_limiter import configure_rate_limits
+from AWS_TEXTRACT.s3_staging import configure_staging
+from monitoring.exporter import start_metrics_exporters
+from monitoring.profiler import SamplingProfiler, null_profile
 
 def setup_configuration():
     """
     Ensure the configuration file is set up before running the main program.
+
+    Returns:
+        dict: The loaded configuration, or None if the setup failed.
     """
     try:
         config = load_config()
@@ -25,12 +45,16 @@ def setup_configuration():
             max_uid = get_max_uid_from_server()
             if max_uid > 0:
                 save_last_uid(max_uid)
+                config["max_uid"] = max_uid
                 logger.info(f"Max UID ({max_uid}) saved to config.json.")
             else:
                 logger.info("Unable to determine max UID. Starting from 0.")
 
+        return config
+
     except Exception as e:
         logger.error(f"Error during setup: {e}")
+        return None
 
 def get_max_uid_from_server():
     """
@@ -50,9 +74,269 @@ def get_max_uid_from_server():
         logger.error(f"Error retrieving max UID from server: {e}")
     return 0
 
-def main():
-    setup_configuration()  # Ensure configuration is set up
-    config = load_config()
+def run_cycle(mail, last_uid, parameters, destination_folder, processed_emails_output_folder, attachment_profiler=None,
+              file_processor=None, window_size=100, mailbox_state=None, document_index=None):
+    """
+    Runs one polling cycle: downloads new emails, processes their attachments and persists the results.
+
+    The new emails are handled in windows of window_size UIDs. Each window is processed,
+    saved to JSON and checkpointed (last UID) before the next one is fetched, so a large
+    backlog needs constant memory and an interrupted run resumes after the last window.
+
+    Args:
+        mail (IMAP4_SSL): An authenticated IMAP connection.
+        last_uid (int): The last processed UID.
+        parameters (list): Parameters loaded from the database file.
+        destination_folder (str): Folder where processed attachments are moved.
+        processed_emails_output_folder (str): Folder for the split JSON files.
+        attachment_profiler (SamplingProfiler): Optional profiler wrapping each attachment.
+        file_processor (FileProcessorStrategy): Strategy used for the attachments (default DefaultFileProcessor).
+        window_size (int): Number of UIDs fetched, processed and checkpointed together.
+        mailbox_state (MailboxStateStore): Optional saved mailbox state. When given, the cycle
+            ends after the SELECT if UIDNEXT/HIGHESTMODSEQ show that nothing changed, and a
+            UIDVALIDITY change moves the checkpoint instead of silently using stale UIDs.
+        document_index (DocumentIndex): Optional full-text index the filed documents are added to.
+
+    Returns:
+        int: The number of emails processed in this cycle.
+    """
+    snapshot = None
+    if mailbox_state is not None:
+        snapshot = select_mailbox(mail)
+        saved = mailbox_state.get()
+        outcome = detect_changes(snapshot, saved, last_uid)
+        MAILBOX_CHECKS.labels(outcome=outcome).inc()
+        if outcome == "unchanged":
+            logger.info(f"Mailbox unchanged (UIDNEXT {snapshot['uidnext']}, HIGHESTMODSEQ {snapshot['highestmodseq']}).")
+            return 0
+        if outcome == "uidvalidity_changed":
+            last_uid = resync_checkpoint(mail, saved, snapshot)
+            save_last_uid(last_uid)
+
+    processor = AttachmentProcessor(file_processor or DefaultFileProcessor(), profiler=attachment_profiler,
+                                    document_index=document_index)
+    processed = 0
+
+    for window_max_uid, emails in stream_emails_since(mail, last_uid, window_size):
+        processed_emails = []
+        for email in emails:
+            # Process attachments with detailed logic
+            updated_email = processor.process_attachments_from_email(
+                email_obj=email,
+                parameters=parameters,  # Use loaded parameters
+                base_destination_folder=destination_folder
+            )
+            processed_emails.append(updated_email)
+
+        # Save processed emails to JSON, then advance the checkpoint past this window
+        if processed_emails:
+            save_emails_to_json_split(processed_emails, processed_emails_output_folder, max_entries_per_file=1000)
+        if window_max_uid > last_uid:
+            save_last_uid(window_max_uid)
+            last_uid = window_max_uid
+        processed += len(processed_emails)
+        logger.info(f"Checkpoint at UID {window_max_uid} ({processed} emails processed in this cycle).")
+
+    # Only a complete cycle may be recorded, otherwise an unchanged HIGHESTMODSEQ would hide unprocessed emails
+    if mailbox_state is not None:
+        mailbox_state.save(snapshot, last_uid)
+    return processed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download email attachments and process invoices with AWS Textract.")
+    parser.add_argument("--once", action="store_true",
+                        help="Run a single polling cycle and exit (for cron or the Windows task scheduler).")
+    watch = parser.add_argument_group("watch folder")
+    watch.add_argument("--watch", metavar="FOLDER", nargs="?", const="",
+                       help="Process the files dropped into a folder (scanners, fax) instead of polling the mailbox. "
+                            "FOLDER defaults to watch_folder from the configuration; with --once, the files in "
+                            "the folder are processed and the program exits.")
+    backfill = parser.add_argument_group("backfill")
+    backfill.add_argument("--backfill", action="store_true",
+                          help="Process historical emails (up to the live checkpoint) over parallel connections and exit.")
+    backfill.add_argument("--partitions", type=int, help="Parallel IMAP connections (default backfill_partitions or 4).")
+    backfill.add_argument("--since", help="Only backfill emails received on or after this date (YYYY-MM-DD).")
+    backfill.add_argument("--before", help="Only backfill emails received before this date (YYYY-MM-DD).")
+    backfill.add_argument("--backfill-state", help="State file for resuming; without --backfill, the state file of a backfill "
+                               "whose AWS rate limit share to leave free (default src/DB/backfill_state.json).")
+    search = parser.add_argument_group("document search")
+    search.add_argument("--search", metavar="TERMS", nargs="?", const="",
+                        help="Search the indexed documents (words, invoice numbers, IBANs) and exit. "
+                             "Combine with --vendor and with --since/--before for the email date.")
+    search.add_argument("--vendor", help="Only documents whose vendor name contains this text.")
+    search.add_argument("--limit", type=int, default=50,
+                        help="Maximum number of search results or listed replay changes (default 50).")
+    replay = parser.add_argument_group("replay")
+    replay.add_argument("--replay", metavar="SOURCE", nargs="?", const="",
+                        help="Reclassify stored Textract responses without calling AWS or moving files, and exit. "
+                             "SOURCE is a response archive or a folder of .json responses "
+                             "(default: the configured Textract archive).")
+    replay.add_argument("--baseline", help="Results file of an earlier replay to compare with.")
+    replay.add_argument("--replay-output", help="Write the results of this replay to this file (JSON lines).")
+    replay.add_argument("--report", help="Write the diff report to this JSON file.")
+    replay.add_argument("--workers", type=int, help="Worker processes for the replay (default: number of CPUs).")
+    replay.add_argument("--threshold", type=int, default=60, help="Minimum fuzzy match score for the owner (default 60).")
+    profiling = parser.add_argument_group("profiling")
+    profiling.add_argument("--profile", action="store_true", help="Profile polling cycles with cProfile.")
+    profiling.add_argument("--profile-scope", choices=("cycle", "attachment"), default="cycle",
+                           help="Profile whole polling cycles or individual attachments.")
+    profiling.add_argument("--profile-every", type=int, default=1, help="Profile only every k-th cycle/attachment.")
+    profiling.add_argument("--profile-dir", default="profiles", help="Folder for the .pstats and allocation reports.")
+    profiling.add_argument("--profile-keep", type=int, default=20, help="Number of profiles to keep.")
+    profiling.add_argument("--profile-memory", action="store_true", help="Also record tracemalloc allocation reports.")
+    return parser.parse_args(argv)
+
+def run_search_command(args, config):
+    """
+    Prints the indexed documents matching --search, --vendor and --since/--before.
+
+    Args:
+        args (Namespace): Parsed command line arguments.
+        config (dict): The configuration data.
+    """
+    index = DocumentIndex(config.get("document_index_file") or resource_path("DB/document_index.sqlite3"))
+    until = None
+    if args.before:
+        # --before is exclusive like the IMAP BEFORE criterion; the index filters inclusively
+        until = (datetime.strptime(args.before, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+    results = index.search(args.search, vendor=args.vendor, since=args.since, until=until, limit=args.limit)
+    for document in results:
+        print(f"{(document['email_date'] or '')[:10]:<10}  {document['vendor_name'] or '-':<30.30}  "
+              f"{document['invoice_number'] or '-':<20.20}  {document['path']}")
+    print(f"{len(results)} documents found.")
+    index.close()
+
+def run_replay_command(args, config):
+    """
+    Runs the offline replay (--replay) and prints the changes against --baseline.
+
+    Args:
+        args (Namespace): Parsed command line arguments.
+        config (dict): The configuration data.
+    """
+    parameters = load_parameters_from_db(resource_path("DB/db_objects.json"))
+    if not parameters:
+        logger.info("Error: Parameters could not be loaded from the database file.")
+        return
+    source = args.replay or config.get("textract_archive_folder") or resource_path("DB/textract_archive")
+    if not os.path.isdir(source):
+        logger.error(f"Replay source not found: {source}")
+        return
+
+    summary = run_replay(source, parameters, threshold=args.threshold, workers=args.workers,
+                         baseline=args.baseline, output=args.replay_output, report=args.report)
+    print(f"Replayed {summary['documents']} documents in {summary['seconds']}s ({summary['errors']} errors).")
+    diff = summary.get("diff")
+    if diff:
+        for change in diff["changes"][:args.limit]:
+            print(f"{change['key'][:40]:<40}  {change['field']:<14}  {change['before'] or '-'} -> {change['after'] or '-'}")
+        counts = ", ".join(f"{field}: {count}" for field, count in diff["changes_by_field"].items())
+        print(f"{diff['changed_documents']} of {diff['compared']} documents changed ({counts}); "
+              f"{len(diff['only_in_baseline'])} only in the baseline, {len(diff['only_in_replay'])} new.")
+
+def run_backfill_command(args, config, db_file, attachment_folder, destination_folder, processed_emails_output_folder):
+    """
+    Runs the historical backfill (--backfill) up to the live checkpoint.
+
+    Args:
+        args (Namespace): Parsed command line arguments.
+        config (dict): The configuration data.
+        db_file (str): Path of the parameters database file.
+        attachment_folder (str): Base folder for downloaded attachments.
+        destination_folder (str): Folder where processed attachments are moved.
+        processed_emails_output_folder (str): Base folder for the JSON output.
+    """
+    parameters = load_parameters_from_db(db_file)
+    if not parameters:
+        logger.info("Error: Parameters could not be loaded from the database file.")
+        return
+
+    upper_uid = get_last_saved_uid()
+    if upper_uid == 0:
+        # Not initialized yet: backfill up to the current newest email and let the live
+        # ingestion continue right after it
+        upper_uid = get_max_uid_from_server()
+        if upper_uid == 0:
+            logger.warning("Failed to retrieve max UID. Exiting...")
+            return
+        save_last_uid(upper_uid)
+
+    run_backfill(
+        get_imap_connection,
+        args.backfill_state or resource_path("DB/backfill_state.json"),
+        upper_uid,
+        parameters,
+        destination_folder,
+        attachment_folder,
+        processed_emails_output_folder,
+        create_file_processor(config),
+        document_index=DocumentIndex.from_config(config, resource_path("DB/document_index.sqlite3")),
+        partitions=args.partitions or int(config.get("backfill_partitions", 4)),
+        since=args.since,
+        before=args.before,
+        window_size=int(config.get("catch_up_window_size", 100)),
+        rate_share=float(config.get("backfill_rate_share", 0.5)),
+    )
+
+def run_watch_command(args, config, db_file, destination_folder):
+    """
+    Runs the watch-folder mode (--watch) until interrupted, or until the folder is empty with --once.
+
+    Args:
+        args (Namespace): Parsed command line arguments.
+        config (dict): The configuration data.
+        db_file (str): Path of the parameters database file.
+        destination_folder (str): Folder where processed files are moved.
+    """
+    folder = args.watch or config.get("watch_folder")
+    if not folder:
+        logger.error("No folder to watch: pass --watch FOLDER or set watch_folder in config.json.")
+        return
+
+    watch_folder = WatchFolder.from_config(
+        config, create_file_processor(config), db_file, destination_folder, folder=folder,
+        document_index=DocumentIndex.from_config(config, resource_path("DB/document_index.sqlite3")),
+    )
+    try:
+        watch_folder.run(max_idle_cycles=1 if args.once else None)
+    except KeyboardInterrupt:
+        logger.info("Watch folder stopped.")
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = None
+    if args.profile:
+        profiler = SamplingProfiler(args.profile_dir, every=args.profile_every, keep=args.profile_keep,
+                                    trace_memory=args.profile_memory)
+        logger.info(f"Profiling every {profiler.every} {args.profile_scope}(s) into {args.profile_dir}")
+    cycle_profile = profiler.profile if profiler and args.profile_scope == "cycle" else null_profile
+    attachment_profiler = profiler if profiler and args.profile_scope == "attachment" else None
+
+    if args.search is not None:
+        # Read-only query; no IMAP connection or setup needed
+        run_search_command(args, load_config())
+        return
+    if args.replay is not None:
+        # Offline; no IMAP connection, AWS calls or setup needed
+        run_replay_command(args, load_config())
+        return
+
+    config = setup_configuration()  # Ensure configuration is set up; loaded once per run
+    if config is None:
+        return
+    configure_logging(config)  # Apply log_* settings from config.json
+    start_metrics_exporters(config)  # Optional Prometheus endpoint and snapshot file
+    # Optional per-API overrides in aws_rate_limits; a backfill and the live ingestion share the limits
+    configure_rate_limits(config, share=config.get("backfill_rate_share", 0.5) if args.backfill else 1.0)
+    if not args.backfill:
+        # Keep to the rest of the limits while a backfill runs next to this process
+        backfill_state = args.backfill_state or resource_path("DB/backfill_state.json")
+        stale_after = float(config.get("backfill_stale_after", 1800))
+        if args.once:
+            apply_live_rate_share(backfill_state, stale_after)
+        else:
+            watch_backfill_share(backfill_state, stale_after=stale_after)
+    configure_staging(config)  # S3 staging prefix, ledger and cleanup intervals
 
     # Load paths from configuration
     attachment_folder = config.get("attachment_folder", "attachments/")
@@ -70,6 +354,13 @@ def main():
         logger.warning(f"Database file not found: {db_file}")
         return
     
+    if args.backfill:
+        run_backfill_command(args, config, db_file, attachment_folder, destination_folder, processed_emails_output_folder)
+        return
+    if args.watch is not None:
+        run_watch_command(args, config, db_file, destination_folder)
+        return
+
     # Check if max_uid is empty or not set in the config file
     last_uid = get_last_saved_uid()
     if last_uid == 0:  # First execution, initialize the max UID
@@ -83,8 +374,30 @@ def main():
             logger.warning("Failed to retrieve max UID. Exiting...")
         return  # Exit the program after initializing max_uid to avoid processing emails on the first run
 
+    scheduler = AdaptivePollScheduler.from_config(config)
+    file_processor = create_file_processor(config)
+    window_size = int(config.get("catch_up_window_size", 100))
+    mailbox_state = MailboxStateStore(resource_path("DB/mailbox_state.json"))
+    document_index = DocumentIndex.from_config(config, resource_path("DB/document_index.sqlite3"))
+
+    if config.get("watch_folder") and not args.once:
+        # Scans and faxes keep being processed while the mailbox is polled or unavailable
+        watch_folder = WatchFolder.from_config(config, file_processor, db_file, destination_folder,
+                                               document_index=document_index)
+        threading.Thread(target=watch_folder.run, name="watch-folder", daemon=True).start()
+
     while True:
-        mail = get_imap_connection()
+        try:
+            mail = get_imap_connection()
+        except (IMAPAuthenticationError, IMAPUnavailableError) as e:
+            logger.error(f"Mailbox unavailable, skipping this cycle: {e}")
+            if args.once:
+                return
+            # Wait for the circuit breaker rather than sleeping through the first allowed attempt
+            interval = connection_health()["retry_in"] or scheduler.next_interval()
+            logger.info(f"Waiting {interval:.0f}s before the next run...")
+            time.sleep(interval)
+            continue
 
         # Track last processed UID
         last_uid = get_last_saved_uid()
@@ -95,34 +408,29 @@ def main():
             logger.info("Error: Parameters could not be loaded from the database file.")
             return
 
-        # Download emails and process attachments
-        emails = process_emails_since(mail, last_uid)
-
-        if emails:
-            processed_emails = []
-
-            processor = AttachmentProcessor(DefaultFileProcessor())
-
-            for email in emails:
-                # Process attachments with detailed logic
-                updated_email = processor.process_attachments_from_email(
-                    email_obj=email,
-                    parameters=parameters,  # Use loaded parameters
-                    base_destination_folder=destination_folder
-                )
-                processed_emails.append(updated_email)
-
-            # Save processed emails to JSON
-            save_emails_to_json_split(processed_emails, processed_emails_output_folder, max_entries_per_file=1000)
-
-            # Update last_uid
-            new_last_uid = max(int(email.uid) for email in emails)
-            if new_last_uid > last_uid:
-                save_last_uid(new_last_uid)
-
-        mail.logout()
-        logger.info("Waiting 5 min before the next run...")
-        time.sleep(300)
+        new_emails = 0
+        try:
+            with cycle_profile("cycle"):
+                new_emails = run_cycle(mail, last_uid, parameters, destination_folder, processed_emails_output_folder,
+                                       attachment_profiler=attachment_profiler, file_processor=file_processor,
+                                       window_size=window_size, mailbox_state=mailbox_state,
+                                       document_index=document_index)
+        except (imaplib.IMAP4.abort, OSError) as e:
+            # The connection dropped mid-cycle; the checkpoint holds the last complete window
+            get_connection_manager().record_failure(e)
+        finally:
+            try:
+                mail.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+        if args.once:
+            logger.info("Single run finished.")
+            return
+        scheduler.record_cycle(new_emails)
+        interval = scheduler.next_interval()
+        logger.info(f"Waiting {interval:.0f}s before the next run...")
+        time.sleep(interval)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # The replay starts worker processes from the frozen build
     main()
\ No newline at end of file
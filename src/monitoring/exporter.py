@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from config.loggin_config import logger
+from monitoring.metrics import REGISTRY
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    Serves the metrics in Prometheus text format on http://host:port/metrics from a daemon thread.
+
+    Args:
+        port (int): TCP port to listen on.
+        host (str): Interface to bind; defaults to localhost only.
+        registry (MetricsRegistry): Registry to expose.
+
+    Returns:
+        ThreadingHTTPServer: The running server (call shutdown() to stop it).
+    """
+    # Imported here so that runs without the endpoint do not pay for http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes are frequent; keep them out of the application log
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def write_snapshot(snapshot_file, registry=REGISTRY):
+    """
+    Writes a JSON snapshot of all metrics, replacing the previous file atomically.
+
+    Args:
+        snapshot_file (str): Path of the snapshot file.
+        registry (MetricsRegistry): Registry to snapshot.
+    """
+    folder = os.path.dirname(os.path.abspath(snapshot_file))
+    os.makedirs(folder, exist_ok=True)
+    temp_file = f"{snapshot_file}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": time.time(), "metrics": registry.snapshot()}, f, indent=4)
+    os.replace(temp_file, snapshot_file)
+
+
+class SnapshotWriter:
+    """
+    Periodically writes metric snapshots to a file from a daemon thread.
+    """
+
+    def __init__(self, snapshot_file, interval=60, registry=REGISTRY):
+        self.snapshot_file = snapshot_file
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Writing metrics snapshots to {self.snapshot_file} every {self.interval}s")
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        try:
+            write_snapshot(self.snapshot_file, self.registry)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot to {self.snapshot_file}: {e}")
+
+    def stop(self):
+        """Stops the writer thread and writes a final snapshot."""
+        self._stop.set()
+        self.flush()
+
+
+def start_metrics_exporters(config):
+    """
+    Starts the exporters enabled in the configuration.
+
+    Configuration keys:
+        metrics_port (int): Port of the Prometheus endpoint; the endpoint is disabled when not set.
+        metrics_host (str): Interface for the endpoint (default 127.0.0.1).
+        metrics_snapshot_file (str): Path of the periodic JSON snapshot; disabled when not set.
+        metrics_snapshot_interval (int): Seconds between snapshots (default 60).
+
+    Args:
+        config (dict): The configuration data.
+
+    Returns:
+        tuple: (http server or None, SnapshotWriter or None)
+    """
+    server = None
+    writer = None
+
+    port = config.get("metrics_port")
+    if port:
+        try:
+            server = start_http_server(int(port), config.get("metrics_host", "127.0.0.1"))
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on port {port}: {e}")
+
+    snapshot_file = config.get("metrics_snapshot_file")
+    if snapshot_file:
+        writer = SnapshotWriter(snapshot_file, int(config.get("metrics_snapshot_interval", 60))).start()
+
+    return server, writer
@@ -0,0 +1,306 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Default histogram buckets in seconds, from fast local work to slow Textract jobs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Base class holding one value set per label combination."""
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *labelvalues, **labelkwargs):
+        """
+        Returns the child metric for the given label values.
+
+        Args:
+            *labelvalues: Label values in the order of labelnames.
+            **labelkwargs: Label values by name.
+        """
+        if labelkwargs:
+            labelvalues = tuple(str(labelkwargs[name]) for name in self.labelnames)
+        else:
+            labelvalues = tuple(str(value) for value in labelvalues)
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}")
+
+        with self._lock:
+            child = self._children.get(labelvalues)
+            if child is None:
+                child = self._children[labelvalues] = self._new_child()
+            return child
+
+    def _default_child(self):
+        if self.labelnames:
+            raise ValueError(f"Metric {self.name} has labels {self.labelnames}; use .labels() first")
+        return self._children[()]
+
+    def collect(self):
+        """Returns a list of (labelvalues, child) pairs."""
+        with self._lock:
+            return list(self._children.items())
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Counter(_Metric):
+    """A monotonically increasing value, such as the number of processed emails."""
+
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default_child().inc(amount)
+
+    @property
+    def value(self):
+        return self._default_child().value
+
+    def render(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self.collect()
+        ]
+
+    def snapshot(self):
+        return [{"labels": dict(zip(self.labelnames, values)), "value": child.value} for values, child in self.collect()]
+
+
+class _GaugeChild(_CounterChild):
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self._value = float(value)
+
+
+class Gauge(Counter):
+    """A value that can go up and down, such as the current queue depth."""
+
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def dec(self, amount=1):
+        self._default_child().dec(amount)
+
+    def set(self, value):
+        self._default_child().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        """Context manager observing the elapsed wall time in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def state(self):
+        with self._lock:
+            cumulative = []
+            running = 0
+            for count in self._counts:
+                running += count
+                cumulative.append(running)
+            return cumulative, self._sum, self._count
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, such as Textract job durations."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        buckets = tuple(sorted(float(bound) for bound in buckets))
+        if not buckets or buckets[-1] != math.inf:
+            buckets = buckets + (math.inf,)
+        self.buckets = buckets
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default_child().observe(value)
+
+    def time(self):
+        return self._default_child().time()
+
+    def render(self):
+        lines = []
+        for values, child in self.collect():
+            cumulative, total, count = child.state()
+            for bound, bucket_count in zip(self.buckets, cumulative):
+                labels = _format_labels(self.labelnames, values, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def snapshot(self):
+        result = []
+        for values, child in self.collect():
+            cumulative, total, count = child.state()
+            result.append({
+                "labels": dict(zip(self.labelnames, values)),
+                "buckets": {_format_value(bound): bucket_count for bound, bucket_count in zip(self.buckets, cumulative)},
+                "sum": total,
+                "count": count,
+            })
+        return result
+
+
+class MetricsRegistry:
+    """Holds all metrics of the application and renders them for export."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Registers a metric, or returns the existing one with the same name.
+
+        Args:
+            metric (_Metric): The metric to register.
+
+        Returns:
+            _Metric: The registered metric.
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} is already registered as {existing.metric_type}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render_prometheus(self):
+        """
+        Renders all metrics in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The metrics page.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        Returns a JSON-serializable snapshot of all metrics.
+
+        Returns:
+            dict: Metric name to type, help text and values.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {"type": metric.metric_type, "help": metric.documentation, "values": metric.snapshot()}
+            for metric in metrics
+        }
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, documentation, labelnames=()):
+    """Creates (or returns the existing) counter in the default registry."""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    """Creates (or returns the existing) gauge in the default registry."""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Creates (or returns the existing) histogram in the default registry."""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
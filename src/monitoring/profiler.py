@@ -0,0 +1,112 @@
+import glob
+import io
+import os
+import time
+from contextlib import contextmanager
+from config.loggin_config import logger
+
+
+class SamplingProfiler:
+    """
+    Profiles every k-th unit of work (a polling cycle or an attachment) with cProfile and,
+    optionally, tracemalloc.
+
+    For each sampled unit a `.pstats` file is written (open it with `python -m pstats` or
+    snakeviz) and, with allocation tracing enabled, a text report of the top allocations.
+    Only the newest `keep` files of each kind are kept, so the mode can stay enabled in
+    production.
+    """
+
+    def __init__(self, output_dir="profiles", every=1, keep=20, trace_memory=False, top=25):
+        """
+        Args:
+            output_dir (str): Folder where the profile files are written.
+            every (int): Profile one out of every `every` units of work.
+            keep (int): Number of files of each kind to keep before the oldest are deleted.
+            trace_memory (bool): Also record tracemalloc allocation snapshots.
+            top (int): Number of allocation sites listed in each report.
+        """
+        self.output_dir = output_dir
+        self.every = max(int(every), 1)
+        self.keep = max(int(keep), 1)
+        self.trace_memory = trace_memory
+        self.top = top
+        self._counts = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    @contextmanager
+    def profile(self, label):
+        """
+        Context manager profiling the enclosed block if it is a sampled one.
+
+        Args:
+            label (str): Kind of work being profiled, e.g. "cycle" or "attachment". Used in file names.
+        """
+        count = self._counts.get(label, 0) + 1
+        self._counts[label] = count
+        if (count - 1) % self.every:
+            yield
+            return
+
+        import cProfile
+        import tracemalloc
+
+        profiler = cProfile.Profile()
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            base_name = os.path.join(self.output_dir, f"{label}_{count:06d}_{time.strftime('%Y%m%d_%H%M%S')}")
+
+            try:
+                profiler.dump_stats(f"{base_name}.pstats")
+                if tracing:
+                    snapshot = tracemalloc.take_snapshot()
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    self._write_allocation_report(f"{base_name}_alloc.txt", snapshot, peak, elapsed)
+                logger.info(f"Profiled {label} #{count} in {elapsed:.2f}s: {base_name}.pstats")
+                self._rotate(label)
+            except OSError as e:
+                logger.warning(f"Could not write profile for {label} #{count}: {e}")
+
+    def _write_allocation_report(self, report_path, snapshot, peak, elapsed):
+        import tracemalloc
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        statistics = snapshot.statistics("lineno")
+        report = io.StringIO()
+        report.write(f"Elapsed: {elapsed:.3f}s\n")
+        report.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+        report.write(f"Live allocations at end: {sum(stat.size for stat in statistics) / 1024:.1f} KiB\n\n")
+        report.write(f"Top {self.top} allocation sites:\n")
+        for index, stat in enumerate(statistics[:self.top], 1):
+            frame = stat.traceback[0]
+            report.write(f"{index:3d}. {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+
+    def _rotate(self, label):
+        for pattern in (f"{label}_*.pstats", f"{label}_*_alloc.txt"):
+            files = sorted(glob.glob(os.path.join(self.output_dir, pattern)), key=os.path.getmtime)
+            for old_file in files[:-self.keep]:
+                try:
+                    os.remove(old_file)
+                except OSError:
+                    pass
+
+
+@contextmanager
+def null_profile(label):
+    """Stand-in for SamplingProfiler.profile when profiling is disabled."""
+    yield
@@ -0,0 +1,216 @@
+from functools import lru_cache
+from utils.pdf_utils import clean_and_normalize_text
+from utils.lazy_import import lazy_module
+from utils.aho_corasick import AhoCorasick
+from processing.attachments.data_handler import fuzzy_match
+from monitoring.metrics import counter, histogram
+
+# The AWS and fuzzy-matching stacks are only imported when the first document is classified
+analyze_expense = lazy_module("AWS_TEXTRACT.analyze_expense")
+
+OWNER_MATCH_SECONDS = histogram(
+    "owner_match_seconds",
+    "Time spent fuzzy-matching the document text against the owner list.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+OWNER_MATCHES = counter(
+    "owner_matches_total",
+    "Owner matching by method: exact (verbatim name), shortlist (fuzzy on the entries whose verw_nr "
+    "appears), fuzzy (all entries) or none.",
+    ("method",),
+)
+
+
+def prefix_for_doc_type(doc_type):
+    """
+    Returns the file name prefix for a document type.
+
+    Args:
+        doc_type (str): Document type as returned by extract_document_type_from_response.
+
+    Returns:
+        str: "RG_" for invoices, "LI_" for delivery notes, None otherwise.
+    """
+    if doc_type == "Rechnung":
+        return "RG_"
+    elif doc_type == "Lieferschein":
+        return "LI_"
+    return None
+
+
+def is_token(text, start, end):
+    """Returns True if text[start:end] is not part of a longer word or number."""
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+class OwnerMatcher:
+    """
+    Finds the owner of a document with an exact-match prefilter before the fuzzy matching.
+
+    An Aho-Corasick automaton over all normalized owner names and verw_nr values finds every
+    verbatim occurrence in one pass over the document text. Fuzzy matching (one partial_ratio
+    per entry) only runs when no owner name occurs verbatim.
+    """
+
+    def __init__(self, entries):
+        """
+        Args:
+            entries (tuple): (verw_nr, eigentümer) pairs in the order of the parameters.
+        """
+        self.owners = [clean_and_normalize_text(owner or "") for _, owner in entries]
+        patterns = []
+        for index, ((verw_nr, _), owner) in enumerate(zip(entries, self.owners)):
+            patterns.append((owner.casefold(), ("owner", index)))
+            patterns.append((str(verw_nr or "").strip().casefold(), ("verw_nr", index)))
+        self.automaton = AhoCorasick(patterns)
+
+    def exact_hits(self, normalized_text):
+        """
+        Returns the entries whose owner name or verw_nr occurs in the text as whole words.
+
+        Returns:
+            tuple: (set of entry indices with an owner hit, set of entry indices with a verw_nr hit)
+        """
+        text = normalized_text.casefold()
+        owner_hits, verw_nr_hits = set(), set()
+        for start, end, (kind, index) in self.automaton.find_all(text):
+            if is_token(text, start, end):
+                (owner_hits if kind == "owner" else verw_nr_hits).add(index)
+        return owner_hits, verw_nr_hits
+
+    def match(self, normalized_text, threshold=60):
+        """
+        Returns the index of the matched entry, or None.
+
+        A verbatim owner name wins; among several, the one whose verw_nr also occurs, then the
+        longest name (so "Anna Müller 12" beats "Anna Müller 1"), then the first entry.
+        Otherwise the entries whose verw_nr occurs are fuzzy-matched first, then all others,
+        in the order of the parameters.
+        """
+        owner_hits, verw_nr_hits = self.exact_hits(normalized_text)
+        if owner_hits:
+            OWNER_MATCHES.labels(method="exact").inc()
+            return min(owner_hits, key=lambda index: (index not in verw_nr_hits, -len(self.owners[index]), index))
+        for index in sorted(verw_nr_hits):
+            if fuzzy_match(normalized_text, self.owners[index], threshold):
+                OWNER_MATCHES.labels(method="shortlist").inc()
+                return index
+        for index, owner in enumerate(self.owners):
+            if index not in verw_nr_hits and fuzzy_match(normalized_text, owner, threshold):
+                OWNER_MATCHES.labels(method="fuzzy").inc()
+                return index
+        OWNER_MATCHES.labels(method="none").inc()
+        return None
+
+
+@lru_cache(maxsize=8)
+def owner_matcher(entries):
+    """Returns the OwnerMatcher for (verw_nr, eigentümer) pairs; built once per parameter set."""
+    return OwnerMatcher(entries)
+
+
+def match_owner(normalized_text, parameters, threshold=60):
+    """
+    Finds the parameter entry whose owner (eigentümer) appears in the document text.
+
+    Args:
+        normalized_text (str): Document text normalized with clean_and_normalize_text.
+        parameters (list): Parameters loaded from the database file.
+        threshold (int): Minimum fuzzy match score.
+
+    Returns:
+        dict: The matched entry, or None.
+    """
+    with OWNER_MATCH_SECONDS.time():
+        entries = tuple((entry.get("verw_nr"), entry.get("eigentümer", "")) for entry in parameters)
+        index = owner_matcher(entries).match(normalized_text, threshold)
+    return parameters[index] if index is not None else None
+
+
+def classify_response(response, parameters, threshold=60):
+    """
+    Extracts the invoice data from a Textract response and matches it to an owner.
+
+    Args:
+        response (dict): The Textract expense analysis response.
+        parameters (list): Parameters loaded from the database file.
+        threshold (int): Minimum fuzzy match score for the owner.
+
+    Returns:
+        dict: invoice_number, vendor_name, doc_type, prefix, matched_entry and normalized_text.
+    """
+    invoice_number, _ = analyze_expense.extract_invoice_number_from_response(response)
+    vendor_name, _ = analyze_expense.extract_vendor_name_from_response(response)
+    doc_type, _ = analyze_expense.extract_document_type_from_response(response)
+
+    normalized_text = clean_and_normalize_text(analyze_expense.extract_text_from_response(response))
+
+    return {
+        "invoice_number": invoice_number,
+        "vendor_name": vendor_name,
+        "doc_type": doc_type,
+        "prefix": prefix_for_doc_type(doc_type),
+        "matched_entry": match_owner(normalized_text, parameters, threshold),
+        "normalized_text": normalized_text,
+    }
+
+
+def build_file_name(classification, file_extension):
+    """
+    Builds the new file name "<verw_nr>_<RG|LI>_<vendor>_<invoice number><ext>".
+
+    Args:
+        classification (dict): Result of classify_response.
+        file_extension (str): Extension including the dot, e.g. ".pdf".
+
+    Returns:
+        str: The new file name.
+    """
+    matched_entry = classification["matched_entry"]
+    prefix = classification["prefix"]
+    invoice_number = classification["invoice_number"]
+    vendor_name = classification["vendor_name"]
+
+    verw_nr = matched_entry["verw_nr"] if matched_entry else None
+    sanitized_invoice_number = invoice_number.replace("/", "_") if invoice_number else None
+    sanitized_vendor_name = vendor_name.replace("/", "_") if vendor_name else None
+    new_name_parts = [
+        verw_nr,
+        prefix.rstrip("_") if prefix else None,
+        sanitized_vendor_name,
+        sanitized_invoice_number
+    ]
+    return "_".join(filter(None, new_name_parts)) + file_extension
+
+
+def merge_responses(responses):
+    """
+    Merges several Textract responses (e.g. of single pages) into one response.
+
+    Page numbers of the later responses are shifted so they stay unique.
+
+    Args:
+        responses (list): Responses in page order.
+
+    Returns:
+        dict: A response with the combined ExpenseDocuments and Blocks.
+    """
+    merged = {"JobStatus": "SUCCEEDED", "DocumentMetadata": {"Pages": 0}, "ExpenseDocuments": [], "Blocks": []}
+    for response in responses:
+        if not response:
+            continue
+        offset = merged["DocumentMetadata"]["Pages"]
+        pages = response.get("DocumentMetadata", {}).get("Pages", 1)
+        for document in response.get("ExpenseDocuments", []):
+            document = dict(document)
+            document["ExpenseIndex"] = len(merged["ExpenseDocuments"]) + 1
+            document["SummaryFields"] = [
+                dict(field, PageNumber=field.get("PageNumber", 1) + offset) for field in document.get("SummaryFields", [])
+            ]
+            merged["ExpenseDocuments"].append(document)
+        merged["Blocks"].extend(
+            dict(block, Page=block.get("Page", 1) + offset) for block in response.get("Blocks", [])
+        )
+        merged["DocumentMetadata"]["Pages"] = offset + pages
+    return merged
+
@@ -1,6 +1,16 @@
 import re
-from rapidfuzz import fuzz
-import re
+from functools import lru_cache
+from utils.lazy_import import lazy_module
+
+# rapidfuzz is imported on the first fuzzy match, not at startup
+fuzz = lazy_module("rapidfuzz.fuzz")
+
+
+@lru_cache(maxsize=1024)
+def compile_flexible_pattern(pattern):
+    """Compiles the pattern used by regex_match once per distinct pattern."""
+    flexible_pattern = re.escape(pattern).replace(r"\-", r"[-\s]?").replace(r"\s", r"\s*")
+    return re.compile(flexible_pattern, re.IGNORECASE)
 
 
 def regex_match(text, pattern):
@@ -14,8 +24,7 @@ def regex_match(text, pattern):
     Returns:
         bool: True if a match is found, False otherwise.
     """
-    flexible_pattern = re.escape(pattern).replace(r"\-", "[-\s]?").replace(r"\s", r"\s*")
-    return bool(re.search(flexible_pattern, text, re.IGNORECASE))
+    return compile_flexible_pattern(pattern).search(text) is not None
 
 
 def fuzzy_match(text, pattern, threshold=90):
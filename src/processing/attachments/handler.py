@@ -1,9 +1,21 @@
 from config.loggin_config import logger
 from .data_loader import load_parameters_from_db
 from .processor import AttachmentProcessor
-from .strategy import DefaultFileProcessor
+from .strategy import DefaultFileProcessor, create_file_processor
 
-def process_attachments(attachment_folder: str, destination_folder: str, db_file: str):
+def process_attachments(attachment_folder: str, destination_folder: str, db_file: str, file_processor=None,
+                        threshold: int = 60, max_workers: int = 4):
+    """
+    Processes the files in a folder once and logs the results.
+
+    Args:
+        attachment_folder (str): Folder with the files to process.
+        destination_folder (str): Folder where processed files are moved.
+        db_file (str): Path of the parameters database file.
+        file_processor (FileProcessorStrategy): Strategy used for the files (default DefaultFileProcessor).
+        threshold (int): Minimum fuzzy match score for the owner.
+        max_workers (int): Files processed concurrently.
+    """
     logger.info("Processing attachments...")
     parameters = load_parameters_from_db(db_file)
 
@@ -11,20 +23,26 @@ def process_attachments(attachment_folder: str, destination_folder: str, db_file
         logger.error("No parameters loaded. Please check the JSON file.")
         return
 
-    processor = AttachmentProcessor(DefaultFileProcessor())
-    results = processor.process_files_in_folder(attachment_folder, parameters, destination_folder)
+    processor = AttachmentProcessor(file_processor or DefaultFileProcessor())
+    results = processor.process_files_in_folder(attachment_folder, parameters, destination_folder, threshold,
+                                                max_workers=max_workers)
 
     for result in results:
-        if "file_name" not in result:
-            logger.warning(f"Skipping result: Missing 'file_name'. Result: {result}")
-            continue
+        for document in result.documents or [result]:
+            log_result(document)
+
+def log_result(result):
+    """Logs where a processed file was filed and which owner it was matched to."""
+    if not result.file_name:
+        logger.warning(f"Skipping result: Missing 'file_name'. Result: {result}")
+        return
 
-        logger.info(f"\nFile: {result['file_name']}")
-        if result.get("eigentümer"):
-            logger.info(f"Matched Eigentümer: {result['eigentümer']}")
-        if result.get("prefix"):
-            logger.info(f"Prefix Applied: {result['prefix']}")
-        if result.get("path"):
-            logger.info(f"Moved To: {result['path']}")
-        else:
-            logger.info("No match or relevant keyword found.")
\ No newline at end of file
+    logger.info(f"\nFile: {result.file_name}")
+    if result.owner:
+        logger.info(f"Matched Eigentümer: {result.owner}")
+    if result.prefix:
+        logger.info(f"Prefix Applied: {result.prefix}")
+    if result.path:
+        logger.info(f"Moved To: {result.path}")
+    else:
+        logger.info("No match or relevant keyword found.")
@@ -0,0 +1,232 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config.loggin_config import logger
+from processing.file_handler import file_sha256
+from monitoring.metrics import counter, histogram
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+IMAGES_OPTIMIZED = counter("images_optimized_total", "Image attachments passed through the optimizer by result.", ("result",))
+IMAGE_BYTES_SAVED = counter("image_optimizer_bytes_saved_total", "Bytes saved by optimizing images before the upload.")
+IMAGE_OPTIMIZE_SECONDS = histogram("image_optimize_seconds", "Time to optimize one image.")
+
+
+def optimize_image(source_path, destination_path, max_dimension=2000, target_dpi=300, grayscale=True, quality=85):
+    """
+    Writes a smaller copy of an image for text extraction.
+
+    The copy is rotated according to its EXIF orientation, converted to grayscale,
+    downscaled so that its longer side is at most max_dimension pixels and its resolution
+    at most target_dpi (when the image records one), and saved as JPEG.
+
+    Args:
+        source_path (str): The original image.
+        destination_path (str): Path of the optimized JPEG.
+        max_dimension (int): Maximum width or height in pixels (0 disables the cap).
+        target_dpi (int): Maximum resolution in DPI (0 disables the cap).
+        grayscale (bool): Convert the image to grayscale.
+        quality (int): JPEG quality (1-95).
+
+    Returns:
+        str: The destination path.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("L" if grayscale else "RGB")
+
+        scale = 1.0
+        if max_dimension and max(image.size) > max_dimension:
+            scale = max_dimension / max(image.size)
+        dpi = image.info.get("dpi")
+        if target_dpi and dpi and dpi[0] and dpi[0] * scale > target_dpi:
+            scale = target_dpi / dpi[0]
+
+        if scale < 1.0:
+            new_size = (max(int(image.width * scale), 1), max(int(image.height * scale), 1))
+            image = image.resize(new_size, Image.LANCZOS)
+
+        save_options = {"quality": quality, "optimize": True}
+        if dpi and dpi[0]:
+            save_options["dpi"] = (round(dpi[0] * scale), round(dpi[1] * scale))
+        image.save(destination_path, "JPEG", **save_options)
+
+    return destination_path
+
+
+class ImageOptimizer:
+    """
+    Optimizes image attachments in a worker pool ahead of their analysis.
+
+    prepare() queues the images of an email as soon as they are saved, and optimized_path()
+    returns the optimized copy when the document is analyzed, so the work overlaps with the
+    analysis of the previous attachments. The copies are written to a temporary folder; the
+    original file is left untouched and is the one that gets renamed and filed.
+
+    Queued optimizations are keyed by path and content hash: attachment names such as
+    image001.png recur in many emails, and a copy of another file saved under the same
+    name must never be uploaded. An attachment that is not analyzed (a duplicate, an
+    error) must be passed to discard() so its copy is deleted.
+    """
+
+    def __init__(self, max_dimension=2000, target_dpi=300, grayscale=True, quality=85, max_workers=2):
+        """
+        Args:
+            max_dimension (int): Maximum width or height in pixels.
+            target_dpi (int): Maximum resolution in DPI.
+            grayscale (bool): Convert images to grayscale.
+            quality (int): JPEG quality of the optimized copy.
+            max_workers (int): Size of the worker pool.
+        """
+        self.options = {
+            "max_dimension": max_dimension,
+            "target_dpi": target_dpi,
+            "grayscale": grayscale,
+            "quality": quality,
+        }
+        # Threads suffice: Pillow releases the GIL while decoding, resizing and encoding
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-optimizer")
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._work_folder = tempfile.mkdtemp(prefix="optimized_images_")
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Creates an optimizer from the image_* keys of config.json, or returns None if
+        image_optimization is not enabled.
+
+        Args:
+            config (dict): The configuration data.
+        """
+        if not config.get("image_optimization", False):
+            return None
+        return cls(
+            max_dimension=int(config.get("image_max_dimension", 2000)),
+            target_dpi=int(config.get("image_target_dpi", 300)),
+            grayscale=config.get("image_grayscale", True),
+            quality=int(config.get("image_jpeg_quality", 85)),
+            max_workers=int(config.get("image_workers", 2)),
+        )
+
+    def prepare(self, file_paths):
+        """
+        Queues the images among file_paths for optimization.
+
+        Args:
+            file_paths (list): Paths of the attachments that are about to be processed.
+        """
+        for file_path in file_paths:
+            if not file_path.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            try:
+                content_hash = file_sha256(file_path)
+            except OSError as e:
+                logger.warning(f"Not optimizing {file_path} ahead of its analysis: {e}")
+                continue
+            with self._lock:
+                queued = self._futures.get(file_path)
+                if queued and queued[0] == content_hash:
+                    continue
+                self._futures[file_path] = (content_hash, self._executor.submit(self._optimize, file_path))
+            if queued:
+                # Left behind by an earlier file with the same name
+                self._discard(queued[1])
+
+    def optimized_path(self, file_path):
+        """
+        Returns the path to upload for analysis: the optimized copy of an image, or the
+        original for other files and when the optimization failed or did not save space.
+
+        Args:
+            file_path (str): Path of the original attachment.
+        """
+        if not file_path.lower().endswith(IMAGE_EXTENSIONS):
+            return file_path
+        content_hash = file_sha256(file_path)
+        with self._lock:
+            queued = self._futures.pop(file_path, None)
+        if queued and queued[0] != content_hash:
+            self._discard(queued[1])
+            queued = None
+        if queued is None:
+            return self._optimize(file_path)
+        return queued[1].result()
+
+    def discard(self, file_path):
+        """
+        Drops the queued optimization of an attachment that is not analyzed and deletes its
+        copy. Does nothing if optimized_path() already took it.
+
+        Args:
+            file_path (str): Path of the original attachment, as passed to prepare().
+        """
+        with self._lock:
+            queued = self._futures.pop(file_path, None)
+        if queued:
+            self._discard(queued[1])
+
+    def release(self, file_path, analysis_path):
+        """
+        Deletes the optimized copy once the analysis is done.
+
+        Args:
+            file_path (str): Path of the original attachment.
+            analysis_path (str): Path returned by optimized_path().
+        """
+        if analysis_path != file_path and os.path.exists(analysis_path):
+            os.remove(analysis_path)
+
+    def _discard(self, future):
+        # A running optimization deletes its copy when it finishes
+        if not future.cancel():
+            future.add_done_callback(self._delete_copy)
+
+    def _delete_copy(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        path = future.result()
+        if os.path.dirname(path) == self._work_folder and os.path.exists(path):
+            os.remove(path)
+
+    def _optimize(self, file_path):
+        started = time.perf_counter()
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        destination_path = os.path.join(self._work_folder, f"{stem}_{uuid.uuid4().hex[:8]}.jpg")
+        try:
+            optimize_image(file_path, destination_path, **self.options)
+        except ImportError:
+            logger.warning("Pillow is not installed; images are uploaded unchanged.")
+            IMAGES_OPTIMIZED.labels(result="unavailable").inc()
+            return file_path
+        except Exception as e:
+            logger.warning(f"Could not optimize image {file_path}: {e}")
+            IMAGES_OPTIMIZED.labels(result="error").inc()
+            return file_path
+        finally:
+            IMAGE_OPTIMIZE_SECONDS.observe(time.perf_counter() - started)
+
+        original_size = os.path.getsize(file_path)
+        optimized_size = os.path.getsize(destination_path)
+        if optimized_size >= original_size:
+            os.remove(destination_path)
+            IMAGES_OPTIMIZED.labels(result="kept_original").inc()
+            return file_path
+
+        IMAGES_OPTIMIZED.labels(result="optimized").inc()
+        IMAGE_BYTES_SAVED.inc(original_size - optimized_size)
+        logger.info(f"Optimized {os.path.basename(file_path)}: {original_size} -> {optimized_size} bytes")
+        return destination_path
+
+    def close(self):
+        """Stops the worker pool and removes the temporary folder."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self._work_folder, ignore_errors=True)
@@ -1,54 +1,76 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from config.loggin_config import logger
 from typing import List, Dict
-from emails.Email_with_Attachment import EmailWithAttachments
+from emails.Email_with_Attachment import EmailWithAttachments, AttachmentRecord
 from .strategy import FileProcessorStrategy
+from processing.file_handler import is_incomplete_file
+from monitoring.profiler import null_profile
 
 class AttachmentProcessor:
-    def __init__(self, strategy: FileProcessorStrategy):
+    def __init__(self, strategy: FileProcessorStrategy, profiler=None, document_index=None):
         self.strategy = strategy
+        self.profiler = profiler  # Optional SamplingProfiler for per-attachment profiles
+        self.document_index = document_index  # Optional DocumentIndex for the full-text search
+
+    def index_document(self, info: AttachmentRecord, email_obj: EmailWithAttachments) -> None:
+        """Moves the document text out of the attachment record into the document index."""
+        text, info.document_text = info.document_text, None
+        if self.document_index is None or info.status in ("error", "duplicate"):
+            return
+        try:
+            self.document_index.add(info, email_obj, text)
+        except Exception as e:
+            logger.warning(f"Could not index {info.path}: {e}")
 
     def process_attachments_from_email(self, email_obj: EmailWithAttachments, parameters: dict, base_destination_folder: str) -> EmailWithAttachments:
         updated_attachments = []
+        profile = self.profiler.profile if self.profiler else null_profile
+        # Lets the strategy start background work (e.g. image optimization) for the whole email
+        self.strategy.prepare([
+            attachment.path for attachment in email_obj.attachments if os.path.exists(attachment.path)
+        ])
 
         for attachment in email_obj.attachments:
-            if not os.path.exists(attachment["path"]):
-                logger.error(f"Attachment not found: {attachment['path']}")
-                updated_attachments.append({
-                    "file_name": attachment["file_name"],
-                    "path": attachment["path"],
-                    "status": "error",
-                    "message": "File not found",
-                })
+            if not os.path.exists(attachment.path):
+                logger.error(f"Attachment not found: {attachment.path}")
+                updated_attachments.append(AttachmentRecord(
+                    file_name=attachment.file_name, path=attachment.path, status="error", message="File not found"
+                ))
                 continue
 
-            attachment_info = self.strategy.process(
-                file_path=attachment["path"],
-                parameters=parameters,
-                base_destination_folder=base_destination_folder,
-            )
-            vendor_name = attachment_info.get("vendor_name") 
-            attachment_info["vendor_name"] = vendor_name 
-
-            updated_attachments.append(attachment_info)
+            with profile("attachment"):
+                attachment_info = self.strategy.process(
+                    file_path=attachment.path,
+                    parameters=parameters,
+                    base_destination_folder=base_destination_folder,
+                )
+            # A split PDF yields one entry per logical document
+            for info in attachment_info.documents or [attachment_info]:
+                self.index_document(info, email_obj)
+                updated_attachments.append(info)
 
         email_obj.attachments = updated_attachments
         return email_obj
 
     def process_files_in_folder(
-            self, folder_path: str, parameters: dict, base_destination_folder: str, vendor_name: str
-        ) -> List[dict]:
+            self, folder_path: str, parameters: dict, base_destination_folder: str, threshold: int = 60,
+            max_workers: int = 1
+        ) -> List[AttachmentRecord]:
             """
             Processes all files in a folder using the defined strategy, without restricting by file type.
 
+            Subfolders and partially written files (see is_incomplete_file) are skipped.
+
             Args:
                 folder_path (str): Path to the folder containing files to process.
                 parameters (dict): Additional parameters for the processing strategy.
                 base_destination_folder (str): Base folder where processed files will be stored.
-                vendor_name (str): Vendor name to associate with processed files.
+                threshold (int): Minimum fuzzy match score for the owner.
+                max_workers (int): Files processed concurrently.
 
             Returns:
-                List[dict]: List of results from processing each file.
+                List[AttachmentRecord]: List of results from processing each file.
             """
             results = []
             try:
@@ -57,18 +79,22 @@ class AttachmentProcessor:
                     return results
 
                 os.makedirs(base_destination_folder, exist_ok=True)
-                files = [file_name for file_name in os.listdir(folder_path)]  # No extension filtering
+                with os.scandir(folder_path) as entries:  # No extension filtering
+                    files = sorted(entry.path for entry in entries
+                                   if entry.is_file() and not is_incomplete_file(entry.name))
 
                 if not files:
                     logger.info(f"No files found in the folder: {folder_path}")
                     return results
 
-                for file_name in files:
-                    file_path = os.path.join(folder_path, file_name)
-                    result = self.strategy.process(file_path, parameters, base_destination_folder, vendor_name)
-                    results.append(result)
+                self.strategy.prepare(files)
+                with ThreadPoolExecutor(max_workers=max(int(max_workers), 1)) as executor:
+                    results = list(executor.map(
+                        lambda file_path: self.strategy.process(file_path, parameters, base_destination_folder, threshold),
+                        files,
+                    ))
 
             except Exception as e:
                 logger.error(f"An error occurred while processing the folder: {e}")
 
-            return results
\ No newline at end of file
+            return results
@@ -0,0 +1,167 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config.loggin_config import logger
+from utils.lazy_import import lazy_module
+from monitoring.metrics import counter, histogram
+
+analyze_expense = lazy_module("AWS_TEXTRACT.analyze_expense")
+
+SPLIT_DOCUMENTS = counter("split_logical_documents_total", "Logical documents found in split multi-page PDFs.")
+SPLIT_ANALYSIS_SECONDS = histogram("split_analysis_seconds", "Wall time of the parallel per-page analysis of one PDF.")
+
+
+def count_pdf_pages(file_path):
+    """
+    Returns the number of pages of a PDF file.
+
+    Args:
+        file_path (str): Path of the PDF.
+
+    Returns:
+        int: Number of pages (0 if the file cannot be read).
+    """
+    from pypdf import PdfReader
+
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception as e:
+        logger.warning(f"Could not read PDF {file_path}: {e}")
+        return 0
+
+
+def write_pdf_pages(file_path, page_numbers, output_path):
+    """
+    Writes the given pages of a PDF into a new PDF file.
+
+    Args:
+        file_path (str): Source PDF.
+        page_numbers (list): 1-based page numbers to copy, in order.
+        output_path (str): Path of the new PDF.
+
+    Returns:
+        str: The output path.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number - 1])
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return output_path
+
+
+def _page_identity(response):
+    """Returns the (invoice number, vendor name) found on one analyzed page."""
+    if not response:
+        return None, None
+    invoice_number, _ = analyze_expense.extract_invoice_number_from_response(response)
+    vendor_name, _ = analyze_expense.extract_vendor_name_from_response(response)
+    return invoice_number, vendor_name
+
+
+def detect_document_boundaries(page_responses):
+    """
+    Groups consecutive pages into logical documents.
+
+    A page starts a new document when it carries an invoice number different from the
+    current document's, or a vendor name different from the current document's. Pages
+    without either (continuation pages, terms and conditions) stay with the current document.
+
+    Args:
+        page_responses (list): One Textract response per page, in page order.
+
+    Returns:
+        list: Lists of 1-based page numbers, one list per logical document.
+    """
+    groups = []
+    current_invoice = current_vendor = None
+
+    for page_number, response in enumerate(page_responses, 1):
+        invoice_number, vendor_name = _page_identity(response)
+        normalized_vendor = vendor_name.strip().lower() if vendor_name else None
+
+        starts_new = not groups or (
+            (invoice_number and current_invoice and invoice_number != current_invoice)
+            or (normalized_vendor and current_vendor and normalized_vendor != current_vendor)
+        )
+        if starts_new:
+            groups.append([page_number])
+            current_invoice, current_vendor = invoice_number, normalized_vendor
+        else:
+            groups[-1].append(page_number)
+            current_invoice = current_invoice or invoice_number
+            current_vendor = current_vendor or normalized_vendor
+
+    return groups
+
+
+def page_content_hash(content_hash, page_number):
+    """Returns the archive key of one page of a split PDF: "<SHA-256 of the PDF>:p<page>"."""
+    return f"{content_hash}:p{page_number}" if content_hash else None
+
+
+def analyze_pages_in_parallel(file_path, work_folder, max_workers=4, archive=None, content_hash=None):
+    """
+    Splits a PDF into single pages and analyzes them with concurrent Textract jobs.
+
+    Args:
+        file_path (str): Path of the PDF.
+        work_folder (str): Folder for the temporary single-page files.
+        max_workers (int): Maximum number of concurrent Textract jobs.
+        archive (ResponseArchive): Optional archive the page responses are added to.
+        content_hash (str): SHA-256 of the PDF; the page responses are archived under
+            page_content_hash(content_hash, page).
+
+    Returns:
+        list: One response per page (None for pages whose analysis failed).
+    """
+    page_count = count_pdf_pages(file_path)
+    os.makedirs(work_folder, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    token = uuid.uuid4().hex[:8]
+
+    page_files = [
+        write_pdf_pages(file_path, [page_number], os.path.join(work_folder, f"{stem}_{token}_p{page_number}.pdf"))
+        for page_number in range(1, page_count + 1)
+    ]
+
+    try:
+        with SPLIT_ANALYSIS_SECONDS.time():
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="textract-page") as pool:
+                return list(pool.map(
+                    lambda page: analyze_expense.analyze_document_pages(
+                        page[1], archive=archive, content_hash=page_content_hash(content_hash, page[0])
+                    ),
+                    enumerate(page_files, 1),
+                ))
+    finally:
+        for page_file in page_files:
+            try:
+                os.remove(page_file)
+            except OSError:
+                pass
+
+
+def split_pdf(file_path, page_groups, work_folder):
+    """
+    Writes one PDF per logical document.
+
+    Args:
+        file_path (str): Source PDF.
+        page_groups (list): Page number lists as returned by detect_document_boundaries.
+        work_folder (str): Folder for the new files.
+
+    Returns:
+        list: Paths of the new PDFs, in the order of page_groups.
+    """
+    os.makedirs(work_folder, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    paths = []
+    for index, pages in enumerate(page_groups, 1):
+        output_path = os.path.join(work_folder, f"{stem}_part{index}_p{pages[0]}-{pages[-1]}.pdf")
+        paths.append(write_pdf_pages(file_path, pages, output_path))
+    SPLIT_DOCUMENTS.inc(len(page_groups))
+    return paths
@@ -1,95 +1,557 @@
 import os
 from config.loggin_config import logger
-from utils.pdf_utils import clean_and_normalize_text
-from processing.attachments.data_handler import fuzzy_match
-from processing.file_handler import rename_attachment, move_attachment
-from AWS_TEXTRACT.analyze_expense import analyze_document_pages, extract_text_from_response, extract_document_type_from_response, extract_invoice_number_from_response, extract_vendor_name_from_response
+from processing.attachments.classification import classify_response, build_file_name, merge_responses
+from processing.attachments.text_layer import (
+    read_text_layer, read_text_layer_pages, classification_score, record_document_source, build_text_layer_response, page_texts_from_blocks,
+    mentions_invoice, text_characters
+)
+from processing.attachments.image_optimizer import ImageOptimizer
+from processing.file_handler import rename_attachment, move_attachment, file_sha256
+from DB.duplicate_index import DuplicateIndex, DUPLICATES_FOUND, invoice_key
+from DB.response_archive import ResponseArchive
+from AWS_TEXTRACT.rate_limiter import is_transient_error
+from emails.Email_with_Attachment import AttachmentRecord
 from utils.resource_path import resource_path
-import json
+from utils.lazy_import import lazy_module
+from monitoring.metrics import counter, histogram
+import time
+from contextlib import contextmanager
+
+# The AWS and fuzzy-matching stacks are only imported when the first document is analyzed
+analyze_expense = lazy_module("AWS_TEXTRACT.analyze_expense")
+
+DOCUMENT_PROCESSING_SECONDS = histogram("document_processing_seconds", "Total time to analyze, rename and file one attachment.")
+DOCUMENTS_PROCESSED = counter("documents_processed_total", "Processed attachments by resulting status.", ("status",))
+ANALYSIS_TIER_CALLS = counter(
+    "analysis_tier_calls_total",
+    "Documents handled per analysis tier; outcome is accepted or escalated to the next tier.",
+    ("tier", "outcome"),
+)
+ANALYSIS_TIER_SECONDS = histogram("analysis_tier_seconds", "Time spent in each analysis tier per document.", ("tier",))
+
+class TextractAnalysisError(Exception):
+    """Textract returned no response for a document (failed upload or job, timeout)."""
+
 
 class FileProcessorStrategy:
-    def process(self, file_path: str, parameters: dict, base_destination_folder: str, threshold: int = 60) -> dict:
+    def prepare(self, file_paths: list) -> None:
+        """Called with the attachments of an email before they are processed one by one."""
+
+    def process(self, file_path: str, parameters: dict, base_destination_folder: str, threshold: int = 60) -> AttachmentRecord:
         raise NotImplementedError
 
 class DefaultFileProcessor(FileProcessorStrategy):
-    def process(self, file_path: str, parameters: dict, base_destination_folder: str,  threshold: int = 60) -> dict:
-        file_name = None
+    def __init__(self, text_layer: bool = True, text_layer_min_score: float = 0.75, text_layer_min_chars: int = 100,
+                 image_optimizer=None, duplicate_index=None, duplicate_folder=None, response_archive=None):
+        """
+        Args:
+            text_layer (bool): Try the embedded PDF text layer before calling Textract.
+            text_layer_min_score (float): Minimum classification_score() to accept the text layer result.
+            text_layer_min_chars (int): Minimum characters per page for a PDF not to count as a scan.
+            image_optimizer (ImageOptimizer): Optional optimizer for images before their upload.
+            duplicate_index (DuplicateIndex): Optional index to recognize documents that were filed before.
+            duplicate_folder (str): Folder for duplicates (default "duplicates" in the destination folder).
+            response_archive (ResponseArchive): Optional archive for the raw Textract responses.
+        """
+        self.text_layer = text_layer
+        self.text_layer_min_score = text_layer_min_score
+        self.text_layer_min_chars = text_layer_min_chars
+        self.image_optimizer = image_optimizer
+        self.duplicate_index = duplicate_index
+        self.duplicate_folder = duplicate_folder
+        self.response_archive = response_archive
+
+    def prepare(self, file_paths: list) -> None:
+        if self.image_optimizer:
+            self.image_optimizer.prepare(file_paths)
+
+    @contextmanager
+    def analysis_copy(self, file_path):
+        """
+        Yields the path to upload for analysis: the optimized copy of an image when an image
+        optimizer is configured, otherwise the file itself. The copy is deleted afterwards.
+        """
+        if not self.image_optimizer:
+            yield file_path
+            return
+        analysis_path = self.image_optimizer.optimized_path(file_path)
+        try:
+            yield analysis_path
+        finally:
+            self.image_optimizer.release(file_path, analysis_path)
+
+    def process(self, file_path: str, parameters: dict, base_destination_folder: str,  threshold: int = 60) -> AttachmentRecord:
+        started = time.perf_counter()
         try:
             logger.info(f"Processing file: {file_path}")
-            output_json_path = resource_path("output_response.json")
-
-            if not os.path.exists(output_json_path):
-                logger.warning(f"Output JSON file does not exist. Creating a new one: {output_json_path}")
-                with open(output_json_path, "w", encoding="utf-8") as file:
-                    json.dump({}, file)           
-
-            analyze_document_pages(file_path, output_json_path)
-            
-            with open(output_json_path, "r", encoding="utf-8") as file:
-                response = json.load(file)
-
-          # Extract data from AWS
-            invoice_number, inv_confidence = extract_invoice_number_from_response(response)
-            vendor_name, ven_confidence = extract_vendor_name_from_response(response)
-            doc_type, doc_confidence = extract_document_type_from_response(response)
-
-            # Extract text from 
-            text_from_JSON = extract_text_from_response(response)
-
-            normalized_text = clean_and_normalize_text(text_from_JSON)
-            
-            print(f"Document type: {doc_type}")
-            if doc_type == "Rechnung":
-                prefix = "RG_"
-            elif doc_type == "Lieferchein":
-                prefix = "LI_"
-            else:
-                prefix = None
-            
-            file_name = os.path.basename(file_path)
-            file_extension = os.path.splitext(file_name)[1] 
-
-            matched_entry = None
-            for entry in parameters:
-                eigentümer = clean_and_normalize_text(entry.get("eigentümer", ""))
-                if fuzzy_match(normalized_text, eigentümer, threshold):
-                    matched_entry = entry
-                    break
-
-            verw_nr = matched_entry["verw_nr"] if matched_entry else None
-            sanitized_invoice_number = invoice_number.replace("/", "_") if invoice_number else None
-            sanitized_vendor_name = vendor_name.replace("/", "_") if vendor_name else None
-            new_name_parts = [
-                verw_nr, 
-                prefix.rstrip("_") if prefix else None,
-                sanitized_vendor_name,
-                sanitized_invoice_number
-            ]
-
-            new_name = "_".join(filter(None, new_name_parts)) + file_extension
-            renamed_path = rename_attachment(file_path, new_name)
+            content_hash = file_sha256(file_path) if self.duplicate_index or self.response_archive else None
+            duplicate = self.duplicate_index.find(content_hash=content_hash) if self.duplicate_index else None
+            if duplicate:
+                # An identical file was filed before; skip the analysis altogether
+                return self.file_duplicate(file_path, None, base_destination_folder, duplicate, started)
+            classification, source = self.analyze(file_path, parameters, threshold, content_hash)
+            return self.file_classified(file_path, classification, base_destination_folder, started, source, content_hash)
+        except Exception as e:
+            return self.error_result(file_path, e, started)
+        finally:
+            if self.image_optimizer:
+                # Drops the copy queued by prepare() if the file was not analyzed
+                self.image_optimizer.discard(file_path)
+
+    def analyze(self, file_path, parameters, threshold=60, content_hash=None):
+        """
+        Extracts and classifies the document data, using the cheapest source that is conclusive.
+
+        Args:
+            file_path (str): Path of the document.
+            parameters (list): Parameters loaded from the database file.
+            threshold (int): Minimum fuzzy match score for the owner.
+            content_hash (str): SHA-256 of the document, the key of its archived Textract responses.
+
+        Returns:
+            tuple: (classification as returned by classify_response, source name)
+        """
+        classification = self.classify_from_text_layer(file_path, parameters, threshold)
+        if classification is not None:
+            return classification, "text_layer"
+        with self.analysis_copy(file_path) as analysis_path:
+            return self.classify_with_expense_analysis(analysis_path, parameters, threshold, content_hash), "textract"
+
+    def classify_with_expense_analysis(self, analysis_path, parameters, threshold=60, content_hash=None):
+        """
+        Classifies a document from a full Textract AnalyzeExpense job.
+
+        The raw response is added to the response archive; without an archive it is written
+        to output_response.json, which only ever holds the latest response.
+
+        Args:
+            analysis_path (str): Path of the file to upload, see analysis_copy().
+            parameters (list): Parameters loaded from the database file.
+            threshold (int): Minimum fuzzy match score for the owner.
+            content_hash (str): SHA-256 of the original document, the archive key.
+
+        Raises:
+            TextractAnalysisError: If the analysis returned no response. process() turns this
+                into an error result and leaves the file where it is.
+        """
+        output_json_path = None if self.response_archive else resource_path("output_response.json")
+        with ANALYSIS_TIER_SECONDS.labels(tier="analyze_expense").time():
+            response = analyze_expense.analyze_document_pages(
+                analysis_path, output_json_path, archive=self.response_archive, content_hash=content_hash
+            )
+        if response is None:
+            # Not an empty document: the file must stay in place to be processed again
+            raise TextractAnalysisError(f"Textract expense analysis failed for {analysis_path}")
+        ANALYSIS_TIER_CALLS.labels(tier="analyze_expense", outcome="accepted").inc()
+        return classify_response(response, parameters, threshold)
+
+    def classify_from_text_layer(self, file_path, parameters, threshold=60):
+        """
+        Classifies a born-digital PDF from its embedded text layer.
 
+        Args:
+            file_path (str): Path of the document.
+            parameters (list): Parameters loaded from the database file.
+            threshold (int): Minimum fuzzy match score for the owner.
+
+        Returns:
+            dict: The classification, or None if Textract is needed (scan, image, or a score
+            below text_layer_min_score).
+        """
+        if not self.text_layer:
+            return None
+        with ANALYSIS_TIER_SECONDS.labels(tier="text_layer").time():
+            response = read_text_layer(file_path, self.text_layer_min_chars)
+            classification = classify_response(response, parameters, threshold) if response is not None else None
+
+        if classification is None:
+            ANALYSIS_TIER_CALLS.labels(tier="text_layer", outcome="escalated").inc()
+            return None
+        score = classification_score(classification)
+        if not self.is_conclusive(classification):
+            logger.info(f"Text layer of {file_path} is not conclusive (score {score:.2f}); using Textract.")
+            ANALYSIS_TIER_CALLS.labels(tier="text_layer", outcome="escalated").inc()
+            return None
+        logger.info(f"Analyzed {file_path} from its text layer (score {score:.2f}).")
+        ANALYSIS_TIER_CALLS.labels(tier="text_layer", outcome="accepted").inc()
+        return classification
+
+    def is_conclusive(self, classification):
+        """Tells whether a classification from the text layer can be used without Textract."""
+        return bool(classification["invoice_number"]) and classification_score(classification) >= self.text_layer_min_score
+
+    def file_document(self, file_path, response, parameters, base_destination_folder, threshold=60, started=None):
+        """
+        Renames and files a document based on its Textract response.
+
+        Args:
+            file_path (str): Path of the document.
+            response (dict): Textract expense analysis response of the document.
+            parameters (list): Parameters loaded from the database file.
+            base_destination_folder (str): Folder the renamed document is moved to.
+            threshold (int): Minimum fuzzy match score for the owner.
+            started (float): perf_counter() value when processing started, for the metrics.
+
+        Returns:
+            AttachmentRecord: The attachment information stored with the email.
+        """
+        classification = classify_response(response, parameters, threshold)
+        return self.file_classified(file_path, classification, base_destination_folder, started, "textract")
+
+    def file_classified(self, file_path, classification, base_destination_folder, started=None, source="textract",
+                        content_hash=None):
+        """
+        Renames and files a classified document, or routes it to the duplicate folder if its
+        content or its vendor and invoice number were filed before.
+
+        Args:
+            file_path (str): Path of the document.
+            classification (dict): Result of classify_response.
+            base_destination_folder (str): Folder the renamed document is moved to.
+            started (float): perf_counter() value when processing started, for the metrics.
+            source (str): Where the data came from ("text_layer" or "textract").
+            content_hash (str): SHA-256 of the file, if already computed.
+
+        Returns:
+            AttachmentRecord: The attachment information stored with the email.
+        """
+        started = started if started is not None else time.perf_counter()
+        matched_entry = classification["matched_entry"]
+
+        logger.info(f"Document type: {classification['doc_type']}")
+
+        key = None
+        if self.duplicate_index:
+            content_hash = content_hash or file_sha256(file_path)
+            key = invoice_key(classification)
+            duplicate = self.duplicate_index.claim(content_hash, key, file_path)
+            if duplicate:
+                record_document_source(source)
+                return self.file_duplicate(file_path, classification, base_destination_folder, duplicate, started)
+
+        file_name = os.path.basename(file_path)
+        file_extension = os.path.splitext(file_name)[1]
+        try:
+            new_name = build_file_name(classification, file_extension)
+            renamed_path = rename_attachment(file_path, new_name)
             os.makedirs(base_destination_folder, exist_ok=True)
             moved_path = move_attachment(renamed_path, base_destination_folder)
+        except Exception:
+            if self.duplicate_index:
+                self.duplicate_index.release(content_hash, key)
+            raise
+        if self.duplicate_index:
+            self.duplicate_index.update_path(content_hash, key, moved_path)
+
+        status = "processed" if matched_entry or classification["prefix"] else "manual_review"
+        DOCUMENTS_PROCESSED.labels(status=status).inc()
+        DOCUMENT_PROCESSING_SECONDS.observe(time.perf_counter() - started)
+        record_document_source(source)
+
+        return AttachmentRecord(
+            file_name=file_name,
+            path=moved_path,
+            status=status,
+            invoice_number=classification["invoice_number"],
+            vendor_name=classification["vendor_name"],
+            doc_type=classification["doc_type"],
+            prefix=classification["prefix"] or None,
+            source=source,
+            verw_nr=matched_entry["verw_nr"] if matched_entry else None,
+            owner=matched_entry["eigentümer"] if matched_entry else "Unknown",
+            # Consumed by AttachmentProcessor for the document index, not stored with the email
+            document_text=classification.get("normalized_text"),
+        )
+
+    def file_duplicate(self, file_path, classification, base_destination_folder, duplicate, started):
+        """
+        Moves a duplicate to the duplicate folder instead of filing it next to the original.
+
+        Args:
+            file_path (str): Path of the document.
+            classification (dict): Result of classify_response, or None if the content matched before the analysis.
+            base_destination_folder (str): Folder the originals are filed in.
+            duplicate (tuple): (reason, path of the original) as returned by DuplicateIndex.
+            started (float): perf_counter() value when processing started, for the metrics.
+
+        Returns:
+            AttachmentRecord: The attachment information stored with the email.
+        """
+        reason, original_path = duplicate
+        file_name = os.path.basename(file_path)
+        if classification:
+            new_name = build_file_name(classification, os.path.splitext(file_name)[1])
+        else:
+            # A split PDF is registered with the paths of all its parts; name the copy after the first
+            new_name = os.path.basename(original_path.split(os.pathsep)[0]) if original_path else file_name
+        duplicate_folder = self.duplicate_folder or os.path.join(base_destination_folder, "duplicates")
+        moved_path = move_attachment(file_path, duplicate_folder, new_name)
+        logger.info(f"{file_name} is a duplicate of {original_path} ({reason}); moved to {moved_path}")
 
-            return {
-                "file_name": file_name,
-                "path": moved_path,
-                "invoice_number": invoice_number,
-                "vendor_name": vendor_name,
-                "doc_type": doc_type,
-                "status": "processed" if matched_entry or prefix else "manual_review",
-                "verw_nr": matched_entry["verw_nr"] if matched_entry else None,
-                "eigentümer": matched_entry["eigentümer"] if matched_entry else "Unknown",
-            }
+        DUPLICATES_FOUND.labels(reason=reason).inc()
+        DOCUMENTS_PROCESSED.labels(status="duplicate").inc()
+        DOCUMENT_PROCESSING_SECONDS.observe(time.perf_counter() - started)
+        classification = classification or {"invoice_number": None, "vendor_name": None, "doc_type": "UNKNOWN"}
+        matched_entry = classification.get("matched_entry")
+        return AttachmentRecord(
+            file_name=file_name,
+            path=moved_path,
+            status="duplicate",
+            invoice_number=classification["invoice_number"],
+            vendor_name=classification["vendor_name"],
+            doc_type=classification["doc_type"],
+            verw_nr=matched_entry["verw_nr"] if matched_entry else None,
+            owner=matched_entry["eigentümer"] if matched_entry else "Unknown",
+            duplicate_of=original_path,
+            duplicate_reason=reason,
+        )
 
+    def error_result(self, file_path, error, started):
+        logger.error(f"Error processing file {file_path}: {error}")
+        DOCUMENTS_PROCESSED.labels(status="error").inc()
+        DOCUMENT_PROCESSING_SECONDS.observe(time.perf_counter() - started)
+        return AttachmentRecord(file_name=os.path.basename(file_path), path=file_path, status="error",
+                                retryable=is_transient_error(error))
+
+
+class TieredFileProcessor(DefaultFileProcessor):
+    """
+    Runs the cheap Textract text detection first and the expense analysis only for invoices.
+
+    Only documents that are known not to be invoices are filed from the detected text, without
+    an AnalyzeExpense job: delivery notes (classified with the same rules as
+    extract_document_type_from_response) and images with almost no text, such as logos and
+    signatures. Everything else is escalated to AnalyzeExpense, including documents whose type
+    is unknown, documents whose text mentions an invoice, receipt or credit note anywhere, and
+    documents whose text detection failed.
+    """
+
+    # Images with fewer characters than this (logos, signatures) cannot hold an invoice
+    NON_INVOICE_MAX_CHARS = 40
+
+    def is_known_non_invoice(self, response, doc_type):
+        """
+        Tells whether a document may be filed from its detected text without AnalyzeExpense.
+
+        Args:
+            response (dict): Pseudo response built from the detected text, or None.
+            doc_type (str): Document type from extract_document_type_from_response, or None.
+        """
+        if response is None or mentions_invoice(response):
+            return False
+        if doc_type == "Lieferschein":
+            return True
+        return doc_type is None and text_characters(response) < self.NON_INVOICE_MAX_CHARS
+
+    def analyze(self, file_path, parameters, threshold=60, content_hash=None):
+        classification = self.classify_from_text_layer(file_path, parameters, threshold)
+        if classification is not None:
+            return classification, "text_layer"
+
+        with self.analysis_copy(file_path) as analysis_path:
+            with ANALYSIS_TIER_SECONDS.labels(tier="detect_text").time():
+                detected = analyze_expense.detect_document_text(
+                    analysis_path, archive=self.response_archive, content_hash=content_hash
+                )
+                response = build_text_layer_response(page_texts_from_blocks(detected)) if detected else None
+                doc_type = analyze_expense.extract_document_type_from_response(response)[0] if response else None
+
+            if not self.is_known_non_invoice(response, doc_type):
+                logger.info(f"Escalating {file_path} to expense analysis (document type: {doc_type}).")
+                ANALYSIS_TIER_CALLS.labels(tier="detect_text", outcome="escalated").inc()
+                return self.classify_with_expense_analysis(
+                    analysis_path, parameters, threshold, content_hash
+                ), "textract"
+
+        logger.info(f"Classified {file_path} from text detection (document type: {doc_type}).")
+        ANALYSIS_TIER_CALLS.labels(tier="detect_text", outcome="accepted").inc()
+        return classify_response(response, parameters, threshold), "detect_text"
+
+
+class SplittingFileProcessor(DefaultFileProcessor):
+    """
+    Processes multi-page PDFs page by page so that scans containing several invoices are
+    split into one file per invoice.
+
+    Born-digital PDFs are read from their text layer page by page, like the single documents
+    of DefaultFileProcessor; only when that is not conclusive for every document in the PDF
+    are the pages analyzed as concurrent Textract jobs, which also lowers the latency of long
+    documents. Consecutive pages are grouped into logical documents by their invoice number
+    and vendor (see splitter.detect_document_boundaries). A PDF with a single logical document
+    is filed unchanged; otherwise every part is written to its own PDF and filed separately.
+    """
+
+    def __init__(self, max_workers: int = 4, **kwargs):
+        super().__init__(**kwargs)
+        self.max_workers = max_workers
+
+    def process(self, file_path: str, parameters: dict, base_destination_folder: str, threshold: int = 60) -> AttachmentRecord:
+        from processing.attachments import splitter
+
+        if not file_path.lower().endswith(".pdf") or splitter.count_pdf_pages(file_path) < 2:
+            return super().process(file_path, parameters, base_destination_folder, threshold)
+
+        started = time.perf_counter()
+        try:
+            content_hash = file_sha256(file_path) if self.duplicate_index or self.response_archive else None
+            duplicate = self.duplicate_index.find(content_hash=content_hash) if self.duplicate_index else None
+            if duplicate:
+                return self.file_duplicate(file_path, None, base_destination_folder, duplicate, started)
+            logger.info(f"Processing file page by page: {file_path}")
+            analyzed = self.classify_pages_from_text_layer(file_path, parameters, threshold)
+            if analyzed is not None:
+                page_groups, classifications = analyzed
+                source = "text_layer"
+            else:
+                page_groups, classifications = self.classify_pages_with_textract(
+                    file_path, parameters, threshold, content_hash
+                )
+                source = "textract"
+
+            if len(page_groups) == 1:
+                return self.file_classified(file_path, classifications[0], base_destination_folder, started, source,
+                                            content_hash)
+
+            logger.info(f"Found {len(page_groups)} documents in {file_path}: {page_groups}")
+            part_paths = splitter.split_pdf(file_path, page_groups, os.path.dirname(file_path))
         except Exception as e:
-            logger.error(f"Error processing file {file_path}: {e}")
-            return {
-                "file_name": file_name,
-                "path": file_path,
-                "invoice_number": None,
-                "vendor_name": None,
-                "doc_type": "UNKNOWN",
-                "status": "error",
-            }
+            return self.error_result(file_path, e, started)
+
+        documents = []
+        for part_path, pages, classification in zip(part_paths, page_groups, classifications):
+            part_started = time.perf_counter()
+            try:
+                result = self.file_classified(part_path, classification, base_destination_folder, part_started, source)
+            except Exception as e:
+                result = self.error_result(part_path, e, part_started)
+            result.source_file = os.path.basename(file_path)
+            result.pages = tuple(pages)
+            documents.append(result)
+
+        if all(document.status != "error" for document in documents):
+            os.remove(file_path)
+            if self.duplicate_index:
+                # A resent copy of the PDF is then recognized before its pages are analyzed again
+                self.claim_split_original(content_hash, [document.path for document in documents])
+        else:
+            logger.warning(f"Keeping {file_path} because not all of its parts could be filed.")
+
+        return AttachmentRecord(file_name=os.path.basename(file_path), path=file_path, status="split", documents=documents)
+
+    def classify_pages_from_text_layer(self, file_path, parameters, threshold=60):
+        """
+        Finds the documents in a born-digital PDF and classifies them from its text layer.
+
+        Args:
+            file_path (str): Path of the PDF.
+            parameters (list): Parameters loaded from the database file.
+            threshold (int): Minimum fuzzy match score for the owner.
+
+        Returns:
+            tuple: (page groups as returned by detect_document_boundaries, classification of
+            every group), or None if Textract is needed (a scan, or a document whose text layer
+            result is not conclusive, see is_conclusive).
+        """
+        from processing.attachments import splitter
+
+        if not self.text_layer:
+            return None
+        with ANALYSIS_TIER_SECONDS.labels(tier="text_layer").time():
+            page_responses = read_text_layer_pages(file_path, self.text_layer_min_chars)
+            if page_responses is not None:
+                page_groups = splitter.detect_document_boundaries(page_responses)
+                classifications = [
+                    classify_response(merge_responses(page_responses[page - 1] for page in pages), parameters, threshold)
+                    for pages in page_groups
+                ]
+        if page_responses is None:
+            ANALYSIS_TIER_CALLS.labels(tier="text_layer", outcome="escalated").inc()
+            return None
+        for pages, classification in zip(page_groups, classifications):
+            if not self.is_conclusive(classification):
+                logger.info(f"Text layer of pages {pages[0]}-{pages[-1]} of {file_path} is not conclusive "
+                            f"(score {classification_score(classification):.2f}); using Textract.")
+                ANALYSIS_TIER_CALLS.labels(tier="text_layer", outcome="escalated").inc()
+                return None
+        logger.info(f"Analyzed {file_path} from its text layer ({len(page_groups)} documents).")
+        ANALYSIS_TIER_CALLS.labels(tier="text_layer", outcome="accepted").inc()
+        return page_groups, classifications
+
+    def classify_pages_with_textract(self, file_path, parameters, threshold=60, content_hash=None):
+        """
+        Analyzes every page of a PDF as a concurrent Textract job, then finds and classifies
+        the documents in it.
+
+        Returns:
+            tuple: (page groups as returned by detect_document_boundaries, classification of every group)
+
+        Raises:
+            TextractAnalysisError: If the analysis of a page returned no response.
+        """
+        from processing.attachments import splitter
+
+        page_responses = splitter.analyze_pages_in_parallel(
+            file_path, os.path.dirname(file_path), self.max_workers, archive=self.response_archive,
+            content_hash=content_hash
+        )
+        failed_pages = [page for page, response in enumerate(page_responses, 1) if response is None]
+        if failed_pages:
+            # Without every page the document boundaries cannot be trusted
+            raise TextractAnalysisError(f"Textract analysis failed for pages {failed_pages} of {file_path}")
+        page_groups = splitter.detect_document_boundaries(page_responses)
+        classifications = [
+            classify_response(merge_responses(page_responses[page - 1] for page in pages), parameters, threshold)
+            for pages in page_groups
+        ]
+        ANALYSIS_TIER_CALLS.labels(tier="analyze_expense", outcome="accepted").inc(len(page_responses))
+        return page_groups, classifications
+
+    def claim_split_original(self, content_hash, part_paths):
+        """
+        Registers the content hash of a split PDF once all its parts are filed. The index
+        entry points at the parts, joined with os.pathsep.
+
+        Args:
+            content_hash (str): SHA-256 of the original PDF.
+            part_paths (list): Paths the parts were filed under.
+        """
+        duplicate = self.duplicate_index.claim(content_hash, None, os.pathsep.join(part_paths))
+        if duplicate:
+            logger.info(f"The content of the split PDF was already registered ({duplicate[1]}).")
+
+
+def create_file_processor(config: dict) -> FileProcessorStrategy:
+    """
+    Returns the file processor selected in the configuration.
+
+    Configuration keys:
+        analysis_mode (str): "expense" (default) or "tiered" to run text detection before AnalyzeExpense.
+        split_pdfs (bool): Split multi-invoice PDFs page by page (default False).
+        split_max_workers (int): Concurrent Textract jobs per split PDF (default 4).
+        text_layer (bool): Analyze born-digital PDFs from their text layer (default True).
+        text_layer_min_score (float): Minimum score to skip Textract (default 0.75).
+        text_layer_min_chars (int): Characters per page below which a PDF counts as a scan (default 100).
+        image_optimization (bool): Optimize images before their upload, see ImageOptimizer.from_config.
+        duplicate_detection (bool): Route duplicates to the duplicate folder, see DuplicateIndex.from_config.
+        duplicate_folder (str): Folder for duplicates (default "duplicates" in the destination folder).
+        textract_archive (bool): Archive the raw Textract responses, see ResponseArchive.from_config.
+
+    Args:
+        config (dict): The configuration data.
+    """
+    text_layer_options = {
+        "image_optimizer": ImageOptimizer.from_config(config),
+        "text_layer": config.get("text_layer", True),
+        "text_layer_min_score": float(config.get("text_layer_min_score", 0.75)),
+        "text_layer_min_chars": int(config.get("text_layer_min_chars", 100)),
+        "duplicate_index": DuplicateIndex.from_config(config, resource_path("DB/duplicate_index.sqlite3")),
+        "duplicate_folder": config.get("duplicate_folder"),
+        "response_archive": ResponseArchive.from_config(config, resource_path("DB/textract_archive")),
+    }
+    if config.get("analysis_mode", "expense") == "tiered":
+        if config.get("split_pdfs", False):
+            logger.warning("split_pdfs is ignored in the tiered analysis mode.")
+        return TieredFileProcessor(**text_layer_options)
+    if config.get("split_pdfs", False):
+        return SplittingFileProcessor(max_workers=int(config.get("split_max_workers", 4)), **text_layer_options)
+    return DefaultFileProcessor(**text_layer_options)
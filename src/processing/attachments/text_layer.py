@@ -0,0 +1,237 @@
+import re
+from config.loggin_config import logger
+from monitoring.metrics import counter, gauge
+
+DOCUMENT_SOURCES = counter(
+    "document_analysis_source_total",
+    "Analyzed documents by where their data came from (text_layer or textract).",
+    ("source",),
+)
+TEXT_LAYER_SERVED_RATIO = gauge(
+    "text_layer_served_ratio",
+    "Fraction of documents analyzed from the embedded PDF text layer without Textract.",
+)
+
+# Confidence reported for values read from the text layer: the text itself is exact
+TEXT_LAYER_CONFIDENCE = 99.0
+VENDOR_CONFIDENCE = 90.0
+
+INVOICE_LABEL_REGEX = re.compile(
+    r"^(?P<label>(rechnungs?[\s-]*(nr|nummer)\.?|invoice\s*(no|number)\.?|belegnummer))\s*[:#]?\s*(?P<value>\S+)",
+    re.IGNORECASE,
+)
+FIELD_REGEX = re.compile(r"^(?P<label>[^\W\d_][\w .\-/]{1,40}?)\s*:\s*(?P<value>\S.*)$")
+LEGAL_FORM_REGEX = re.compile(r"\b(GmbH|AG|KG|OHG|UG|GbR|e\.\s?K\.|SE|Ltd\.?|Inc\.?)(?=\W|$)")
+TITLE_LINES = {"rechnung", "lieferschein", "invoice", "delivery note"}
+# Words of invoices, receipts and credit notes, also inside compounds such as "Rechnungsbetrag"
+INVOICE_KEYWORD_REGEX = re.compile(
+    r"rechnung|faktur|invoice|quittung|kassenbon|kassenbeleg|gutschrift|receipt|zahlbetrag", re.IGNORECASE
+)
+
+
+def extract_pdf_text(file_path):
+    """
+    Extracts the embedded text layer of a PDF.
+
+    Args:
+        file_path (str): Path of the PDF.
+
+    Returns:
+        list: The text of every page (empty strings for pages without a text layer).
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def is_scanned(page_texts, min_chars_per_page=100):
+    """
+    Returns True if the PDF has no usable text layer, i.e. it is most likely a scan.
+
+    Args:
+        page_texts (list): Text of every page as returned by extract_pdf_text.
+        min_chars_per_page (int): Minimum average number of non-space characters per page.
+    """
+    if not page_texts:
+        return True
+    characters = sum(len("".join(text.split())) for text in page_texts)
+    return characters / len(page_texts) < min_chars_per_page
+
+
+def _field(label, value, field_type="OTHER", confidence=TEXT_LAYER_CONFIDENCE, page=1):
+    return {
+        "Type": {"Text": field_type},
+        "LabelDetection": {"Text": label},
+        "ValueDetection": {"Text": value, "Confidence": confidence},
+        "PageNumber": page,
+    }
+
+
+def build_text_layer_response(page_texts):
+    """
+    Builds a response in the shape of a Textract expense analysis from the PDF text layer.
+
+    Every text line becomes a LINE block. "Label: value" lines become summary fields, lines
+    such as "Rechnung Nr. 2025-001" become INVOICE_RECEIPT_ID fields, a line with a company
+    legal form (GmbH, AG, ...) becomes the VENDOR_NAME field and a title line such as
+    "Rechnung" is kept as a label, so the extract_*_from_response functions can be applied
+    unchanged.
+
+    Args:
+        page_texts (list): Text of every page as returned by extract_pdf_text.
+
+    Returns:
+        dict: The pseudo response.
+    """
+    fields = []
+    blocks = []
+    vendor_found = False
+
+    for page, text in enumerate(page_texts, 1):
+        for line in text.splitlines():
+            line = " ".join(line.split())
+            if not line:
+                continue
+            blocks.append({"BlockType": "LINE", "Text": line, "Confidence": TEXT_LAYER_CONFIDENCE, "Page": page})
+
+            invoice_match = INVOICE_LABEL_REGEX.match(line)
+            field_match = FIELD_REGEX.match(line)
+            if invoice_match:
+                fields.append(_field(invoice_match.group("label"), invoice_match.group("value"), "INVOICE_RECEIPT_ID", page=page))
+            elif field_match:
+                fields.append(_field(field_match.group("label"), field_match.group("value"), page=page))
+            elif line.lower().rstrip(":") in TITLE_LINES:
+                fields.append(_field(line, "", page=page))
+
+            if not vendor_found and LEGAL_FORM_REGEX.search(line):
+                fields.append(_field("", line, "VENDOR_NAME", VENDOR_CONFIDENCE, page=page))
+                vendor_found = True
+
+    return {
+        "JobStatus": "SUCCEEDED",
+        "DocumentMetadata": {"Pages": len(page_texts)},
+        "ExpenseDocuments": [{"ExpenseIndex": 1, "SummaryFields": fields, "LineItemGroups": []}] if fields else [],
+        "Blocks": blocks,
+    }
+
+
+def page_texts_from_blocks(response):
+    """
+    Rebuilds the text of every page from the LINE blocks of a Textract response.
+
+    Args:
+        response (dict): A DetectDocumentText or expense analysis response.
+
+    Returns:
+        list: The text of every page, in page order.
+    """
+    pages = {}
+    for block in response.get("Blocks", []):
+        if block.get("BlockType") == "LINE":
+            pages.setdefault(block.get("Page", 1), []).append(block.get("Text", ""))
+    return ["\n".join(pages[page]) for page in sorted(pages)]
+
+
+def mentions_invoice(response):
+    """
+    Tells whether any LINE block of a response contains an invoice, receipt or credit note
+    keyword (see INVOICE_KEYWORD_REGEX).
+
+    Args:
+        response (dict): A DetectDocumentText, expense analysis or pseudo response.
+    """
+    return any(
+        block.get("BlockType") == "LINE" and INVOICE_KEYWORD_REGEX.search(block.get("Text", ""))
+        for block in response.get("Blocks", [])
+    )
+
+
+def text_characters(response):
+    """Returns the number of non-space characters in the LINE blocks of a response."""
+    return sum(
+        len("".join(block.get("Text", "").split()))
+        for block in response.get("Blocks", []) if block.get("BlockType") == "LINE"
+    )
+
+
+def classification_score(classification):
+    """
+    Returns the share of the invoice number, vendor, document type and owner that were found.
+
+    Args:
+        classification (dict): Result of classify_response.
+
+    Returns:
+        float: Score between 0 and 1.
+    """
+    found = [
+        classification.get("invoice_number"),
+        classification.get("vendor_name"),
+        classification.get("doc_type"),
+        classification.get("matched_entry"),
+    ]
+    return sum(1 for value in found if value) / len(found)
+
+
+def record_document_source(source):
+    """
+    Counts an analyzed document and updates the fraction served from the text layer.
+
+    Args:
+        source (str): "text_layer", "detect_text" or "textract".
+    """
+    DOCUMENT_SOURCES.labels(source=source).inc()
+    counts = {labelvalues[0]: child.value for labelvalues, child in DOCUMENT_SOURCES.collect()}
+    total = sum(counts.values())
+    local = counts.get("text_layer", 0.0)
+    TEXT_LAYER_SERVED_RATIO.set(local / total if total else 0.0)
+
+
+def read_text_layer(file_path, min_chars_per_page=100):
+    """
+    Returns the pseudo response of a born-digital PDF, or None if Textract is needed.
+
+    Args:
+        file_path (str): Path of the document.
+        min_chars_per_page (int): See is_scanned.
+
+    Returns:
+        dict: The pseudo response, or None for scans, images and unreadable files.
+    """
+    page_texts = _usable_page_texts(file_path, min_chars_per_page)
+    return build_text_layer_response(page_texts) if page_texts is not None else None
+
+
+def read_text_layer_pages(file_path, min_chars_per_page=100):
+    """
+    Returns one pseudo response per page of a born-digital PDF, or None if Textract is needed.
+    Used to find the document boundaries of multi-page PDFs like the per-page Textract jobs.
+
+    Args:
+        file_path (str): Path of the PDF.
+        min_chars_per_page (int): See is_scanned; applies to the whole document.
+
+    Returns:
+        list: The pseudo responses in page order, or None for scans and unreadable files.
+    """
+    page_texts = _usable_page_texts(file_path, min_chars_per_page)
+    return [build_text_layer_response([text]) for text in page_texts] if page_texts is not None else None
+
+
+def _usable_page_texts(file_path, min_chars_per_page):
+    if not file_path.lower().endswith(".pdf"):
+        return None
+    try:
+        page_texts = extract_pdf_text(file_path)
+    except ImportError:
+        logger.warning("pypdf is not installed; all documents are analyzed with Textract.")
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read the text layer of {file_path}: {e}")
+        return None
+
+    if is_scanned(page_texts, min_chars_per_page):
+        logger.info(f"No usable text layer in {file_path}; using Textract.")
+        return None
+    return page_texts
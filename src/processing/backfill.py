@@ -0,0 +1,329 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config.loggin_config import logger
+from imap.mailbox_state import imap_date
+from emails.handler import search_emails, stream_emails_since, save_emails_to_json_split
+from processing.attachments.processor import AttachmentProcessor
+from AWS_TEXTRACT.rate_limiter import set_rate_share
+from monitoring.metrics import counter, gauge
+
+BACKFILL_EMAILS = counter("backfill_emails_total", "Historical emails processed by the backfill.", ("partition",))
+BACKFILL_PARTITIONS_REMAINING = gauge("backfill_partitions_remaining", "Backfill partitions that are not finished yet.")
+
+def date_criteria(since=None, before=None):
+    """
+    Returns IMAP search criteria for a date range.
+
+    Args:
+        since (str): Optional first date (inclusive), YYYY-MM-DD.
+        before (str): Optional end date (exclusive), YYYY-MM-DD.
+    """
+    criteria = []
+    if since:
+        criteria.append(f"SINCE {imap_date(since)}")
+    if before:
+        criteria.append(f"BEFORE {imap_date(before)}")
+    return " ".join(criteria)
+
+
+def partition_uids(uids, partitions):
+    """
+    Splits a sorted UID list into contiguous ranges with about the same number of emails.
+
+    UIDs are sparse after deletions, so the ranges are cut by email count rather than by
+    UID value to give every connection a similar share of the work.
+
+    Args:
+        uids (list): Sorted UIDs.
+        partitions (int): Number of ranges.
+
+    Returns:
+        list: (first UID, last UID) tuples, inclusive.
+    """
+    if not uids:
+        return []
+    partitions = max(min(int(partitions), len(uids)), 1)
+    size, remainder = divmod(len(uids), partitions)
+    ranges = []
+    start = 0
+    for index in range(partitions):
+        end = start + size + (1 if index < remainder else 0)
+        ranges.append((uids[start], uids[end - 1]))
+        start = end
+    return ranges
+
+
+class BackfillState:
+    """
+    Progress of a backfill, persisted as JSON after every window so an interrupted run resumes.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Returns the saved state, or None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def create(cls, path, upper_uid, criteria, ranges):
+        data = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "upper_uid": upper_uid,
+            "criteria": criteria,
+            "partitions": [
+                {"index": index, "first_uid": first, "last_uid": last, "checkpoint": first - 1, "processed": 0, "done": False}
+                for index, (first, last) in enumerate(ranges)
+            ],
+        }
+        state = cls(path, data)
+        state.save()
+        return state
+
+    @property
+    def partitions(self):
+        return self.data["partitions"]
+
+    def pending(self):
+        return [partition for partition in self.partitions if not partition["done"]]
+
+    def update(self, index, **changes):
+        with self._lock:
+            self.partitions[index].update(changes)
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=4)
+        os.replace(temp_file, self.path)
+
+
+def active_backfill_share(state_file, stale_after=1800, now=None):
+    """
+    Returns the share of the AWS rate limits a running backfill has reserved.
+
+    A backfill counts as running while its state file has unfinished partitions and was
+    saved within stale_after seconds; the state is saved after every window, so a crashed
+    or stopped backfill stops reserving its share once the file goes stale.
+
+    Args:
+        state_file (str): Path of the backfill state file.
+        stale_after (float): Seconds after the last save at which the backfill counts as stopped.
+        now (float): Current time (time.time()), for tests.
+
+    Returns:
+        float: The reserved share, or 0.0 if no backfill is running.
+    """
+    try:
+        state = BackfillState.load(state_file)
+        saved_at = os.path.getmtime(state_file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read backfill state {state_file}: {e}")
+        return 0.0
+    if state is None or not state.pending():
+        return 0.0
+    if (time.time() if now is None else now) - saved_at > stale_after:
+        return 0.0
+    return float(state.data.get("rate_share", 0.0))
+
+
+def apply_live_rate_share(state_file, stale_after=1800):
+    """
+    Leaves the share of the AWS rate limits a running backfill reserved to it, so the live
+    ingestion and the backfill together stay within the configured limits.
+
+    Args:
+        state_file (str): Path of the backfill state file.
+        stale_after (float): Seconds after the last save at which the backfill counts as stopped.
+
+    Returns:
+        float: The share the live ingestion uses now.
+    """
+    share = 1.0 - active_backfill_share(state_file, stale_after)
+    if set_rate_share(share):
+        if share < 1.0:
+            logger.info(f"Backfill running: live ingestion uses {share:.0%} of the AWS rate limits.")
+        else:
+            logger.info("No backfill running: live ingestion uses the full AWS rate limits.")
+    return share
+
+
+def watch_backfill_share(state_file, interval=30, stale_after=1800):
+    """
+    Starts a daemon thread that calls apply_live_rate_share every interval seconds.
+
+    Args:
+        state_file (str): Path of the backfill state file.
+        interval (float): Seconds between checks.
+        stale_after (float): Seconds after the last save at which the backfill counts as stopped.
+
+    Returns:
+        Thread: The started thread.
+    """
+    def watch():
+        while True:
+            apply_live_rate_share(state_file, stale_after)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=watch, name="backfill-share", daemon=True)
+    thread.start()
+    return thread
+
+
+def plan_backfill(mail, state_file, upper_uid, partitions, criteria=""):
+    """
+    Searches the historical UIDs and splits them into partitions, or resumes a saved plan.
+
+    Args:
+        mail (IMAP4_SSL): An authenticated IMAP connection.
+        state_file (str): Path of the state file.
+        upper_uid (int): Highest UID to backfill; newer emails belong to the live ingestion.
+        partitions (int): Number of partitions (parallel connections).
+        criteria (str): Additional IMAP search criteria (date range).
+
+    Returns:
+        BackfillState: The state to work off.
+    """
+    state = BackfillState.load(state_file)
+    if state is not None:
+        logger.info(f"Resuming backfill from {state_file}: {len(state.pending())} of {len(state.partitions)} partitions left.")
+        return state
+
+    search = f"UID 1:{upper_uid}"
+    if criteria:
+        search = f"{search} {criteria}"
+    uids, _ = search_emails(mail, search)
+    uids = sorted(uid for uid in uids if uid <= upper_uid)
+    ranges = partition_uids(uids, partitions)
+    logger.info(f"Backfilling {len(uids)} emails up to UID {upper_uid} in {len(ranges)} partitions: {ranges}")
+    return BackfillState.create(state_file, upper_uid, criteria, ranges)
+
+
+def run_partition(state, index, connect, parameters, destination_folder, attachment_folder, output_folder,
+                  file_processor, window_size=100, document_index=None):
+    """
+    Works off one partition on its own IMAP connection, checkpointing after every window.
+
+    Attachments are saved to a subfolder per partition so that files with the same name
+    from different partitions do not overwrite each other.
+
+    Returns:
+        int: Number of emails processed.
+    """
+    partition = state.partitions[index]
+    partition_attachments = os.path.join(attachment_folder, f"backfill_{index}")
+    partition_output = os.path.join(output_folder, "backfill", f"partition_{index}")
+    processor = AttachmentProcessor(file_processor, document_index=document_index)
+    processed = 0
+
+    mail = connect()
+    try:
+        windows = stream_emails_since(
+            mail,
+            partition["checkpoint"],
+            window_size,
+            upper_uid=partition["last_uid"],
+            extra_criteria=state.data.get("criteria", ""),
+            attachment_folder=partition_attachments,
+        )
+        for window_max_uid, emails in windows:
+            processed_emails = [
+                processor.process_attachments_from_email(
+                    email_obj=email, parameters=parameters, base_destination_folder=destination_folder
+                )
+                for email in emails
+            ]
+            if processed_emails:
+                save_emails_to_json_split(processed_emails, partition_output, max_entries_per_file=1000)
+            processed += len(processed_emails)
+            BACKFILL_EMAILS.labels(partition=index).inc(len(processed_emails))
+            state.update(index, checkpoint=window_max_uid, processed=partition["processed"] + len(processed_emails))
+            logger.info(f"Backfill partition {index}: checkpoint at UID {window_max_uid} of {partition['last_uid']}.")
+
+        state.update(index, done=True)
+        BACKFILL_PARTITIONS_REMAINING.dec()
+        logger.info(f"Backfill partition {index} finished ({processed} emails in this run).")
+    finally:
+        try:
+            mail.logout()
+        except Exception as e:
+            logger.warning(f"Logout of backfill partition {index} failed: {e}")
+    return processed
+
+
+def run_backfill(connect, state_file, upper_uid, parameters, destination_folder, attachment_folder, output_folder,
+                 file_processor, partitions=4, since=None, before=None, window_size=100, document_index=None,
+                 rate_share=None):
+    """
+    Processes historical emails (UIDs up to upper_uid) over several parallel IMAP connections.
+
+    The live checkpoint (max_uid) is never touched, so a backfill can run next to the live
+    ingestion, which only handles UIDs above it. Progress is saved per partition in
+    state_file; running the same command again resumes where it stopped.
+
+    Args:
+        connect (callable): Returns a new authenticated IMAP connection.
+        state_file (str): Path of the state file.
+        upper_uid (int): Highest UID to backfill.
+        parameters (list): Parameters loaded from the database file.
+        destination_folder (str): Folder where processed attachments are moved.
+        attachment_folder (str): Base folder for downloaded attachments.
+        output_folder (str): Base folder for the JSON output.
+        file_processor (FileProcessorStrategy): Strategy used for the attachments.
+        partitions (int): Number of parallel IMAP connections.
+        since (str): Optional first date (YYYY-MM-DD) of the backfill.
+        before (str): Optional end date (YYYY-MM-DD, exclusive) of the backfill.
+        window_size (int): UIDs fetched, processed and checkpointed together.
+        document_index (DocumentIndex): Optional full-text index the filed documents are added to.
+        rate_share (float): Share of the AWS rate limits this backfill uses. It is saved in the
+            state file so a live ingestion running next to it keeps to the rest.
+
+    Returns:
+        int: Number of emails processed in this run.
+    """
+    mail = connect()
+    try:
+        state = plan_backfill(mail, state_file, upper_uid, partitions, date_criteria(since, before))
+    finally:
+        mail.logout()
+
+    pending = state.pending()
+    if not pending:
+        logger.info(f"Backfill is complete. Delete {state_file} to run it again.")
+        return 0
+
+    if rate_share is not None:
+        # Also marks the backfill as running for the live ingestion until the first window is saved
+        state.data["rate_share"] = rate_share
+        state.save()
+    BACKFILL_PARTITIONS_REMAINING.set(len(pending))
+    processed = 0
+    with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="backfill") as pool:
+        futures = {
+            pool.submit(
+                run_partition, state, partition["index"], connect, parameters, destination_folder,
+                attachment_folder, output_folder, file_processor, window_size, document_index,
+            ): partition["index"]
+            for partition in pending
+        }
+        for future, index in futures.items():
+            try:
+                processed += future.result()
+            except Exception as e:
+                logger.error(f"Backfill partition {index} stopped: {e}. Run the backfill again to resume.")
+
+    left = len(state.pending())
+    logger.info(f"Backfill run finished: {processed} emails processed, {left} partitions left.")
+    return processed
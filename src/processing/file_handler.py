@@ -1,20 +1,76 @@
 import os
+import hashlib
 from processing.folders.folder_utils import create_folder_if_not_exists
 import shutil
 from config.loggin_config import logger
-def move_attachment(file_path, destination_folder):
+
+# Suffixes of files that are still being written by browsers, copy tools and editors
+INCOMPLETE_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", ".download", ".swp")
+
+def is_incomplete_file(file_name):
+    """
+    Tells whether a file name belongs to a hidden or temporary file that must not be processed,
+    e.g. a scan that is still being copied under a temporary name.
+
+    Args:
+        file_name (str): The file name (without folder).
+    """
+    return file_name.startswith((".", "~")) or file_name.lower().endswith(INCOMPLETE_SUFFIXES)
+
+def unique_path(path):
+    """
+    Returns the path itself if no file exists there, otherwise the first free
+    "<name>_<n><ext>" next to it, so existing files are never overwritten.
+
+    The returned path is reserved by creating an empty file there (atomically, with
+    O_EXCL), so concurrent workers never pick the same name; the caller replaces it.
+
+    Args:
+        path (str): The desired file path.
+
+    Returns:
+        str: The reserved path.
+    """
+    stem, extension = os.path.splitext(path)
+    candidate = path
+    counter = 0
+    while True:
+        try:
+            os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return candidate
+        except FileExistsError:
+            counter += 1
+            candidate = f"{stem}_{counter}{extension}"
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """
+    Returns the SHA-256 hex digest of a file's content.
+
+    Args:
+        file_path (str): The file to hash.
+        chunk_size (int): Bytes read at a time.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def move_attachment(file_path, destination_folder, file_name=None):
     """
-    Moves an attachment to a different folder.
+    Moves an attachment to a different folder. A file with the same name in the
+    destination folder is kept; the attachment gets a numbered name instead.
 
     Args:
         file_path (str): The full path of the attachment to move.
         destination_folder (str): The folder where the attachment will be moved.
+        file_name (str): Optional new file name. Defaults to the current name.
 
     Returns:
         str: The new full path of the moved attachment.
     """
     create_folder_if_not_exists("", destination_folder)
-    destination_path = os.path.join(destination_folder, os.path.basename(file_path))
+    destination_path = unique_path(os.path.join(destination_folder, file_name or os.path.basename(file_path)))
     shutil.move(file_path, destination_path)
     logger.info(f"Attachment moved to: {destination_path}")
     return destination_path
@@ -32,7 +88,10 @@ def rename_attachment(file_path, new_name):
     """
     directory = os.path.dirname(file_path)
     new_path = os.path.join(directory, new_name)
-    os.rename(file_path, new_path)
+    if os.path.abspath(new_path) == os.path.abspath(file_path):
+        return file_path
+    new_path = unique_path(new_path)
+    os.replace(file_path, new_path)
     logger.info(f"Attachment renamed to: {new_path}")
     return new_path
 
@@ -0,0 +1,231 @@
+import dataclasses
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config.loggin_config import logger
+from monitoring.metrics import counter
+
+REPLAYED_DOCUMENTS = counter("replay_documents_total", "Stored Textract responses reclassified by the replay.", ("result",))
+
+# Fields compared between the baseline and the replay
+DIFF_FIELDS = ("invoice_number", "doc_type", "verw_nr")
+
+# Per-process state of the pool workers, set by _init_worker
+_worker = {}
+
+
+def classify_stored_response(response, operation, parameters, threshold=60):
+    """
+    Classifies a stored Textract response with the current extraction rules.
+
+    Text detection responses (tiered analysis) are classified from their LINE blocks the
+    same way TieredFileProcessor does.
+
+    Args:
+        response (dict): The stored response.
+        operation (str): "analyze_expense" or "detect_document_text".
+        parameters (list): Parameters loaded from the database file.
+        threshold (int): Minimum fuzzy match score for the owner.
+
+    Returns:
+        dict: invoice_number, vendor_name, doc_type and verw_nr.
+    """
+    from processing.attachments.classification import classify_response
+    from processing.attachments.text_layer import build_text_layer_response, page_texts_from_blocks
+
+    if operation == "detect_document_text":
+        response = build_text_layer_response(page_texts_from_blocks(response))
+    classification = classify_response(response, parameters, threshold)
+    matched_entry = classification["matched_entry"]
+    return {
+        "invoice_number": classification["invoice_number"],
+        "vendor_name": classification["vendor_name"],
+        "doc_type": classification["doc_type"],
+        "verw_nr": str(matched_entry["verw_nr"]) if matched_entry else None,
+    }
+
+
+def response_operation(response):
+    """Tells an expense analysis response from a text detection response."""
+    return "analyze_expense" if "ExpenseDocuments" in response else "detect_document_text"
+
+
+def collect_tasks(source):
+    """
+    Lists the stored responses to replay.
+
+    Args:
+        source (str): A folder with a response archive (index.sqlite3), or a folder of
+            Textract responses as .json files (searched recursively).
+
+    Returns:
+        tuple: (archive folder or None, list of (key, location) tasks). The key identifies the
+            document in the results; the location is a file path or an archive entry.
+    """
+    if os.path.exists(os.path.join(source, "index.sqlite3")):
+        from DB.response_archive import ResponseArchive
+
+        archive = ResponseArchive(source, train_samples=0)
+        latest = {}
+        try:
+            for entry in archive.entries():
+                key = entry.content_hash or entry.job_id or f"entry:{entry.id}"
+                current = latest.get(key)
+                # The expense analysis decided the result whenever a document has one
+                if (current is None or entry.operation == "analyze_expense"
+                        or current.operation != "analyze_expense"):
+                    latest[key] = dataclasses.replace(entry, archive=None)
+        finally:
+            archive.close()
+        return source, sorted(latest.items())
+
+    tasks = []
+    for folder, _, file_names in os.walk(source):
+        for file_name in file_names:
+            if file_name.endswith(".json"):
+                path = os.path.join(folder, file_name)
+                tasks.append((os.path.relpath(path, source).replace(os.sep, "/"), path))
+    return None, sorted(tasks)
+
+
+def _init_worker(parameters, threshold, archive_folder):
+    _worker["parameters"] = parameters
+    _worker["threshold"] = threshold
+    if archive_folder:
+        from DB.response_archive import ResponseArchive
+
+        _worker["archive"] = ResponseArchive(archive_folder, train_samples=0)
+
+
+def _replay_task(task):
+    key, location = task
+    try:
+        if isinstance(location, str):
+            with open(location, "r", encoding="utf-8") as f:
+                response = json.load(f)
+            operation = response_operation(response)
+        else:
+            response = _worker["archive"].read(location)
+            operation = location.operation
+        return key, classify_stored_response(response, operation, _worker["parameters"], _worker["threshold"]), None
+    except Exception as e:
+        return key, None, f"{type(e).__name__}: {e}"
+
+
+def load_results(path):
+    """
+    Reads a results file written by write_results.
+
+    Returns:
+        dict: Classification results by document key.
+    """
+    results = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                results[record.pop("key")] = record
+    return results
+
+
+def write_results(path, results):
+    """Writes the results as JSON lines sorted by key, so that two runs can be diffed."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_file = f"{path}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        for key in sorted(results):
+            f.write(json.dumps({"key": key, **results[key]}, ensure_ascii=False) + "\n")
+    os.replace(temp_file, path)
+
+
+def diff_results(baseline, current):
+    """
+    Compares two sets of results field by field.
+
+    Args:
+        baseline (dict): Results of the earlier run by document key.
+        current (dict): Results of this run by document key.
+
+    Returns:
+        dict: Number of changes per field, the changes, and the keys missing on either side.
+    """
+    changes = []
+    counts = {field: 0 for field in DIFF_FIELDS}
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key], current[key]
+        for field in DIFF_FIELDS:
+            if before.get(field) != after.get(field):
+                counts[field] += 1
+                changes.append({"key": key, "field": field, "before": before.get(field), "after": after.get(field),
+                                "vendor_name": after.get("vendor_name")})
+    return {
+        "compared": len(baseline.keys() & current.keys()),
+        "changed_documents": len({change["key"] for change in changes}),
+        "changes_by_field": counts,
+        "only_in_baseline": sorted(baseline.keys() - current.keys()),
+        "only_in_replay": sorted(current.keys() - baseline.keys()),
+        "changes": changes,
+    }
+
+
+def run_replay(source, parameters, threshold=60, workers=None, baseline=None, output=None, report=None, chunk_size=64):
+    """
+    Reclassifies stored Textract responses without calling AWS or moving files.
+
+    The responses are classified in a process pool with the current extraction rules and
+    owner threshold. The results can be written to a file and compared with the results of
+    an earlier run, e.g. before a change of the invoice number keywords.
+
+    Args:
+        source (str): Response archive folder or folder of .json responses, see collect_tasks.
+        parameters (list): Parameters loaded from the database file.
+        threshold (int): Minimum fuzzy match score for the owner.
+        workers (int): Worker processes (default: number of CPUs).
+        baseline (str): Optional results file of an earlier run to compare with.
+        output (str): Optional path for the results of this run.
+        report (str): Optional path for the JSON diff report.
+        chunk_size (int): Responses sent to a worker at a time.
+
+    Returns:
+        dict: Summary with the number of documents, errors, duration and the diff (if a baseline was given).
+    """
+    started = time.perf_counter()
+    archive_folder, tasks = collect_tasks(source)
+    logger.info(f"Replaying {len(tasks)} stored responses from {source} with {workers or os.cpu_count()} workers.")
+
+    results = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(parameters, threshold, archive_folder)) as pool:
+        for number, (key, result, error) in enumerate(pool.map(_replay_task, tasks, chunksize=chunk_size), 1):
+            if error:
+                errors[key] = error
+                REPLAYED_DOCUMENTS.labels(result="error").inc()
+            else:
+                results[key] = result
+                REPLAYED_DOCUMENTS.labels(result="success").inc()
+            if number % 10000 == 0:
+                logger.info(f"Replayed {number}/{len(tasks)} responses.")
+
+    for key, error in sorted(errors.items())[:20]:
+        logger.warning(f"Could not replay {key}: {error}")
+    if output:
+        write_results(output, results)
+        logger.info(f"Replay results written to {output}")
+
+    summary = {
+        "source": source,
+        "documents": len(tasks),
+        "errors": len(errors),
+        "threshold": threshold,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    if baseline:
+        summary["diff"] = diff_results(load_results(baseline), results)
+    if report:
+        os.makedirs(os.path.dirname(os.path.abspath(report)), exist_ok=True)
+        with open(report, "w", encoding="utf-8") as f:
+            json.dump({**summary, "error_details": errors}, f, ensure_ascii=False, indent=4)
+        logger.info(f"Replay report written to {report}")
+    return summary
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from config.loggin_config import logger
+from monitoring.metrics import gauge
+
+POLL_INTERVAL = gauge("poll_interval_seconds", "Sleep before the next polling cycle, as chosen by the scheduler.")
+
+
+def parse_quiet_hours(windows):
+    """
+    Parses quiet-hour windows such as ["22:00-06:00", "12:00-12:30"].
+
+    Args:
+        windows (list): Window strings "HH:MM-HH:MM"; a window may wrap past midnight.
+
+    Returns:
+        list: (start time, end time) tuples.
+    """
+    parsed = []
+    for window in windows or []:
+        try:
+            start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in window.split("-", 1))
+        except ValueError:
+            logger.warning(f"Ignoring invalid quiet-hours window: {window!r} (expected HH:MM-HH:MM)")
+            continue
+        parsed.append((start, end))
+    return parsed
+
+
+class AdaptivePollScheduler:
+    """
+    Chooses the sleep between polling cycles from the recent mail arrival rate.
+
+    A cycle that finds new emails drops the interval to `min_interval`, so bursts (e.g. at
+    month-end) are drained quickly. Each idle cycle multiplies the interval by
+    `backoff_factor` up to `max_interval`, reducing IMAP logins while the inbox is quiet.
+    Inside a quiet-hours window the scheduler sleeps `quiet_interval`, but never past the
+    end of the window.
+    """
+
+    def __init__(self, min_interval=60, max_interval=900, initial_interval=300, backoff_factor=2.0,
+                 quiet_hours=None, quiet_interval=3600, clock=datetime.now):
+        """
+        Args:
+            min_interval (float): Shortest sleep in seconds, used right after new mail.
+            max_interval (float): Longest sleep in seconds while the inbox is idle.
+            initial_interval (float): Sleep before any cycle has been observed.
+            backoff_factor (float): Growth factor of the interval per idle cycle.
+            quiet_hours (list): Quiet-hour windows, see parse_quiet_hours().
+            quiet_interval (float): Sleep in seconds inside a quiet-hours window.
+            clock (callable): Returns the current local datetime (replaceable for testing).
+        """
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Poll intervals must satisfy 0 < min_interval <= max_interval.")
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.backoff_factor = max(float(backoff_factor), 1.0)
+        self.quiet_hours = parse_quiet_hours(quiet_hours)
+        self.quiet_interval = float(quiet_interval)
+        self.clock = clock
+        self.interval = min(max(float(initial_interval), self.min_interval), self.max_interval)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Creates a scheduler from the poll_* keys of config.json.
+
+        Args:
+            config (dict): The configuration data.
+        """
+        return cls(
+            min_interval=config.get("poll_min_interval", 60),
+            max_interval=config.get("poll_max_interval", 900),
+            initial_interval=config.get("poll_interval", 300),
+            backoff_factor=config.get("poll_backoff_factor", 2.0),
+            quiet_hours=config.get("poll_quiet_hours", []),
+            quiet_interval=config.get("poll_quiet_interval", 3600),
+        )
+
+    def record_cycle(self, new_emails):
+        """
+        Adapts the interval to the outcome of the last polling cycle.
+
+        Args:
+            new_emails (int): Number of new emails the cycle found.
+        """
+        if new_emails > 0:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+
+    def _quiet_window_end(self, now):
+        """Returns the end of the quiet-hours window containing `now`, or None."""
+        current = now.time()
+        for start, end in self.quiet_hours:
+            if start <= end:
+                inside = start <= current < end
+                end_date = now.date()
+            else:  # Window wraps past midnight
+                inside = current >= start or current < end
+                end_date = now.date() + timedelta(days=1) if current >= start else now.date()
+            if inside:
+                return datetime.combine(end_date, end)
+        return None
+
+    def next_interval(self):
+        """
+        Returns the number of seconds to sleep before the next polling cycle.
+        """
+        now = self.clock()
+        window_end = self._quiet_window_end(now)
+        if window_end is not None:
+            seconds_left = (window_end - now).total_seconds()
+            interval = max(min(self.quiet_interval, seconds_left), self.min_interval)
+        else:
+            interval = self.interval
+        POLL_INTERVAL.set(interval)
+        return interval
+
@@ -0,0 +1,415 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.loggin_config import logger
+from processing.attachments.data_loader import load_parameters_from_db
+from processing.attachments.processor import AttachmentProcessor
+from processing.file_handler import is_incomplete_file, unique_path, move_attachment
+from monitoring.metrics import counter, gauge
+
+WATCH_FOLDER_FILES = counter("watch_folder_files_total", "Files picked up from the watch folder by resulting status.",
+                             ("status",))
+WATCH_FOLDER_PENDING = gauge("watch_folder_pending_files", "Files in the watch folder waiting to be processed.")
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+# Subfolders of the watch folder, which is itself not watched recursively
+PROCESSING_FOLDER = ".processing"
+FAILED_FOLDER = "failed"
+
+
+class InotifyWatcher:
+    """
+    Reports the names of files created, written or moved into a folder, using Linux inotify
+    through ctypes.
+    """
+
+    mode = "inotify"
+
+    def __init__(self, folder):
+        """
+        Raises:
+            OSError: If inotify is not available (other platforms, or the watch limit is reached).
+        """
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not supported on this platform")
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(self._fd, os.fsencode(folder), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout):
+        """
+        Waits up to timeout seconds for changes.
+
+        Returns:
+            set: Names of the changed files, or None if the folder must be rescanned (the
+                kernel event queue overflowed).
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name and not mask & IN_ISDIR:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback for platforms and file systems without inotify (e.g. network shares): rescans the folder."""
+
+    mode = "polling"
+
+    def __init__(self, folder, interval=5.0):
+        self.interval = float(interval)
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        return None
+
+    def close(self):
+        pass
+
+
+def create_watcher(folder, mode="auto", poll_interval=5.0):
+    """
+    Returns an InotifyWatcher, or a PollingWatcher if mode is "polling" or inotify is not available.
+
+    Args:
+        folder (str): The folder to watch.
+        mode (str): "auto", "inotify" or "polling".
+        poll_interval (float): Seconds between the scans of the polling watcher.
+    """
+    if mode != "polling":
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            if mode == "inotify":
+                raise
+            logger.info(f"inotify is not available ({e}); polling {folder} every {poll_interval}s.")
+    return PollingWatcher(folder, poll_interval)
+
+
+class WatchFolder:
+    """
+    Processes the files dropped into a folder (scanners, fax gateway) with the same file
+    processor as the email attachments.
+
+    A file is only processed once its size and modification time have not changed for
+    `settle_seconds`, so files that are still being written are not picked up. It is then
+    claimed by moving it into the `.processing` subfolder, where the file processor renames
+    it and moves it to the destination folder.
+
+    A file whose processing failed with a transient error (Textract or S3 throttling, network
+    failures) is moved back into the watch folder and retried after an exponential backoff,
+    up to `retry_attempts` times. Files that still fail, or fail for any other reason, are
+    moved to the `failed` subfolder instead of being retried forever.
+    """
+
+    def __init__(self, folder, file_processor, parameters_file, destination_folder, workers=4, settle_seconds=2.0,
+                 poll_interval=5.0, mode="auto", threshold=60, document_index=None, retry_attempts=5,
+                 retry_base_delay=30.0, retry_max_delay=900.0):
+        """
+        Args:
+            folder (str): The folder to watch.
+            file_processor (FileProcessorStrategy): Strategy used for the files.
+            parameters_file (str): Path of the parameters database file; reloaded when it changes.
+            destination_folder (str): Folder where processed files are moved.
+            workers (int): Files processed concurrently.
+            settle_seconds (float): Time a file must stay unchanged before it is processed.
+            poll_interval (float): Seconds between the scans without inotify.
+            mode (str): "auto", "inotify" or "polling", see create_watcher().
+            threshold (int): Minimum fuzzy match score for the owner.
+            document_index (DocumentIndex): Optional full-text index the filed documents are added to.
+            retry_attempts (int): Retries of a file after transient errors before it is moved to `failed`.
+            retry_base_delay (float): Seconds before the first retry; doubles with every retry.
+            retry_max_delay (float): Upper bound of the delay between retries.
+        """
+        self.folder = os.path.abspath(folder)
+        self.processor = AttachmentProcessor(file_processor, document_index=document_index)
+        self.parameters_file = parameters_file
+        self.destination_folder = destination_folder
+        self.workers = max(int(workers), 1)
+        self.settle_seconds = float(settle_seconds)
+        self.poll_interval = float(poll_interval)
+        self.mode = mode
+        self.threshold = threshold
+        self.retry_attempts = max(int(retry_attempts), 0)
+        self.retry_base_delay = float(retry_base_delay)
+        self.retry_max_delay = float(retry_max_delay)
+        self.processing_folder = os.path.join(self.folder, PROCESSING_FOLDER)
+        self.failed_folder = os.path.join(self.folder, FAILED_FOLDER)
+        self._pending = {}  # name -> (size, mtime_ns, time of the last change)
+        self._in_flight = set()
+        self._retries = {}  # name -> (failed attempts, time.monotonic() before which it is not retried)
+        self._rescan = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._parameters = None
+        self._parameters_mtime = None
+
+    @classmethod
+    def from_config(cls, config, file_processor, parameters_file, destination_folder, folder=None,
+                    document_index=None):
+        """
+        Creates a watch folder from the watch_* keys of config.json.
+
+        Args:
+            config (dict): The configuration data.
+            file_processor (FileProcessorStrategy): Strategy used for the files.
+            parameters_file (str): Path of the parameters database file.
+            destination_folder (str): Folder where processed files are moved.
+            folder (str): The folder to watch (default: watch_folder from the configuration).
+            document_index (DocumentIndex): Optional full-text index.
+        """
+        return cls(
+            folder or config.get("watch_folder"),
+            file_processor,
+            parameters_file,
+            destination_folder,
+            workers=int(config.get("watch_workers", 4)),
+            settle_seconds=float(config.get("watch_settle_seconds", 2.0)),
+            poll_interval=float(config.get("watch_poll_interval", 5.0)),
+            mode=config.get("watch_mode", "auto"),
+            document_index=document_index,
+            retry_attempts=int(config.get("watch_retry_attempts", 5)),
+            retry_base_delay=float(config.get("watch_retry_base_delay", 30.0)),
+            retry_max_delay=float(config.get("watch_retry_max_delay", 900.0)),
+        )
+
+    def parameters(self):
+        """Returns the parameters, reloading them if the database file has changed."""
+        try:
+            mtime = os.path.getmtime(self.parameters_file)
+        except OSError:
+            mtime = None
+        if self._parameters is None or mtime != self._parameters_mtime:
+            parameters = load_parameters_from_db(self.parameters_file)
+            if parameters:
+                self._parameters, self._parameters_mtime = parameters, mtime
+            elif self._parameters is None:
+                raise RuntimeError(f"Parameters could not be loaded from {self.parameters_file}")
+        return self._parameters
+
+    def recover(self):
+        """Moves files left in .processing by an interrupted run back into the watch folder."""
+        if not os.path.isdir(self.processing_folder):
+            return
+        for name in os.listdir(self.processing_folder):
+            path = os.path.join(self.processing_folder, name)
+            if os.path.isfile(path):
+                logger.warning(f"Requeueing {name}, which was being processed when the last run stopped.")
+                move_attachment(path, self.folder)
+
+    def observe(self, names=None):
+        """
+        Records the current size and modification time of files in the watch folder.
+
+        Args:
+            names (set): Names reported by the watcher, or None to scan the whole folder.
+        """
+        now = time.monotonic()
+        if names is None:
+            with os.scandir(self.folder) as entries:
+                names = {entry.name for entry in entries if entry.is_file()}
+            # Files that disappeared (moved away by someone else) are forgotten
+            for name in set(self._pending) - names:
+                del self._pending[name]
+        for name in names:
+            if is_incomplete_file(name) or name in self._in_flight:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                self._pending.pop(name, None)
+                continue
+            current = self._pending.get(name)
+            if current is None or current[:2] != (stat.st_size, stat.st_mtime_ns):
+                self._pending[name] = (stat.st_size, stat.st_mtime_ns, now)
+
+    def ready_files(self):
+        """
+        Returns the pending files that have not changed for settle_seconds, oldest first.
+        Files waiting for a retry are left out until their backoff has passed.
+        """
+        now = time.monotonic()
+        deadline = now - self.settle_seconds
+        ready = sorted((changed, name) for name, (_, _, changed) in self._pending.items()
+                       if changed <= deadline and not self.waiting_for_retry(name, now))
+        return [name for _, name in ready]
+
+    def waiting_for_retry(self, name, now=None):
+        """Tells whether a file failed with a transient error and its backoff has not passed yet."""
+        retry = self._retries.get(name)
+        return retry is not None and retry[1] > (time.monotonic() if now is None else now)
+
+    def schedule_retry(self, name, claimed_path):
+        """
+        Moves a file that failed with a transient error back into the watch folder, to be
+        processed again after an exponential backoff.
+
+        Args:
+            name (str): Name of the file in the watch folder.
+            claimed_path (str): Path of the claimed file in .processing.
+
+        Returns:
+            bool: False if the file has used up its retry_attempts (it is left where it is).
+        """
+        with self._lock:
+            attempts = self._retries.get(name, (0, 0.0))[0] + 1
+        if attempts > self.retry_attempts:
+            with self._lock:
+                self._retries.pop(name, None)
+            return False
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempts - 1))
+        # The name changes if a new file with the same name arrived meanwhile
+        requeued_name = os.path.basename(move_attachment(claimed_path, self.folder))
+        with self._lock:
+            self._retries.pop(name, None)
+            self._retries[requeued_name] = (attempts, time.monotonic() + delay)
+        logger.warning(f"Transient error processing {name}; retry {attempts}/{self.retry_attempts} "
+                       f"in {delay:.0f}s.")
+        return True
+
+    def claim(self, name):
+        """
+        Moves a file from the watch folder into .processing.
+
+        Returns:
+            str: The path of the claimed file, or None if it is gone.
+        """
+        os.makedirs(self.processing_folder, exist_ok=True)
+        claimed_path = unique_path(os.path.join(self.processing_folder, name))
+        try:
+            os.replace(os.path.join(self.folder, name), claimed_path)
+        except FileNotFoundError:
+            os.remove(claimed_path)
+            return None
+        return claimed_path
+
+    def process_file(self, name):
+        """Claims and processes one file; runs on a worker thread."""
+        try:
+            claimed_path = self.claim(name)
+            if claimed_path is None:
+                return None
+            result = self.processor.strategy.process(claimed_path, self.parameters(), self.destination_folder,
+                                                     self.threshold)
+            for document in result.documents or [result]:
+                self.processor.index_document(document, None)
+            statuses = {document.status for document in result.documents or [result]}
+            if not os.path.exists(claimed_path):
+                with self._lock:
+                    self._retries.pop(name, None)
+            elif result.status == "error" and result.retryable and self.schedule_retry(name, claimed_path):
+                statuses = {"retry"}
+            else:
+                # Not filed (error, or a split PDF with failed parts): keep it out of the watch folder
+                failed_path = move_attachment(claimed_path, self.failed_folder)
+                logger.error(f"Could not process {name}; moved to {failed_path}.")
+                statuses.add("error")
+            for status in statuses:
+                WATCH_FOLDER_FILES.labels(status=status).inc()
+            logger.info(f"Processed {name} from the watch folder ({', '.join(sorted(statuses))}).")
+            return result
+        except Exception as e:
+            WATCH_FOLDER_FILES.labels(status="error").inc()
+            logger.error(f"Error processing {name} from the watch folder: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._in_flight.discard(name)
+                # A file of the same name may have arrived meanwhile without a new event
+                self._rescan = True
+
+    def run(self, max_idle_cycles=None):
+        """
+        Watches the folder until stop() is called.
+
+        Files that are already in the folder when the watch starts are processed as well.
+
+        Args:
+            max_idle_cycles (int): Optional number of consecutive waits without pending or
+                running files after which the watch ends (for one-shot runs).
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        self.recover()
+        self.parameters()
+        watcher = create_watcher(self.folder, self.mode, self.poll_interval)
+        logger.info(f"Watching {self.folder} ({watcher.mode}, {self.workers} workers).")
+        idle_cycles = 0
+        names = None  # Scan everything first
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="watch") as executor:
+                while not self._stop.is_set():
+                    with self._lock:
+                        if self._rescan:
+                            names, self._rescan = None, False
+                    self.observe(names)
+                    with self._lock:
+                        # Queue at most one file per worker; the rest waits in the folder
+                        free = self.workers - len(self._in_flight)
+                        ready = self.ready_files()[:max(free, 0)]
+                        for name in ready:
+                            del self._pending[name]
+                            self._in_flight.add(name)
+                        busy = bool(self._in_flight)
+                        # Files waiting for a retry do not keep one-shot runs alive; they stay
+                        # in the folder for the next run
+                        active = sum(1 for name in self._pending if not self.waiting_for_retry(name))
+                    for name in ready:
+                        executor.submit(self.process_file, name)
+                    WATCH_FOLDER_PENDING.set(len(self._pending))
+
+                    if active or busy:
+                        idle_cycles = 0
+                    else:
+                        idle_cycles += 1
+                        if max_idle_cycles is not None and idle_cycles >= max_idle_cycles:
+                            break
+                    # Pending files are checked again once they may have settled
+                    timeout = self.settle_seconds / 2 if active or busy else self.poll_interval
+                    names = watcher.wait(max(timeout, 0.05))
+        finally:
+            watcher.close()
+
+    def stop(self):
+        """Ends run() after the files that are being processed are finished."""
+        self._stop.set()
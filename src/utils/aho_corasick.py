@@ -0,0 +1,75 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher (Aho-Corasick automaton).
+
+    The automaton is built once over all patterns; find_all() then reports every occurrence
+    of every pattern in a single pass over the text, however many patterns there are.
+    """
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (iterable): (pattern string, value) pairs. The value is reported for
+                every occurrence; several values may share a pattern. Empty patterns are ignored.
+        """
+        self._goto = [{}]  # state -> {character: next state}
+        self._fail = [0]
+        self._output = [()]  # state -> ((pattern length, value), ...) of all patterns ending there
+        outputs = [[]]
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for character in pattern:
+                next_state = self._goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][character] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append([])
+                state = next_state
+            outputs[state].append((len(pattern), value))
+
+        # Breadth-first, so the failure state of a node is final before its children are visited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and character not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(character, 0)
+                # A state also reports the patterns that end at its failure state (suffixes)
+                outputs[next_state].extend(outputs[self._fail[next_state]])
+        self._output = [tuple(output) for output in outputs]
+
+    def __len__(self):
+        """Returns the number of automaton states."""
+        return len(self._goto)
+
+    def find_all(self, text):
+        """
+        Finds all occurrences of the patterns, including overlapping ones.
+
+        Args:
+            text (str): The text to search.
+
+        Returns:
+            list: (start, end, value) tuples in the order of their end position.
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for index, character in enumerate(text):
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            if output[state]:
+                end = index + 1
+                matches.extend((end - length, end, value) for length, value in output[state])
+        return matches
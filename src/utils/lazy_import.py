@@ -0,0 +1,48 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Proxy that imports a module on first attribute access.
+
+    Heavy dependencies (boto3, rapidfuzz) are only needed once a document is analyzed;
+    importing them lazily keeps the cold start of the frozen build short.
+    Attributes are always read from the real module, so monkeypatching the module
+    (as the benchmarks do) is visible through the proxy.
+    """
+
+    def __init__(self, module_name):
+        self.__dict__["_module_name"] = module_name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_module_name"])
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<LazyModule {self.__dict__['_module_name']} ({state})>"
+
+
+def lazy_module(module_name):
+    """
+    Returns a proxy for the module that imports it on first use.
+
+    Args:
+        module_name (str): Absolute module name, e.g. "AWS_TEXTRACT.analyze_expense".
+    """
+    return LazyModule(module_name)
@@ -0,0 +1,39 @@
+import os
+import sys
+
+# The application modules are imported from src/, as when running src/main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+def write_text_pdf(path, pages):
+    """
+    Writes a born-digital PDF with a text layer.
+
+    Args:
+        path (str): Path of the new PDF.
+        pages (list): Lines of text of every page.
+    """
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for lines in pages:
+        page = writer.add_blank_page(width=595, height=842)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+        text = b" T* ".join(
+            b"(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1") + b") Tj"
+            for line in lines
+        )
+        content = DecodedStreamObject()
+        content.set_data(b"BT /F1 11 Tf 14 TL 50 800 Td " + text + b" ET")
+        page[NameObject("/Contents")] = writer._add_object(content)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from AWS_TEXTRACT import rate_limiter
+from processing.backfill import BackfillState, active_backfill_share, apply_live_rate_share, partition_uids
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    rate_limiter.configure_rate_limits({})
+    yield
+    rate_limiter.configure_rate_limits({})
+
+
+def write_state(path, done=False, rate_share=0.5):
+    state = BackfillState.create(str(path), 100, "", [(1, 50), (51, 100)])
+    state.data["rate_share"] = rate_share
+    if done:
+        for partition in state.partitions:
+            partition["done"] = True
+    state.save()
+    return state
+
+
+def test_partitions_have_about_the_same_number_of_emails():
+    uids = [1, 2, 3, 10, 11, 40, 41, 42, 90, 100]
+    assert partition_uids(uids, 3) == [(1, 10), (11, 41), (42, 100)]
+
+
+def test_partitions_are_capped_by_the_number_of_emails():
+    assert partition_uids([5, 7], 4) == [(5, 5), (7, 7)]
+    assert partition_uids([5, 7], 0) == [(5, 7)]
+    assert partition_uids([], 4) == []
+
+
+def test_state_resumes_from_the_saved_checkpoints(tmp_path):
+    path = str(tmp_path / "backfill_state.json")
+    state = BackfillState.create(path, 100, "SINCE 01-Jan-2024", [(1, 50), (51, 100)])
+    assert [partition["checkpoint"] for partition in state.partitions] == [0, 50]
+
+    state.update(0, checkpoint=30, processed=12)
+    state.update(1, done=True)
+
+    loaded = BackfillState.load(path)
+    assert loaded.data["criteria"] == "SINCE 01-Jan-2024"
+    assert loaded.partitions[0]["checkpoint"] == 30
+    assert loaded.partitions[0]["processed"] == 12
+    assert [partition["index"] for partition in loaded.pending()] == [0]
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_missing_state_loads_as_none(tmp_path):
+    assert BackfillState.load(str(tmp_path / "backfill_state.json")) is None
+
+
+def test_no_state_file_reserves_nothing(tmp_path):
+    assert active_backfill_share(str(tmp_path / "backfill_state.json")) == 0.0
+
+
+def test_running_backfill_reserves_its_share(tmp_path):
+    path = tmp_path / "backfill_state.json"
+    write_state(path, rate_share=0.3)
+    assert active_backfill_share(str(path)) == 0.3
+
+
+def test_finished_backfill_reserves_nothing(tmp_path):
+    path = tmp_path / "backfill_state.json"
+    write_state(path, done=True)
+    assert active_backfill_share(str(path)) == 0.0
+
+
+def test_stale_backfill_reserves_nothing(tmp_path):
+    path = tmp_path / "backfill_state.json"
+    write_state(path)
+    saved_at = os.path.getmtime(path)
+    assert active_backfill_share(str(path), stale_after=60, now=saved_at + 30) == 0.5
+    assert active_backfill_share(str(path), stale_after=60, now=saved_at + 61) == 0.0
+
+
+def test_live_ingestion_keeps_to_the_rest_of_the_limits(tmp_path):
+    path = tmp_path / "backfill_state.json"
+    full_rate = rate_limiter.get_limiter("get_expense_analysis").bucket.rate
+    write_state(path, rate_share=0.5)
+
+    assert apply_live_rate_share(str(path)) == 0.5
+    assert rate_limiter.get_limiter("get_expense_analysis").bucket.rate == pytest.approx(full_rate * 0.5)
+
+    write_state(path, done=True)
+    assert apply_live_rate_share(str(path)) == 1.0
+    assert rate_limiter.get_limiter("get_expense_analysis").bucket.rate == pytest.approx(full_rate)
+
+
+def test_unchanged_share_keeps_the_limiters(tmp_path):
+    path = tmp_path / "backfill_state.json"
+    write_state(path)
+    apply_live_rate_share(str(path))
+    limiter = rate_limiter.get_limiter("get_expense_analysis")
+    apply_live_rate_share(str(path))
+    assert rate_limiter.get_limiter("get_expense_analysis") is limiter
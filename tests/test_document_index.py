@@ -0,0 +1,65 @@
+import pytest
+
+from DB.document_index import DocumentIndex, find_ibans, fts_query, iso_email_date
+from emails.Email_with_Attachment import AttachmentRecord, EmailWithAttachments
+
+
+@pytest.fixture
+def index():
+    index = DocumentIndex(":memory:")
+    yield index
+    index.close()
+
+
+def add(index, uid, date, file_name, text, vendor="Stadtwerke Musterstadt", invoice_number="R-2024-001"):
+    email = EmailWithAttachments(uid, "Rechnung", "billing@example.com", date, [])
+    record = AttachmentRecord(file_name, f"/out/{file_name}", status="processed", invoice_number=invoice_number,
+                              vendor_name=vendor, doc_type="INVOICE", verw_nr="1", owner="Muster")
+    return index.add(record, email, text)
+
+
+def test_fts_query_quotes_every_term():
+    assert fts_query('R-2024-001 "Strom"') == '"R-2024-001" AND """Strom"""'
+
+
+def test_fts_query_matches_ibans_without_spaces():
+    query = fts_query("Miete DE89 3704 0044 0532 0130 00")
+    assert query == '"Miete" AND ibans : "DE89370400440532013000"'
+
+
+def test_find_ibans_and_email_dates():
+    assert find_ibans("IBAN: de89 3704 0044 0532 0130 00") == ["DE89370400440532013000"]
+    assert iso_email_date("Mon, 14 Oct 2024 10:00:00 +0200") == "2024-10-14T10:00:00+02:00"
+    assert iso_email_date("yesterday") is None
+
+
+def test_search_by_terms_vendor_and_date(index):
+    add(index, "1", "Mon, 14 Oct 2024 10:00:00 +0200", "strom.pdf", "Stromabrechnung Zählernummer 4711")
+    add(index, "2", "Fri, 15 Nov 2024 10:00:00 +0100", "miete.pdf",
+        "Miete November IBAN DE89 3704 0044 0532 0130 00", vendor="Hausverwaltung Beispiel", invoice_number="M-11")
+
+    assert [row["file_name"] for row in index.search("zahlernummer 4711")] == ["strom.pdf"]
+    assert [row["file_name"] for row in index.search("DE89370400440532013000")] == ["miete.pdf"]
+    assert [row["file_name"] for row in index.search("R-2024-001")] == ["strom.pdf"]
+    assert [row["file_name"] for row in index.search(vendor="hausverwaltung")] == ["miete.pdf"]
+    assert [row["file_name"] for row in index.search(since="2024-11-01")] == ["miete.pdf"]
+    assert [row["file_name"] for row in index.search(until="2024-10-14")] == ["strom.pdf"]
+    assert index.search("Miete", until="2024-10-31") == []
+
+
+def test_results_are_newest_first_and_limited(index):
+    for uid in range(5):
+        add(index, str(uid), "Mon, 14 Oct 2024 10:00:00 +0200", f"doc_{uid}.pdf", "Rechnung")
+    assert [row["file_name"] for row in index.search("Rechnung", limit=2)] == ["doc_4.pdf", "doc_3.pdf"]
+
+
+def test_reindexing_an_attachment_replaces_it(index):
+    add(index, "1", "Mon, 14 Oct 2024 10:00:00 +0200", "strom.pdf", "alter Text")
+    add(index, "1", "Mon, 14 Oct 2024 10:00:00 +0200", "strom.pdf", "neuer Text")
+    assert index.count() == 1
+    assert index.search("alter") == []
+    assert len(index.search("neuer")) == 1
+
+
+def test_index_can_be_disabled(tmp_path):
+    assert DocumentIndex.from_config({"document_index": False}, str(tmp_path / "index.sqlite3")) is None
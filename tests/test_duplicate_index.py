@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from DB.duplicate_index import DuplicateIndex, invoice_key
+
+
+@pytest.fixture
+def index():
+    index = DuplicateIndex(":memory:")
+    yield index
+    index.close()
+
+
+def test_invoice_key_ignores_case_spaces_and_punctuation():
+    original = {"doc_type": "Rechnung", "vendor_name": "Stadtwerke Musterstadt GmbH", "invoice_number": "RE-2024/001"}
+    reminder = {"doc_type": "Rechnung", "vendor_name": "STADTWERKE MUSTERSTADT GMBH", "invoice_number": "RE 2024 001"}
+    assert invoice_key(original) == invoice_key(reminder) == "Rechnung|stadtwerkemusterstadtgmbh|re2024001"
+
+
+def test_invoice_key_needs_vendor_and_number():
+    assert invoice_key({"vendor_name": "Stadtwerke", "invoice_number": None}) is None
+    assert invoice_key({"vendor_name": "", "invoice_number": "R-1"}) is None
+
+
+def test_claim_registers_once(index):
+    assert index.claim("abc", "Rechnung|stadtwerke|r1", "/out/a.pdf") is None
+    assert index.claim("abc", None, "/out/b.pdf") == ("content", "/out/a.pdf")
+    assert index.claim("def", "Rechnung|stadtwerke|r1", "/out/c.pdf") == ("invoice_number", "/out/a.pdf")
+    # A rejected claim registers nothing
+    assert index.find(content_hash="def") is None
+
+
+def test_content_hash_is_checked_before_the_invoice_key(index):
+    index.claim("abc", None, "/out/a.pdf")
+    index.claim(None, "Rechnung|stadtwerke|r1", "/out/b.pdf")
+    assert index.find("abc", "Rechnung|stadtwerke|r1") == ("content", "/out/a.pdf")
+
+
+def test_update_path_and_release(index):
+    index.claim("abc", "Rechnung|stadtwerke|r1", "/in/a.pdf")
+    index.update_path("abc", "Rechnung|stadtwerke|r1", "/out/Muster/a.pdf")
+    assert index.find(key="Rechnung|stadtwerke|r1") == ("invoice_number", "/out/Muster/a.pdf")
+
+    index.release("abc", "Rechnung|stadtwerke|r1")
+    assert index.find("abc", "Rechnung|stadtwerke|r1") is None
+
+
+def test_fingerprints_persist(tmp_path):
+    path = str(tmp_path / "DB" / "duplicate_index.sqlite3")
+    index = DuplicateIndex(path)
+    index.claim("abc", None, "/out/a.pdf")
+    index.close()
+
+    reopened = DuplicateIndex(path)
+    assert reopened.find("abc") == ("content", "/out/a.pdf")
+    reopened.close()
+
+
+def test_concurrent_claims_register_one_document(index):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def claim(number):
+        barrier.wait()
+        results.append(index.claim(None, "Rechnung|stadtwerke|r1", f"/out/{number}.pdf"))
+
+    threads = [threading.Thread(target=claim, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(None) == 1
+
+
+def test_detection_can_be_disabled(tmp_path):
+    assert DuplicateIndex.from_config({"duplicate_detection": False}, str(tmp_path / "index.sqlite3")) is None
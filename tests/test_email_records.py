@@ -0,0 +1,40 @@
+import json
+
+from emails.Email_with_Attachment import AttachmentRecord, EmailWithAttachments
+
+
+def _email():
+    parts = [
+        AttachmentRecord("scan_1.pdf", "/out/Owner/scan_1.pdf", status="processed", invoice_number="R-1",
+                         vendor_name="Stadtwerke", doc_type="INVOICE", verw_nr=1024, owner="Owner",
+                         source_file="scan.pdf", pages=(1, 2)),
+        AttachmentRecord("scan_2.pdf", "/out/Owner/scan_2.pdf", status="duplicate", verw_nr="A-7",
+                         duplicate_of="/out/Owner/old.pdf", duplicate_reason="content_hash",
+                         source_file="scan.pdf", pages=(3,)),
+    ]
+    split = AttachmentRecord("scan.pdf", "/in/scan.pdf", status="split", message="2 documents", documents=parts)
+    single = AttachmentRecord("bill.pdf", "/out/bill.pdf", status="processed", verw_nr=77, prefix="NK_",
+                              source="expense")
+    return EmailWithAttachments("42", "Rechnungen", "sender@example.com", "2026-10-19", [split, single])
+
+
+def test_round_trip_keeps_every_field():
+    email_obj = _email()
+    # Through the JSON text, as stored in the processed email files
+    loaded = EmailWithAttachments.from_dict(json.loads(json.dumps(email_obj.to_dict())))
+
+    assert loaded == email_obj
+    assert loaded.to_dict() == email_obj.to_dict()
+
+
+def test_round_trip_keeps_documents_and_verw_nr_type():
+    loaded = EmailWithAttachments.from_dict(json.loads(json.dumps(_email().to_dict())))
+    split, single = loaded.attachments
+
+    assert [document.file_name for document in split.documents] == ["scan_1.pdf", "scan_2.pdf"]
+    assert split.documents[0].pages == (1, 2)
+    assert split.documents[1].duplicate_of == "/out/Owner/old.pdf"
+    assert split.documents[0].verw_nr == 1024 and isinstance(split.documents[0].verw_nr, int)
+    assert split.documents[1].verw_nr == "A-7"
+    assert single.verw_nr == 77 and isinstance(single.verw_nr, int)
+    assert single.documents is None
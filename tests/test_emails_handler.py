@@ -0,0 +1,43 @@
+import json
+
+from emails.handler import save_emails_to_json_split
+
+
+def _emails(start, count):
+    return [{"email_id": str(i), "subject": f"Email {i}"} for i in range(start, start + count)]
+
+
+def _parts(folder):
+    return sorted(p.name for p in folder.iterdir())
+
+
+def _load(folder, name):
+    return json.loads((folder / name).read_text(encoding="utf-8"))
+
+
+def test_split_creates_several_parts_in_one_call(tmp_path):
+    save_emails_to_json_split(_emails(0, 7), str(tmp_path), max_entries_per_file=3)
+
+    assert _parts(tmp_path) == ["processed_emails_part1.json", "processed_emails_part2.json",
+                                "processed_emails_part3.json"]
+    assert [len(_load(tmp_path, name)) for name in _parts(tmp_path)] == [3, 3, 1]
+
+
+def test_split_appends_to_last_part_and_continues_past_full_parts(tmp_path):
+    save_emails_to_json_split(_emails(0, 2), str(tmp_path), max_entries_per_file=3)
+    save_emails_to_json_split(_emails(2, 5), str(tmp_path), max_entries_per_file=3)
+    # The last part is full now: everything goes to the next one
+    save_emails_to_json_split(_emails(7, 1), str(tmp_path), max_entries_per_file=3)
+
+    names = ["processed_emails_part1.json", "processed_emails_part2.json", "processed_emails_part3.json"]
+    assert _parts(tmp_path) == names
+    ids = [email["email_id"] for name in names for email in _load(tmp_path, name)]
+    assert ids == [str(i) for i in range(8)]
+    assert [len(_load(tmp_path, name)) for name in names] == [3, 3, 2]
+
+
+def test_split_creates_first_part_without_emails(tmp_path):
+    save_emails_to_json_split([], str(tmp_path), max_entries_per_file=3)
+
+    assert _parts(tmp_path) == ["processed_emails_part1.json"]
+    assert _load(tmp_path, "processed_emails_part1.json") == []
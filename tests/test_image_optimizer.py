@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from processing.attachments.image_optimizer import ImageOptimizer
+from processing.attachments.strategy import DefaultFileProcessor
+
+
+def _wait_for_queue(optimizer):
+    # The pool has one worker, so this returns once the queued optimizations have run
+    optimizer._executor.submit(lambda: None).result()
+
+
+def _save_image(path, size, color):
+    # Noise keeps the PNG larger than the JPEG, so the optimized copy is used
+    image = Image.effect_noise(size, 64).convert("RGB")
+    image.paste(color, (0, 0, size[0] // 2, size[1] // 2))
+    image.save(path, "PNG")
+
+
+@pytest.fixture
+def optimizer():
+    optimizer = ImageOptimizer(max_dimension=0, target_dpi=0, max_workers=1)
+    yield optimizer
+    optimizer.close()
+
+
+def test_different_images_saved_at_the_same_path(tmp_path, optimizer):
+    path = str(tmp_path / "image001.png")
+    _save_image(path, (300, 200), (255, 0, 0))
+    optimizer.prepare([path])
+    _wait_for_queue(optimizer)
+
+    # The next email's signature image is saved under the same name before the first was analyzed
+    _save_image(path, (120, 400), (0, 0, 255))
+    optimizer.prepare([path])
+    analysis_path = optimizer.optimized_path(path)
+
+    with Image.open(analysis_path) as image:
+        assert image.size == (120, 400)
+    optimizer.release(path, analysis_path)
+
+
+def test_stale_future_is_not_used_without_a_new_prepare(tmp_path, optimizer):
+    path = str(tmp_path / "image001.png")
+    _save_image(path, (300, 200), (255, 0, 0))
+    optimizer.prepare([path])
+    _wait_for_queue(optimizer)
+    _save_image(path, (120, 400), (0, 0, 255))
+
+    analysis_path = optimizer.optimized_path(path)
+
+    with Image.open(analysis_path) as image:
+        assert image.size == (120, 400)
+    optimizer.release(path, analysis_path)
+
+
+def test_discard_deletes_the_queued_copy(tmp_path, optimizer):
+    path = str(tmp_path / "image001.png")
+    _save_image(path, (300, 200), (255, 0, 0))
+    optimizer.prepare([path])
+    _wait_for_queue(optimizer)
+
+    optimizer.discard(path)
+
+    assert os.listdir(optimizer._work_folder) == []
+    assert path not in optimizer._futures
+
+
+class _DuplicateIndex:
+    def find(self, content_hash=None):
+        return ("content_hash", "/filed/original.png")
+
+
+def test_duplicate_discards_the_queued_copy(tmp_path, optimizer):
+    path = str(tmp_path / "image001.png")
+    _save_image(path, (300, 200), (255, 0, 0))
+    processor = DefaultFileProcessor(image_optimizer=optimizer, duplicate_index=_DuplicateIndex())
+    processor.prepare([path])
+    _wait_for_queue(optimizer)
+
+    result = processor.process(path, [], str(tmp_path / "filed"))
+
+    assert result.status == "duplicate"
+    assert os.listdir(optimizer._work_folder) == []
+    assert path not in optimizer._futures
@@ -0,0 +1,137 @@
+import imaplib
+import socket
+
+import pytest
+
+from imap.connection import (
+    CircuitBreaker, ConnectionManager, IMAPAuthenticationError, IMAPUnavailableError, classify_error,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize("error", [IMAPAuthenticationError("login rejected")])
+def test_authentication_errors(error):
+    assert classify_error(error) == "auth"
+
+
+@pytest.mark.parametrize("error", [
+    imaplib.IMAP4.abort("connection closed"),
+    imaplib.IMAP4.error("unexpected greeting"),
+    imaplib.IMAP4.error("SELECT command error: BAD"),
+    ValueError("invalid literal"),
+    socket.timeout("timed out"),
+    ConnectionResetError("reset by peer"),
+    OSError("network unreachable"),
+])
+def test_other_errors_are_transient(error):
+    assert classify_error(error) == "transient"
+
+
+def test_breaker_opens_after_threshold():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.retry_in() == 60
+
+
+def test_breaker_half_opens_after_timeout_and_closes_on_success():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    clock.now += 59
+    assert breaker.state == "open"
+
+    clock.now += 1
+    assert breaker.state == "half_open" and breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.retry_in() == 0
+
+
+def test_breaker_failed_trial_doubles_open_time_up_to_maximum():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, max_reset_timeout=200, clock=clock)
+    breaker.record_failure()
+    timeouts = []
+    for _ in range(3):
+        clock.now += breaker.retry_in()
+        assert breaker.state == "half_open"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        timeouts.append(breaker.open_timeout)
+
+    assert timeouts == [120, 200, 200]
+
+
+def test_breaker_open_for_opens_immediately():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60, clock=clock)
+
+    breaker.record_failure(open_for=3600)
+
+    assert breaker.state == "open" and breaker.retry_in() == 3600
+
+
+def _manager(open_connection, breaker=None):
+    return ConnectionManager(max_retries=3, base_delay=0.01, breaker=breaker or CircuitBreaker(clock=FakeClock()),
+                             open_connection=open_connection, load=dict, sleep=lambda delay: None)
+
+
+def test_protocol_errors_are_retried_without_auth_cooldown():
+    attempts = []
+
+    def open_connection(config):
+        attempts.append(1)
+        raise imaplib.IMAP4.error("unexpected greeting")
+
+    manager = _manager(open_connection)
+    with pytest.raises(IMAPUnavailableError):
+        manager.connect()
+
+    assert len(attempts) == 3
+    assert manager.last_error_kind == "transient"
+    assert manager.breaker.state == "closed"
+
+
+def test_rejected_login_is_not_retried():
+    attempts = []
+
+    def open_connection(config):
+        attempts.append(1)
+        raise IMAPAuthenticationError("login rejected")
+
+    manager = _manager(open_connection)
+    with pytest.raises(IMAPAuthenticationError):
+        manager.connect()
+    with pytest.raises(IMAPAuthenticationError):
+        manager.connect()
+
+    assert len(attempts) == 1
+    assert manager.breaker.state == "open"
+
+
+def test_connect_recovers_after_transient_errors():
+    errors = [ConnectionResetError("reset"), socket.timeout("timed out")]
+
+    def open_connection(config):
+        if errors:
+            raise errors.pop(0)
+        return "connection"
+
+    manager = _manager(open_connection)
+
+    assert manager.connect() == "connection"
+    assert manager.health()["available"]
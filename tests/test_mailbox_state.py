@@ -0,0 +1,80 @@
+from datetime import date
+
+import pytest
+
+from imap.mailbox_state import MailboxStateStore, detect_changes, imap_date, resync_checkpoint, select_mailbox
+
+SAVED = {"uidvalidity": 7, "uidnext": 101, "highestmodseq": 500, "synced_uid": 100}
+
+
+@pytest.mark.parametrize("snapshot, last_uid, expected", [
+    ({"uidvalidity": 7, "uidnext": 101}, 100, "unchanged"),
+    ({"uidvalidity": 7, "uidnext": 103}, 100, "changed"),
+    ({"uidvalidity": 8, "uidnext": 101}, 100, "uidvalidity_changed"),
+    ({"uidvalidity": 7, "highestmodseq": 500}, 100, "unchanged"),
+    ({"uidvalidity": 7, "highestmodseq": 512}, 100, "changed"),
+    # The last cycle did not get up to last_uid, so an unchanged modseq proves nothing
+    ({"uidvalidity": 7, "highestmodseq": 500}, 120, "changed"),
+    ({"uidvalidity": 7}, 100, "unknown"),
+    ({"uidvalidity": None, "uidnext": 101}, 100, "unknown"),
+])
+def test_detect_changes(snapshot, last_uid, expected):
+    assert detect_changes(snapshot, SAVED, last_uid) == expected
+
+
+def test_nothing_saved_is_unknown():
+    assert detect_changes({"uidvalidity": 7, "uidnext": 101}, {}, 100) == "unknown"
+
+
+def test_imap_dates_use_english_months():
+    assert imap_date("2024-03-05T10:00:00") == "05-Mar-2024"
+    assert imap_date(date(2023, 12, 24)) == "24-Dec-2023"
+
+
+class FakeMail:
+    def __init__(self, responses, capabilities=("IMAP4REV1",), search=b""):
+        self.responses = responses
+        self.capabilities = capabilities
+        self.search = search
+        self.selected = None
+        self.searches = []
+
+    def select(self, mailbox, readonly=True):
+        self.selected = mailbox
+        return "OK", [b"42"]
+
+    def response(self, code):
+        return code, self.responses.get(code, [None])
+
+    def uid(self, command, charset, criteria):
+        self.searches.append(criteria)
+        return "OK", [self.search]
+
+
+def test_select_reads_the_state_from_the_response():
+    mail = FakeMail({"UIDVALIDITY": [b"7"], "UIDNEXT": [b"101"], "HIGHESTMODSEQ": [b"500"]},
+                    capabilities=("IMAP4REV1", "CONDSTORE"))
+    snapshot = select_mailbox(mail)
+    assert mail.selected == "INBOX (CONDSTORE)"
+    assert snapshot == {"exists": 42, "uidvalidity": 7, "uidnext": 101, "highestmodseq": 500}
+
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "mailbox_state.json")
+    MailboxStateStore(path).save({"uidvalidity": 7, "uidnext": 101, "highestmodseq": None}, 100)
+    saved = MailboxStateStore(path).get()
+    assert saved["uidvalidity"] == 7
+    assert saved["synced_uid"] == 100
+    assert detect_changes({"uidvalidity": 7, "uidnext": 101}, saved, 100) == "unchanged"
+
+
+def test_uidvalidity_change_reprocesses_since_the_last_sync():
+    mail = FakeMail({}, search=b"55 56 60")
+    saved = {"uidvalidity": 7, "last_sync": "2024-03-05T10:00:00"}
+    assert resync_checkpoint(mail, saved, {"uidvalidity": 8, "uidnext": 61}) == 54
+    assert mail.searches == ["SINCE 05-Mar-2024"]
+
+
+def test_uidvalidity_change_without_sync_date_continues_after_the_newest_email():
+    mail = FakeMail({})
+    assert resync_checkpoint(mail, {"uidvalidity": 7}, {"uidvalidity": 8, "uidnext": 61}) == 60
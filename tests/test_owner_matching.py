@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("rapidfuzz")
+
+from processing.attachments.classification import OwnerMatcher, match_owner
+from utils.aho_corasick import AhoCorasick
+
+
+def test_aho_corasick_finds_overlapping_matches():
+    automaton = AhoCorasick([("he", "he"), ("she", "she"), ("his", "his"), ("hers", "hers")])
+    assert automaton.find_all("ushers") == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+
+def test_aho_corasick_reports_every_value_of_a_pattern():
+    automaton = AhoCorasick([("12", "first"), ("12", "second"), ("", "ignored")])
+    assert automaton.find_all("x12") == [(1, 3, "first"), (1, 3, "second")]
+    assert automaton.find_all("") == []
+
+
+def test_aho_corasick_matches_a_naive_search():
+    patterns = ["ab", "abab", "bab", "b", "ba"]
+    text = "abababbab"
+    automaton = AhoCorasick([(pattern, pattern) for pattern in patterns])
+    expected = sorted(
+        (start, start + len(pattern), pattern)
+        for pattern in patterns
+        for start in range(len(text) - len(pattern) + 1)
+        if text.startswith(pattern, start)
+    )
+    assert sorted(automaton.find_all(text)) == expected
+
+
+ENTRIES = (("1", "Anna Müller 1"), ("12", "Anna Müller 12"), ("7", "Hausverwaltung Beispiel"))
+
+
+def test_verbatim_owner_name_wins():
+    matcher = OwnerMatcher(ENTRIES)
+    assert matcher.match("Rechnung an Hausverwaltung Beispiel Musterweg 3") == 2
+
+
+def test_longest_owner_name_wins():
+    matcher = OwnerMatcher(ENTRIES)
+    assert matcher.match("Rechnung an Anna Müller 12") == 1
+
+
+def test_owner_names_match_only_whole_words():
+    matcher = OwnerMatcher(ENTRIES)
+    owner_hits, verw_nr_hits = matcher.exact_hits("Kundennummer 4712 Anna Müller 123")
+    assert owner_hits == set()
+    assert verw_nr_hits == set()
+
+
+def test_verw_nr_shortlist_is_fuzzy_matched_first():
+    matcher = OwnerMatcher(ENTRIES)
+    owner_hits, verw_nr_hits = matcher.exact_hits("Objekt 7 Hausverwaltg Beispiel")
+    assert (owner_hits, verw_nr_hits) == (set(), {2})
+    assert matcher.match("Objekt 7 Hausverwaltg Beispiel") == 2
+
+
+def test_no_owner_matches():
+    assert OwnerMatcher(ENTRIES).match("Stadtwerke Musterstadt Stromabrechnung", threshold=95) is None
+
+
+def test_match_owner_returns_the_parameter_entry():
+    parameters = [{"verw_nr": verw_nr, "eigentümer": owner} for verw_nr, owner in ENTRIES]
+    assert match_owner("Rechnung an Anna Müller 1", parameters) is parameters[0]
@@ -0,0 +1,158 @@
+import socket
+
+import pytest
+
+from AWS_TEXTRACT import rate_limiter
+from AWS_TEXTRACT.rate_limiter import AdaptiveRateLimiter, TokenBucket, is_throttling_error, is_transient_error
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class EndpointConnectionError(Exception):
+    pass
+
+
+class S3UploadFailedError(Exception):
+    pass
+
+
+def test_throttling_error_codes():
+    assert is_throttling_error(ClientError("ThrottlingException"))
+    assert is_throttling_error(ClientError("SlowDown"))
+    assert not is_throttling_error(ClientError("AccessDenied"))
+
+
+@pytest.mark.parametrize("error", [
+    ClientError("ProvisionedThroughputExceededException"),
+    EndpointConnectionError("Could not connect to the endpoint URL"),
+    ConnectionResetError("reset by peer"),
+    socket.timeout("timed out"),
+])
+def test_transient_errors(error):
+    assert is_transient_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    ClientError("AccessDenied"),
+    ClientError("UnsupportedDocumentException"),
+    ValueError("bad value"),
+    FileNotFoundError("missing.pdf"),
+])
+def test_permanent_errors(error):
+    assert not is_transient_error(error)
+
+
+def test_transient_cause_is_found():
+    try:
+        try:
+            raise EndpointConnectionError("unreachable")
+        except EndpointConnectionError as e:
+            raise S3UploadFailedError("Failed to upload scan.pdf") from e
+    except S3UploadFailedError as error:
+        assert is_transient_error(error)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_token_bucket_refills_up_to_the_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=2, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 60
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_token_bucket_rejects_invalid_limits():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, burst=1)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=0)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+
+
+def test_throttled_calls_are_retried_and_shrink_the_window(no_backoff):
+    limiter = AdaptiveRateLimiter("test", rate=1000, burst=1000, max_concurrency=8)
+    responses = [ClientError("ThrottlingException"), ClientError("ThrottlingException"), "ok"]
+
+    def call():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert limiter.call(call) == "ok"
+    # Halved twice, then grown by 1/window on the successful call
+    assert limiter.window == pytest.approx(2.0 + 1 / 2.0)
+    assert limiter.in_flight == 0
+
+
+def test_successful_calls_grow_the_window_up_to_the_maximum():
+    limiter = AdaptiveRateLimiter("test", rate=1000, burst=1000, max_concurrency=4)
+    limiter.window = 1.0
+    for _ in range(50):
+        limiter.call(lambda: None)
+    assert limiter.window == 4.0
+
+
+def test_throttling_is_raised_after_max_retries(no_backoff):
+    limiter = AdaptiveRateLimiter("test", rate=1000, burst=1000, max_retries=2)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ClientError("ThrottlingException")
+
+    with pytest.raises(ClientError):
+        limiter.call(call)
+    assert len(calls) == 3
+    assert limiter.window == 1.0
+
+
+def test_other_errors_are_not_retried():
+    limiter = AdaptiveRateLimiter("test", rate=1000, burst=1000, max_concurrency=4)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise ClientError("AccessDenied")
+
+    with pytest.raises(ClientError):
+        limiter.call(call)
+    assert len(calls) == 1
+    assert limiter.window == 4.0
+    assert limiter.in_flight == 0
@@ -0,0 +1,46 @@
+import threading
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from DB.response_archive import ResponseArchive
+
+
+def test_failed_training_is_retried_after_train_samples_more_responses(tmp_path, monkeypatch):
+    archive = ResponseArchive(str(tmp_path), train_samples=5)
+    attempts = []
+
+    def failing_train(*args, **kwargs):
+        attempts.append(archive.count())
+        raise archive._zstd.ZstdError("not enough samples")
+
+    monkeypatch.setattr(archive._zstd, "train_dictionary", failing_train)
+    for i in range(14):
+        archive.add({"response": i})
+    archive.close()
+
+    assert attempts == [5, 10]
+
+
+def test_concurrent_adds_train_one_dictionary(tmp_path):
+    archive = ResponseArchive(str(tmp_path), train_samples=8)
+    trainings = []
+    train = archive.train_dictionary
+
+    def counting_train():
+        trainings.append(archive.count())
+        return train()
+
+    archive.train_dictionary = counting_train
+    response = {"Blocks": [{"BlockType": "LINE", "Text": f"Line {i}", "Id": str(i)} for i in range(50)]}
+    threads = [threading.Thread(target=lambda: [archive.add(response) for _ in range(20)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    dictionary_id = archive._dictionary_id
+    archive.close()
+
+    assert len(trainings) == 1
+    assert dictionary_id == 1
@@ -0,0 +1,106 @@
+import json
+import time
+from datetime import datetime, timezone
+
+from AWS_TEXTRACT.s3_staging import S3StagingManager, StagingLedger, make_staging_key
+
+
+class FakeS3:
+    def __init__(self, fail_keys=()):
+        self.uploads = []
+        self.deletes = []
+        self.fail_keys = set(fail_keys)
+        self.objects = []
+
+    def upload_file(self, file_path, bucket, key):
+        self.uploads.append((file_path, bucket, key))
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [item["Key"] for item in Delete["Objects"]]
+        self.deletes.append(keys)
+        return {"Errors": [{"Key": key, "Message": "AccessDenied"} for key in keys if key in self.fail_keys]}
+
+    def list_objects_v2(self, **kwargs):
+        return {"Contents": self.objects, "IsTruncated": False}
+
+
+def test_staging_keys_are_unique_and_sharded():
+    first = make_staging_key("C:/scans/Rechnung.pdf", "staging")
+    second = make_staging_key("/tmp/Rechnung.pdf", "staging")
+    assert first != second
+
+    prefix, shard, unique, name = first.split("/")
+    assert prefix == "staging"
+    assert name == "Rechnung.pdf"
+    assert unique.startswith(shard) and len(shard) == 2
+
+
+def test_ledger_survives_a_restart(tmp_path):
+    path = str(tmp_path / "DB" / "s3_staging_ledger.json")
+    ledger = StagingLedger(path)
+    ledger.add("staging/ab/ab12/a.pdf")
+    ledger.add("staging/cd/cd34/b.pdf")
+    ledger.remove(["staging/ab/ab12/a.pdf"])
+
+    reloaded = StagingLedger(path)
+    assert reloaded.older_than(-1) == ["staging/cd/cd34/b.pdf"]
+    assert reloaded.older_than(3600) == []
+
+
+def test_corrupt_ledger_starts_empty(tmp_path):
+    path = tmp_path / "s3_staging_ledger.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert StagingLedger(str(path)).older_than(-1) == []
+
+
+def make_manager(tmp_path, client, batch_size=1000):
+    return S3StagingManager("bucket", str(tmp_path / "ledger.json"), client_factory=lambda: client,
+                            batch_size=batch_size)
+
+
+def test_released_keys_are_deleted_in_batches(tmp_path):
+    client = FakeS3()
+    manager = make_manager(tmp_path, client, batch_size=2)
+    document = tmp_path / "invoice.pdf"
+    document.write_bytes(b"%PDF-1.4")
+
+    keys = [manager.stage(str(document)) for _ in range(3)]
+    assert [upload[2] for upload in client.uploads] == keys
+
+    for key in keys:
+        manager.release(key)
+    assert client.deletes == [keys[:2]]
+
+    manager.flush()
+    assert client.deletes == [keys[:2], keys[2:]]
+    assert manager.ledger.older_than(-1) == []
+
+
+def test_failed_deletions_stay_in_the_ledger(tmp_path):
+    client = FakeS3()
+    manager = make_manager(tmp_path, client)
+    document = tmp_path / "invoice.pdf"
+    document.write_bytes(b"%PDF-1.4")
+    kept, deleted = manager.stage(str(document)), manager.stage(str(document))
+    client.fail_keys.add(kept)
+
+    manager.release(kept)
+    manager.release(deleted)
+    manager.flush()
+
+    with open(tmp_path / "ledger.json", encoding="utf-8") as f:
+        assert list(json.load(f)) == [kept]
+
+
+def test_sweep_deletes_old_objects_missing_from_the_ledger(tmp_path):
+    client = FakeS3()
+    now = time.time()
+    client.objects = [
+        {"Key": "staging/aa/aa1/old.pdf", "LastModified": datetime.fromtimestamp(now - 7200, timezone.utc)},
+        {"Key": "staging/bb/bb1/new.pdf", "LastModified": datetime.fromtimestamp(now, timezone.utc)},
+    ]
+    manager = make_manager(tmp_path, client)
+
+    manager.sweep(max_age=3600)
+
+    assert client.deletes == [["staging/aa/aa1/old.pdf"]]
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+from processing.scheduler import AdaptivePollScheduler, parse_quiet_hours
+
+
+def fixed_clock(hour, minute=0):
+    return lambda: datetime(2024, 3, 15, hour, minute)
+
+
+def test_new_mail_drops_to_the_minimum_and_idle_cycles_back_off():
+    scheduler = AdaptivePollScheduler(min_interval=60, max_interval=500, initial_interval=300,
+                                      backoff_factor=2.0, clock=fixed_clock(10))
+    assert scheduler.next_interval() == 300
+
+    scheduler.record_cycle(3)
+    assert scheduler.next_interval() == 60
+
+    intervals = []
+    for _ in range(4):
+        scheduler.record_cycle(0)
+        intervals.append(scheduler.next_interval())
+    assert intervals == [120, 240, 480, 500]
+
+
+def test_initial_interval_is_clamped():
+    assert AdaptivePollScheduler(min_interval=60, max_interval=900, initial_interval=5).interval == 60
+    assert AdaptivePollScheduler(min_interval=60, max_interval=900, initial_interval=5000).interval == 900
+
+
+def test_invalid_intervals_are_rejected():
+    with pytest.raises(ValueError):
+        AdaptivePollScheduler(min_interval=0)
+    with pytest.raises(ValueError):
+        AdaptivePollScheduler(min_interval=600, max_interval=60)
+
+
+def test_quiet_hours_sleep_until_the_window_ends():
+    scheduler = AdaptivePollScheduler(quiet_hours=["22:00-06:00"], quiet_interval=3600, clock=fixed_clock(5, 30))
+    assert scheduler.next_interval() == 30 * 60
+
+    scheduler.clock = fixed_clock(23)
+    assert scheduler.next_interval() == 3600
+
+
+def test_quiet_hours_never_go_below_the_minimum():
+    scheduler = AdaptivePollScheduler(min_interval=120, quiet_hours=["12:00-12:30"], clock=fixed_clock(12, 29))
+    assert scheduler.next_interval() == 120
+
+
+def test_outside_quiet_hours_uses_the_adaptive_interval():
+    scheduler = AdaptivePollScheduler(initial_interval=300, quiet_hours=["22:00-06:00"], clock=fixed_clock(6))
+    assert scheduler.next_interval() == 300
+
+
+def test_invalid_quiet_hours_are_ignored():
+    windows = parse_quiet_hours(["22:00-06:00", "late", "25:00-26:00"])
+    assert [(start.hour, end.hour) for start, end in windows] == [(22, 6)]
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from conftest import write_text_pdf
+from processing.attachments.splitter import (
+    count_pdf_pages,
+    detect_document_boundaries,
+    page_content_hash,
+    split_pdf,
+)
+from processing.attachments.text_layer import build_text_layer_response, extract_pdf_text
+
+
+def page(*lines):
+    return build_text_layer_response(["\n".join(lines)])
+
+
+def test_new_invoice_number_starts_a_document():
+    pages = [
+        page("Musterbau GmbH", "Rechnung Nr. 2025-001"),
+        page("Seite 2", "Zahlbar innerhalb von 14 Tagen"),
+        page("Musterbau GmbH", "Rechnung Nr. 2025-002"),
+    ]
+    assert detect_document_boundaries(pages) == [[1, 2], [3]]
+
+
+def test_new_vendor_starts_a_document():
+    pages = [
+        page("Musterbau GmbH", "Rechnung Nr. 7"),
+        page("Schmidt AG", "Lieferschein"),
+        page("SCHMIDT AG", "Seite 2"),
+    ]
+    assert detect_document_boundaries(pages) == [[1], [2, 3]]
+
+
+def test_pages_without_identity_stay_with_the_current_document():
+    pages = [page("Seite 1"), page("Musterbau GmbH", "Rechnung Nr. 7"), None, page("AGB")]
+    assert detect_document_boundaries(pages) == [[1, 2, 3, 4]]
+
+
+def test_repeated_invoice_number_continues_the_document():
+    pages = [page("Musterbau GmbH", "Rechnung Nr. 7"), page("Rechnung Nr. 7", "Seite 2")]
+    assert detect_document_boundaries(pages) == [[1, 2]]
+    assert detect_document_boundaries([]) == []
+
+
+def test_page_content_hash():
+    assert page_content_hash("abc", 3) == "abc:p3"
+    assert page_content_hash(None, 3) is None
+
+
+def test_split_pdf_writes_one_file_per_group(tmp_path):
+    pytest.importorskip("pypdf")
+    source = write_text_pdf(str(tmp_path / "scan.pdf"), [["Seite A"], ["Seite B"], ["Seite C"]])
+
+    parts = split_pdf(source, [[1, 2], [3]], str(tmp_path / "work"))
+
+    assert [os.path.basename(path) for path in parts] == ["scan_part1_p1-2.pdf", "scan_part2_p3-3.pdf"]
+    assert [count_pdf_pages(path) for path in parts] == [2, 1]
+    assert extract_pdf_text(parts[1])[0].strip() == "Seite C"
+    assert count_pdf_pages(str(tmp_path / "missing.pdf")) == 0
@@ -0,0 +1,118 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from DB.duplicate_index import DuplicateIndex
+from processing.attachments import splitter, strategy
+from processing.attachments.strategy import SplittingFileProcessor
+from processing.file_handler import file_sha256
+from conftest import write_text_pdf
+
+
+@pytest.fixture
+def split_pdf(tmp_path, monkeypatch):
+    """A 4-page "PDF" holding two invoices, with the Textract and PDF calls replaced."""
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    path = inbox / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4 two invoices")
+    analyzed = []
+
+    def analyze_pages(file_path, work_folder, max_workers=4, archive=None, content_hash=None):
+        analyzed.append(content_hash)
+        return [{"invoice": "A"}, {"invoice": "A"}, {"invoice": "B"}, {"invoice": "B"}]
+
+    def write_parts(file_path, page_groups, work_folder):
+        paths = []
+        for index, pages in enumerate(page_groups, 1):
+            part_path = os.path.join(work_folder, f"scan_part{index}.pdf")
+            with open(part_path, "wb") as f:
+                f.write(f"part {index} {pages}".encode())
+            paths.append(part_path)
+        return paths
+
+    monkeypatch.setattr(splitter, "count_pdf_pages", lambda file_path: 4)
+    monkeypatch.setattr(splitter, "analyze_pages_in_parallel", analyze_pages)
+    monkeypatch.setattr(splitter, "detect_document_boundaries", lambda responses: [[1, 2], [3, 4]])
+    monkeypatch.setattr(splitter, "split_pdf", write_parts)
+    monkeypatch.setattr(strategy, "merge_responses", lambda responses: list(responses))
+    monkeypatch.setattr(strategy, "classify_response", lambda response, parameters, threshold: {
+        "invoice_number": response[0]["invoice"], "vendor_name": "Stadtwerke", "doc_type": "Rechnung",
+        "matched_entry": None, "prefix": "RE_",
+    })
+    monkeypatch.setattr(strategy, "build_file_name", lambda classification, extension: (
+        f"{classification['invoice_number']}{extension}"
+    ))
+    return path, analyzed
+
+
+def test_split_original_is_claimed_and_a_resent_copy_is_a_duplicate(tmp_path, split_pdf):
+    path, analyzed = split_pdf
+    content = path.read_bytes()
+    content_hash = file_sha256(str(path))
+    index = DuplicateIndex(":memory:")
+    processor = SplittingFileProcessor(duplicate_index=index)
+
+    result = processor.process(str(path), [], str(tmp_path / "filed"))
+
+    assert result.status == "split"
+    assert [document.status for document in result.documents] == ["processed", "processed"]
+    assert [document.source for document in result.documents] == ["textract", "textract"]
+    assert analyzed == [content_hash]
+    reason, original = index.find(content_hash=content_hash)
+    assert reason == "content"
+    assert original.split(os.pathsep) == [document.path for document in result.documents]
+
+    path.write_bytes(content)
+    resent = processor.process(str(path), [], str(tmp_path / "filed"))
+
+    assert resent.status == "duplicate"
+    assert resent.duplicate_of == original
+    assert analyzed == [content_hash]
+
+
+def test_page_responses_are_archived_under_the_original_hash(tmp_path, monkeypatch):
+    pypdf = pytest.importorskip("pypdf")
+    writer = pypdf.PdfWriter()
+    for _ in range(2):
+        writer.add_blank_page(width=200, height=200)
+    path = str(tmp_path / "scan.pdf")
+    with open(path, "wb") as f:
+        writer.write(f)
+    monkeypatch.setattr(splitter, "analyze_expense", SimpleNamespace(
+        analyze_document_pages=lambda page_file, archive=None, content_hash=None: {"content_hash": content_hash}
+    ))
+
+    responses = splitter.analyze_pages_in_parallel(path, str(tmp_path / "work"), archive=object(), content_hash="abc")
+
+    assert responses == [{"content_hash": "abc:p1"}, {"content_hash": "abc:p2"}]
+    assert os.listdir(tmp_path / "work") == []
+
+
+FILLER = ["Position 1 Wartung der Heizungsanlage 120,00 EUR", "Position 2 Anfahrt 35,00 EUR", "Summe netto 155,00 EUR"]
+
+
+def test_born_digital_pdf_is_split_from_its_text_layer(tmp_path, monkeypatch):
+    pytest.importorskip("pypdf")
+    pytest.importorskip("rapidfuzz")
+
+    def no_textract(*args, **kwargs):
+        raise AssertionError("Textract must not be called for a born-digital PDF")
+
+    monkeypatch.setattr(splitter, "analyze_pages_in_parallel", no_textract)
+    path = write_text_pdf(str(tmp_path / "invoices.pdf"), [
+        ["Musterfirma GmbH", "Rechnung", "Rechnung Nr. 2025-001", "Datum: 01.02.2025", *FILLER],
+        ["Musterfirma GmbH", "Allgemeine Geschaeftsbedingungen fuer alle Leistungen", *FILLER],
+        ["Stadtwerke Berlin AG", "Rechnung", "Rechnung Nr. SW-778", "Datum: 03.02.2025", *FILLER],
+        ["Zahlbar innerhalb von 14 Tagen ohne Abzug", *FILLER],
+    ])
+    parameters = [{"verw_nr": "1", "objekt": "Objekt", "eigentümer": "Erika Mustermann"}]
+
+    result = SplittingFileProcessor().process(path, parameters, str(tmp_path / "filed"))
+
+    assert result.status == "split"
+    assert [document.pages for document in result.documents] == [(1, 2), (3, 4)]
+    assert [document.invoice_number for document in result.documents] == ["2025-001", "SW-778"]
+    assert [document.source for document in result.documents] == ["text_layer", "text_layer"]
+    assert not os.path.exists(path)
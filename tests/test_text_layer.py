@@ -0,0 +1,98 @@
+import pytest
+
+from conftest import write_text_pdf
+from processing.attachments.text_layer import (
+    build_text_layer_response,
+    classification_score,
+    is_scanned,
+    mentions_invoice,
+    page_texts_from_blocks,
+    read_text_layer,
+    read_text_layer_pages,
+)
+from AWS_TEXTRACT.analyze_expense import (
+    extract_document_type_from_response,
+    extract_invoice_number_from_response,
+    extract_vendor_name_from_response,
+)
+
+INVOICE_PAGE = "Musterbau GmbH\nMusterweg 1\nRechnung\nRechnung Nr. 2025-001\nDatum: 01.02.2025\nBetrag: 100,00 EUR"
+
+
+def summary_fields(response):
+    return [
+        (field["Type"]["Text"], field["LabelDetection"]["Text"], field["ValueDetection"]["Text"], field["PageNumber"])
+        for document in response["ExpenseDocuments"]
+        for field in document["SummaryFields"]
+    ]
+
+
+def test_text_layer_response_has_the_textract_shape():
+    response = build_text_layer_response([INVOICE_PAGE])
+
+    assert summary_fields(response) == [
+        ("VENDOR_NAME", "", "Musterbau GmbH", 1),
+        ("OTHER", "Rechnung", "", 1),
+        ("INVOICE_RECEIPT_ID", "Rechnung Nr.", "2025-001", 1),
+        ("OTHER", "Datum", "01.02.2025", 1),
+        ("OTHER", "Betrag", "100,00 EUR", 1),
+    ]
+    assert extract_invoice_number_from_response(response)[0] == "2025-001"
+    assert extract_vendor_name_from_response(response)[0] == "Musterbau GmbH"
+    assert extract_document_type_from_response(response)[0] == "Rechnung"
+
+
+def test_lines_become_blocks_per_page():
+    response = build_text_layer_response([INVOICE_PAGE, "  Seite   2 \n\nAGB"])
+    assert response["DocumentMetadata"] == {"Pages": 2}
+    assert page_texts_from_blocks(response)[1] == "Seite 2\nAGB"
+
+
+def test_only_the_first_legal_form_line_is_the_vendor():
+    response = build_text_layer_response(["Schmidt AG\nBank: Sparkasse\nLieferant Weber KG"])
+    vendors = [field for field in summary_fields(response) if field[0] == "VENDOR_NAME"]
+    assert vendors == [("VENDOR_NAME", "", "Schmidt AG", 1)]
+
+
+def test_text_without_fields_has_no_expense_documents():
+    assert build_text_layer_response(["Seite 2\nAGB"])["ExpenseDocuments"] == []
+
+
+def test_scans_have_too_little_text():
+    assert is_scanned([])
+    assert is_scanned(["", "  "])
+    assert not is_scanned([INVOICE_PAGE], min_chars_per_page=50)
+
+
+def test_invoice_keywords_are_found_in_compounds():
+    assert mentions_invoice(build_text_layer_response(["Zahlbetrag 12,00 EUR"]))
+    assert mentions_invoice(build_text_layer_response(["Der Rechnungsbetrag ist fällig"]))
+    assert not mentions_invoice(build_text_layer_response(["Lieferschein\nSchmidt AG"]))
+
+
+def test_classification_score_is_the_share_of_found_fields():
+    complete = {"invoice_number": "1", "vendor_name": "A", "doc_type": "Rechnung", "matched_entry": {"verw_nr": "1"}}
+    assert classification_score(complete) == 1.0
+    assert classification_score(dict(complete, invoice_number=None, matched_entry=None)) == 0.5
+
+
+def test_born_digital_pdf_is_read_from_its_text_layer(tmp_path):
+    pytest.importorskip("pypdf")
+    path = write_text_pdf(str(tmp_path / "invoice.pdf"), [INVOICE_PAGE.splitlines(), ["Seite 2", "Zahlbar ohne Abzug"]])
+
+    response = read_text_layer(path, min_chars_per_page=20)
+    assert extract_invoice_number_from_response(response)[0] == "2025-001"
+    assert [page["DocumentMetadata"]["Pages"] for page in read_text_layer_pages(path, min_chars_per_page=20)] == [1, 1]
+
+
+def test_scans_and_other_files_need_textract(tmp_path):
+    pytest.importorskip("pypdf")
+    scan = write_text_pdf(str(tmp_path / "scan.pdf"), [[], []])
+    image = tmp_path / "invoice.jpg"
+    image.write_bytes(b"\xff\xd8")
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+
+    assert read_text_layer(scan) is None
+    assert read_text_layer(str(image)) is None
+    assert read_text_layer_pages(str(broken)) is None
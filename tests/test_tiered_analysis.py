@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from processing.attachments import strategy
+from processing.attachments.strategy import TieredFileProcessor
+
+
+def _detected(*lines):
+    return {"Blocks": [{"BlockType": "LINE", "Text": line, "Page": 1} for line in lines]}
+
+
+@pytest.fixture
+def tiered(monkeypatch):
+    """Returns a function that runs TieredFileProcessor.analyze on the given detected text."""
+
+    def run(detected, doc_type=None):
+        monkeypatch.setattr(strategy, "analyze_expense", SimpleNamespace(
+            detect_document_text=lambda *args, **kwargs: detected,
+            extract_document_type_from_response=lambda response: (doc_type, 90.0 if doc_type else None),
+        ))
+        monkeypatch.setattr(strategy, "classify_response", lambda response, parameters, threshold: {"from": "text"})
+        processor = TieredFileProcessor(text_layer=False)
+        monkeypatch.setattr(processor, "classify_with_expense_analysis", lambda *args: {"from": "expense"})
+        return processor.analyze("scan.png", [], 60)[1]
+
+    return run
+
+
+LONG_TEXT = ("Musterfirma GmbH", "Hauptstrasse 1", "12345 Berlin", "Position 1 Wartung Heizung", "Summe 120,00 EUR")
+
+
+@pytest.mark.parametrize("lines", [
+    ("Faktura 2025-001",) + LONG_TEXT,
+    ("Quittung / Kassenbon",) + LONG_TEXT,
+    ("Gutschrift Nr 5",) + LONG_TEXT,
+    ("Rechnungsdatum 01.02.2025", "Rechnungsbetrag 120,00 EUR") + LONG_TEXT,
+])
+def test_invoice_keywords_escalate_without_a_document_type(tiered, lines):
+    assert tiered(_detected(*lines)) == "textract"
+
+
+def test_unknown_document_with_text_escalates(tiered):
+    assert tiered(_detected(*LONG_TEXT)) == "textract"
+
+
+def test_invoice_escalates(tiered):
+    assert tiered(_detected("Rechnung", *LONG_TEXT), doc_type="Rechnung") == "textract"
+
+
+def test_failed_text_detection_escalates(tiered):
+    assert tiered(None) == "textract"
+
+
+def test_delivery_note_is_filed_from_detected_text(tiered):
+    assert tiered(_detected("Lieferschein", *LONG_TEXT), doc_type="Lieferschein") == "detect_text"
+
+
+def test_delivery_note_mentioning_an_invoice_escalates(tiered):
+    lines = ("Lieferschein", "Die Rechnung folgt separat") + LONG_TEXT
+    assert tiered(_detected(*lines), doc_type="Lieferschein") == "textract"
+
+
+def test_logo_is_filed_from_detected_text(tiered):
+    assert tiered(_detected("ACME", "since 1920")) == "detect_text"
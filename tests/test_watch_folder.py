@@ -0,0 +1,129 @@
+import os
+
+from emails.Email_with_Attachment import AttachmentRecord
+from processing.attachments.strategy import DefaultFileProcessor, FileProcessorStrategy
+from processing.watch_folder import WatchFolder
+
+
+class ThrottlingException(Exception):
+    pass
+
+
+class FailingProcessor(FileProcessorStrategy):
+    """Leaves the file where it is and returns an error, like DefaultFileProcessor.error_result."""
+
+    def __init__(self, retryable):
+        self.retryable = retryable
+        self.calls = 0
+
+    def process(self, file_path, parameters, base_destination_folder, threshold=60):
+        self.calls += 1
+        return AttachmentRecord(os.path.basename(file_path), file_path, status="error", retryable=self.retryable)
+
+
+class FilingProcessor(FileProcessorStrategy):
+    def process(self, file_path, parameters, base_destination_folder, threshold=60):
+        os.makedirs(base_destination_folder, exist_ok=True)
+        moved_path = os.path.join(base_destination_folder, os.path.basename(file_path))
+        os.replace(file_path, moved_path)
+        return AttachmentRecord(os.path.basename(file_path), moved_path, status="processed")
+
+
+def _watch_folder(tmp_path, processor, **kwargs):
+    watch = WatchFolder(str(tmp_path / "inbox"), processor, str(tmp_path / "missing.json"), str(tmp_path / "filed"),
+                        settle_seconds=0, **kwargs)
+    watch._parameters = [{"verw_nr": "1", "objekt": "A", "eigentümer": "Owner"}]
+    os.makedirs(watch.folder, exist_ok=True)
+    (tmp_path / "inbox" / "scan.pdf").write_bytes(b"%PDF-1.4")
+    return watch
+
+
+def test_transient_error_requeues_the_file_with_backoff(tmp_path):
+    watch = _watch_folder(tmp_path, FailingProcessor(retryable=True), retry_base_delay=60)
+
+    watch.process_file("scan.pdf")
+
+    assert os.path.exists(os.path.join(watch.folder, "scan.pdf"))
+    assert not os.path.exists(watch.failed_folder)
+    watch.observe()
+    assert watch.waiting_for_retry("scan.pdf")
+    assert watch.ready_files() == []
+    assert watch._retries["scan.pdf"][0] == 1
+
+
+def test_file_is_retried_once_the_backoff_has_passed(tmp_path):
+    watch = _watch_folder(tmp_path, FailingProcessor(retryable=True), retry_base_delay=0)
+
+    watch.process_file("scan.pdf")
+    watch.observe()
+
+    assert watch.ready_files() == ["scan.pdf"]
+
+
+def test_permanent_error_moves_the_file_to_failed(tmp_path):
+    watch = _watch_folder(tmp_path, FailingProcessor(retryable=False))
+
+    watch.process_file("scan.pdf")
+
+    assert os.listdir(watch.failed_folder) == ["scan.pdf"]
+    assert not os.path.exists(os.path.join(watch.folder, "scan.pdf"))
+
+
+def test_file_moves_to_failed_after_the_retry_attempts(tmp_path):
+    processor = FailingProcessor(retryable=True)
+    watch = _watch_folder(tmp_path, processor, retry_attempts=2, retry_base_delay=0)
+
+    for _ in range(3):
+        watch.process_file("scan.pdf")
+
+    assert processor.calls == 3
+    assert os.listdir(watch.failed_folder) == ["scan.pdf"]
+    assert "scan.pdf" not in watch._retries
+
+
+def test_backoff_doubles_up_to_the_maximum(tmp_path, monkeypatch):
+    monkeypatch.setattr("processing.watch_folder.time.monotonic", lambda: 1000.0)
+    watch = _watch_folder(tmp_path, FailingProcessor(retryable=True), retry_attempts=5, retry_base_delay=30,
+                          retry_max_delay=100)
+
+    delays = []
+    for _ in range(4):
+        watch.process_file("scan.pdf")
+        delays.append(watch._retries["scan.pdf"][1] - 1000.0)
+
+    assert delays == [30, 60, 100, 100]
+
+
+def test_filed_file_forgets_earlier_retries(tmp_path):
+    watch = _watch_folder(tmp_path, FilingProcessor())
+    watch._retries["scan.pdf"] = (2, 0.0)
+
+    watch.process_file("scan.pdf")
+
+    assert os.listdir(tmp_path / "filed") == ["scan.pdf"]
+    assert watch._retries == {}
+
+
+def test_one_shot_run_does_not_wait_for_retries(tmp_path):
+    watch = _watch_folder(tmp_path, FailingProcessor(retryable=True), mode="polling", poll_interval=0.01,
+                          retry_base_delay=3600)
+
+    watch.run(max_idle_cycles=2)
+
+    assert os.path.exists(os.path.join(watch.folder, "scan.pdf"))
+    assert not os.path.exists(watch.failed_folder)
+
+
+def test_throttled_analysis_is_requeued(tmp_path):
+    processor = DefaultFileProcessor(text_layer=False)
+
+    def throttled(*args, **kwargs):
+        raise ThrottlingException("Rate exceeded")
+
+    processor.analyze = throttled
+    watch = _watch_folder(tmp_path, processor)
+
+    watch.process_file("scan.pdf")
+
+    assert os.path.exists(os.path.join(watch.folder, "scan.pdf"))
+    assert watch._retries["scan.pdf"][0] == 1